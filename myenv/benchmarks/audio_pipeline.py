@@ -0,0 +1,123 @@
+"""
+Compare the in-memory audio pipeline with the previous temp-file path
+
+For each run the upload is prepared both ways and encoded to FLAC exactly as
+Recognizer.recognize_google does before sending it, so the byte counts are
+the real upload payload. No network calls are made.
+
+Usage:
+    python benchmarks/audio_pipeline.py [--input recording.wav] [--runs 10] [--json]
+
+Without --input a synthetic 44.1 kHz stereo recording (tone bursts padded
+with silence) is generated.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import circuit_audio
+
+
+def synthetic_recording(path):
+    """Write a stereo 44.1 kHz WAV with 1 s of silence around 2 s of tones"""
+    from pydub import AudioSegment
+    from pydub.generators import Sine
+
+    speech = AudioSegment.empty()
+    for freq in (220, 330, 440, 550):
+        speech += Sine(freq, sample_rate=44100).to_audio_segment(duration=400, volume=-12)
+        speech += AudioSegment.silent(duration=100, frame_rate=44100)
+    silence = AudioSegment.silent(duration=1000, frame_rate=44100)
+    recording = (silence + speech + silence).set_channels(2)
+    recording.export(path, format='wav')
+
+
+def legacy_path(audio_path, work_dir):
+    """Decode, export to a temp WAV, re-read it with sr.AudioFile, then delete it"""
+    import speech_recognition as sr
+    from pydub import AudioSegment
+
+    audio = AudioSegment.from_file(audio_path)
+    wav_path = os.path.join(work_dir, 'temp.wav')
+    audio.export(wav_path, format='wav')
+    try:
+        with sr.AudioFile(wav_path) as source:
+            return sr.Recognizer().record(source)
+    finally:
+        os.remove(wav_path)
+
+
+def in_memory_path(audio_path, work_dir):
+    """Decode, downmix and trim in memory"""
+    return circuit_audio.prepare_audio(audio_path)
+
+
+def upload_bytes(audio_data):
+    """FLAC payload size recognize_google would send for this audio"""
+    return len(audio_data.get_flac_data(
+        convert_rate=None if audio_data.sample_rate >= 8000 else 8000, convert_width=2
+    ))
+
+
+def measure(prepare, audio_path, work_dir, runs):
+    """
+    Time a preparation path plus FLAC encoding and report the upload size
+
+    Returns:
+        dict: Median/min wall time in ms, upload bytes and audio duration
+    """
+    samples = []
+    audio_data = None
+    payload = 0
+    for _ in range(runs):
+        # Include the FLAC encode: recognize_google does it before uploading
+        start = time.perf_counter()
+        audio_data = prepare(audio_path, work_dir)
+        payload = upload_bytes(audio_data)
+        samples.append((time.perf_counter() - start) * 1000)
+    frames = len(audio_data.frame_data) // audio_data.sample_width
+    return {
+        'median_ms': statistics.median(samples),
+        'min_ms': min(samples),
+        'upload_bytes': payload,
+        'duration_s': frames / audio_data.sample_rate,
+        'sample_rate': audio_data.sample_rate,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--input', help="Recording to use instead of the synthetic one")
+    parser.add_argument('--runs', type=int, default=10, help="Repetitions per path")
+    parser.add_argument('--json', action='store_true', help="Print machine-readable results")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        audio_path = args.input
+        if audio_path is None:
+            audio_path = os.path.join(work_dir, 'recording.wav')
+            synthetic_recording(audio_path)
+        results = {
+            'legacy': measure(legacy_path, audio_path, work_dir, args.runs),
+            'in_memory': measure(in_memory_path, audio_path, work_dir, args.runs),
+        }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for name, result in results.items():
+            print(f"{name:10s} {result['median_ms']:8.2f} ms  {result['upload_bytes']:8d} bytes  "
+                  f"{result['duration_s']:.2f} s @ {result['sample_rate']} Hz")
+        saved = 1 - results['in_memory']['upload_bytes'] / results['legacy']['upload_bytes']
+        print(f"upload payload reduced by {saved:.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
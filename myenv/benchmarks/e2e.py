@@ -0,0 +1,305 @@
+"""
+Deterministic end-to-end benchmark with local stand-ins for STT and Gemini
+
+Speech recognition and Gemini are replaced by the fakes in
+benchmarks/fakes.py, which sleep for a seeded latency instead of calling the
+network. Each target is driven from a pool of concurrent callers at every
+--concurrency level:
+
+    parse          parse_command_with_gemini_v2 over the command corpus
+    render         generate_circuit_schematic for the parsed corpus
+    process_text   the full text handler (parse, render, write, preview)
+    process_audio  the full voice handler over the audio fixtures
+
+Audio fixtures are synthesized deterministically, one per corpus command
+(tones whose length follows the word count, padded with silence, 44.1 kHz
+stereo like a browser recording). Use --audio-dir with a transcripts.json
+mapping file names to transcripts to benchmark real recordings instead.
+
+Circuits go to a temporary CIRCUIT_DIR, LTspice is never launched and the
+parse cache is disabled unless --cache is given, so repeated runs are
+comparable. The handlers stream their progress, so for them the time to the
+first update (the transcript, or the parsed components for text) is
+reported next to the full latency. Results are written as JSON; --compare
+prints the change against an earlier results file.
+
+Usage:
+    python benchmarks/e2e.py --output results.json
+    python benchmarks/e2e.py --concurrency 1 8 --requests 100 --llm-latency-ms 800 --compare results.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+
+TARGETS = ('parse', 'render', 'process_text', 'process_audio')
+
+FIXTURE_RATE = 44100
+
+
+def load_corpus(path):
+    """Commands from a corpus file, skipping blank lines and # comments"""
+    with open(path, encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith('#')]
+
+
+def percentile(samples, fraction):
+    """Nearest-rank percentile of a list of numbers"""
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+
+def write_fixture(path, index, words):
+    """
+    Write a deterministic stand-in recording for a command
+
+    Speech is imitated by one 150 ms tone burst per word, with frequencies
+    derived from the fixture index, padded by 400 ms of silence.
+    """
+    import numpy as np
+
+    burst = np.arange(int(0.15 * FIXTURE_RATE)) / FIXTURE_RATE
+    envelope = np.hanning(burst.size)
+    tones = [0.3 * envelope * np.sin(2 * np.pi * (180 + 37 * ((index * 7 + i) % 23)) * burst)
+             for i in range(max(words, 1))]
+    silence = np.zeros(int(0.4 * FIXTURE_RATE))
+    mono = np.concatenate([silence] + tones + [silence])
+    samples = (np.repeat(mono[:, None], 2, axis=1) * 32767).astype('<i2')
+    with wave.open(path, 'wb') as f:
+        f.setnchannels(2)
+        f.setsampwidth(2)
+        f.setframerate(FIXTURE_RATE)
+        f.writeframes(samples.tobytes())
+
+
+def audio_fixtures(args, corpus, work_dir):
+    """
+    Recordings and their transcripts
+
+    Returns:
+        list: (path, transcript) pairs
+    """
+    if args.audio_dir:
+        with open(os.path.join(args.audio_dir, 'transcripts.json'), encoding='utf-8') as f:
+            transcripts = json.load(f)
+        return [(os.path.join(args.audio_dir, name), text) for name, text in sorted(transcripts.items())]
+
+    fixture_dir = os.path.join(work_dir, 'fixtures')
+    os.makedirs(fixture_dir, exist_ok=True)
+    fixtures = []
+    for index, command in enumerate(corpus):
+        path = os.path.join(fixture_dir, f'command_{index:02d}.wav')
+        write_fixture(path, index, len(command.split()))
+        fixtures.append((path, command))
+    return fixtures
+
+
+def streamed(handler):
+    """
+    Wrap a streaming UI handler for run_scenario
+
+    Returns:
+        callable: item -> (succeeded, seconds until the first update)
+    """
+    def call(item):
+        start = time.perf_counter()
+        first = None
+        status = ''
+        for status, *_ in handler(item):
+            if first is None:
+                first = time.perf_counter() - start
+        return status.startswith('Circuit created'), first
+
+    return call
+
+
+def run_scenario(call, items, concurrency, requests):
+    """
+    Call `call` on `requests` items from `concurrency` threads
+
+    `call` returns whether it succeeded, or for streaming handlers a
+    (succeeded, seconds to first update) pair.
+
+    Returns:
+        dict: Throughput, latency percentiles in ms and error count
+    """
+    def timed(item):
+        start = time.perf_counter()
+        try:
+            outcome = call(item)
+        except Exception:
+            outcome = False
+        ok, first = outcome if isinstance(outcome, tuple) else (outcome, None)
+        return time.perf_counter() - start, ok, first
+
+    work = [items[i % len(items)] for i in range(requests)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(timed, work))
+    elapsed = time.perf_counter() - start
+    latencies = [latency * 1000 for latency, _, _ in outcomes]
+    result = {
+        'requests': requests,
+        'errors': sum(1 for _, ok, _ in outcomes if not ok),
+        'elapsed_s': elapsed,
+        'throughput_per_s': requests / elapsed,
+        'p50_ms': percentile(latencies, 0.50),
+        'p95_ms': percentile(latencies, 0.95),
+        'p99_ms': percentile(latencies, 0.99),
+        'max_ms': max(latencies),
+    }
+    firsts = [first * 1000 for _, _, first in outcomes if first is not None]
+    if firsts:
+        result['first_update_p50_ms'] = percentile(firsts, 0.50)
+        result['first_update_p95_ms'] = percentile(firsts, 0.95)
+    return result
+
+
+def git_commit():
+    """Current commit of the working tree, if available"""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCHMARK_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path):
+    """Print throughput and latency changes against an earlier run"""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = {(r['target'], r['concurrency']): r for r in json.load(f)['results']}
+    print(f"\nvs {baseline_path}:")
+    for result in results:
+        before = baseline.get((result['target'], result['concurrency']))
+        if before is None:
+            continue
+        changes = '  '.join(
+            f"{key} {result[key] / before[key] - 1:+.1%}" if before[key] else f"{key} n/a"
+            for key in ('throughput_per_s', 'p50_ms', 'p99_ms', 'first_update_p50_ms')
+            if key in result and key in before
+        )
+        print(f"{result['target']:14s} c={result['concurrency']:<3d} {changes}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--targets', nargs='+', choices=TARGETS, default=list(TARGETS))
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16], help="Concurrency levels")
+    parser.add_argument('--requests', type=int, default=40, help="Requests per target and level")
+    parser.add_argument('--corpus', default=os.path.join(BENCHMARK_DIR, 'corpus.txt'))
+    parser.add_argument('--audio-dir', help="Real recordings with a transcripts.json")
+    parser.add_argument('--llm-latency-ms', type=float, default=250)
+    parser.add_argument('--llm-jitter-ms', type=float, default=100)
+    parser.add_argument('--llm-failure-rate', type=float, default=0.0)
+    parser.add_argument('--llm-invalid-rate', type=float, default=0.0, help="Fraction of malformed replies")
+    parser.add_argument('--stt-latency-ms', type=float, default=300)
+    parser.add_argument('--stt-jitter-ms', type=float, default=100)
+    parser.add_argument('--stt-failure-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=0, help="Seed for the fakes' latency draws")
+    parser.add_argument('--cache', action='store_true', help="Keep the parse cache enabled")
+    parser.add_argument('--output', help="Write the JSON results here (default: stdout)")
+    parser.add_argument('--compare', help="Earlier JSON results to compare against")
+    args = parser.parse_args(argv)
+
+    work_dir = tempfile.mkdtemp(prefix='circuit_e2e_')
+    # Must be set before the circuit modules read their configuration
+    os.environ['CIRCUIT_DIR'] = os.path.join(work_dir, 'circuits')
+    os.environ['LTSPICE_PATH'] = os.path.join(work_dir, 'no-ltspice')
+
+    import circuit_audio
+    import circuit_core
+    import voice_circuit
+    from circuit_metrics import metrics
+    from fakes import FakeGeminiModel, FakeRecognizer, audio_key
+
+    corpus = load_corpus(args.corpus)
+    fixtures = audio_fixtures(args, corpus, work_dir)
+
+    model = FakeGeminiModel(args.llm_latency_ms, args.llm_jitter_ms, args.llm_failure_rate,
+                            invalid_rate=args.llm_invalid_rate, seed=args.seed)
+    transcripts = {audio_key(circuit_audio.prepare_audio(path)): text for path, text in fixtures}
+    recognizer = FakeRecognizer(transcripts, args.stt_latency_ms, args.stt_jitter_ms,
+                                args.stt_failure_rate, seed=args.seed + 1)
+    circuit_core.set_gemini_model(model)
+    circuit_audio.set_recognizer(recognizer)
+    if not args.cache:
+        circuit_core.parse_cache = circuit_core.ParseCache(None, size=0)
+
+    # Render inputs are parsed once up front, so render is measured alone
+    with open(os.devnull, 'w') as devnull:
+        sys.stdout, stdout = devnull, sys.stdout
+        try:
+            parsed = [circuit_core.parse_command_with_gemini_v2(command) for command in corpus]
+        finally:
+            sys.stdout = stdout
+
+    scenarios = {
+        'parse': (lambda command: bool(circuit_core.parse_command_with_gemini_v2(command)), corpus),
+        'render': (lambda components: bool(circuit_core.generate_circuit_schematic(components)), parsed),
+        'process_text': (streamed(voice_circuit.process_text), corpus),
+        'process_audio': (streamed(voice_circuit.process_audio), [path for path, _ in fixtures]),
+    }
+
+    results = []
+    for target in args.targets:
+        call, items = scenarios[target]
+        for concurrency in args.concurrency:
+            metrics.reset()
+            llm_calls, stt_calls = model.calls, recognizer.calls
+            # The handlers print debug output for every request
+            with open(os.devnull, 'w') as devnull:
+                sys.stdout, stdout = devnull, sys.stdout
+                try:
+                    result = run_scenario(call, items, concurrency, args.requests)
+                finally:
+                    sys.stdout = stdout
+            snapshot = metrics.snapshot()
+            result.update({
+                'target': target,
+                'concurrency': concurrency,
+                'llm_calls': model.calls - llm_calls,
+                'stt_calls': recognizer.calls - stt_calls,
+                'stages_p50_ms': {stage: s['p50_ms'] for stage, s in snapshot['stages'].items()},
+                'counters': snapshot['counters'],
+            })
+            results.append(result)
+            first = (f"  first update p50 {result['first_update_p50_ms']:8.1f} ms"
+                     if 'first_update_p50_ms' in result else '')
+            print(f"{target:14s} c={concurrency:<3d} {result['throughput_per_s']:8.1f}/s  "
+                  f"p50 {result['p50_ms']:8.1f} ms  p99 {result['p99_ms']:8.1f} ms  "
+                  f"errors {result['errors']}{first}", file=sys.stderr)
+
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'corpus_size': len(corpus),
+            'audio_fixtures': len(fixtures),
+            'config': {key: value for key, value in vars(args).items() if key not in ('output', 'compare')},
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    if args.compare:
+        compare(results, args.compare)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
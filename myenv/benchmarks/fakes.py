@@ -0,0 +1,284 @@
+"""
+Local stand-ins for the speech recognizer and the Gemini model
+
+Both sleep for a configurable, seeded latency instead of calling the network,
+so benchmark runs are repeatable. Install them with
+circuit_audio.set_recognizer() and circuit_core.set_gemini_model().
+
+FakeServiceServer serves the same answers over HTTP, speaking the Gemini
+REST and Google Speech APIs, so circuit_remote's real clients, connection
+pool, retries and hedging can be exercised without the network.
+"""
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Default Gemini answer for commands the local grammar cannot place
+DEFAULT_RESPONSE = {"topology": "basic_circuit", "V": 5, "R": 1, "C": 2}
+
+# The command is embedded JSON-encoded on the prompt's "Command:" line, or a
+# batch as a JSON array of {id, command} on the "Commands:" line
+_COMMAND_RE = re.compile(r'^Command: (".*")$', re.MULTILINE)
+_COMMANDS_RE = re.compile(r'^Commands: (\[.*\])$', re.MULTILINE)
+
+
+class _Latency:
+    """Seeded latency and failure draws shared by the fakes"""
+
+    def __init__(self, latency_ms, jitter_ms, failure_rate, seed):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def wait(self):
+        """Sleep for one call's latency and report whether it should fail"""
+        with self._lock:
+            self.calls += 1
+            delay = self.latency_ms + self._random.uniform(0, self.jitter_ms)
+            fail = self._random.random() < self.failure_rate
+        time.sleep(delay / 1000)
+        return fail
+
+
+class FakeUsage:
+    """Mimics usage_metadata, estimating 4 characters per token"""
+
+    def __init__(self, prompt, text):
+        self.prompt_token_count = max(1, len(prompt) // 4)
+        self.candidates_token_count = max(1, len(text) // 4)
+        self.total_token_count = self.prompt_token_count + self.candidates_token_count
+
+
+class FakeResponse:
+    """Mimics the `.text` and `.usage_metadata` of a google.generativeai response"""
+
+    def __init__(self, text, prompt=''):
+        self.text = text
+        self.usage_metadata = FakeUsage(prompt, text)
+
+
+class FakeGeminiModel:
+    """
+    Answer generate_content() locally after a simulated round trip
+
+    Args:
+        latency_ms (float): Fixed part of every call's latency
+        jitter_ms (float): Extra uniformly distributed latency
+        failure_rate (float): Fraction of calls that raise, as a quota or network error would
+        responses (dict): Command -> components dict to return for that command
+        invalid_rate (float): Fraction of first attempts answered with truncated JSON,
+            or of batch entries answered with an unknown topology
+        seed (int): Seed for the latency and failure draws
+    """
+
+    def __init__(self, latency_ms=400, jitter_ms=200, failure_rate=0.0, responses=None, invalid_rate=0.0, seed=0):
+        self._latency = _Latency(latency_ms, jitter_ms, failure_rate, seed)
+        self.responses = responses or {}
+        self.invalid_rate = invalid_rate
+        self._invalid = random.Random(seed + 100)
+
+    @property
+    def calls(self):
+        return self._latency.calls
+
+    def answer(self, command):
+        """
+        Components the fake returns for a command
+
+        Known commands use `responses`; others get what the local grammar
+        makes of them, or DEFAULT_RESPONSE if it finds no topology.
+        """
+        if command in self.responses:
+            return self.responses[command]
+        from circuit_core import parse_command_locally
+
+        components, _ = parse_command_locally(command)
+        return components or DEFAULT_RESPONSE
+
+    def generate_content(self, prompt, generation_config=None):
+        if self._latency.wait():
+            raise RuntimeError("fake Gemini: simulated service error")
+        batch = _COMMANDS_RE.search(prompt)
+        if batch:
+            entries = []
+            for item in json.loads(batch.group(1)):
+                entry = dict(self.answer(item['command']), id=item['id'])
+                if self._invalid.random() < self.invalid_rate:
+                    entry['topology'] = 'unknown_filter'
+                entries.append(entry)
+            return FakeResponse(json.dumps(entries), prompt)
+
+        match = _COMMAND_RE.search(prompt)
+        text = json.dumps(self.answer(json.loads(match.group(1)) if match else ''))
+        # Repair requests quote the rejected reply and are always answered properly
+        if 'previous reply was rejected' not in prompt and self._invalid.random() < self.invalid_rate:
+            text = text[:len(text) // 2]
+        return FakeResponse(text, prompt)
+
+
+class FakeRecognizer:
+    """
+    Transcribe known audio locally after a simulated round trip
+
+    Audio is matched by a hash of its samples, so the same fixture always
+    yields the same transcript regardless of call order.
+
+    Args:
+        transcripts (dict): audio_key(AudioData) -> transcript
+        latency_ms (float): Fixed part of every call's latency
+        jitter_ms (float): Extra uniformly distributed latency
+        failure_rate (float): Fraction of calls that raise sr.RequestError
+        seed (int): Seed for the latency and failure draws
+    """
+
+    def __init__(self, transcripts=None, latency_ms=600, jitter_ms=300, failure_rate=0.0, seed=1):
+        self._latency = _Latency(latency_ms, jitter_ms, failure_rate, seed)
+        self.transcripts = transcripts or {}
+
+    @property
+    def calls(self):
+        return self._latency.calls
+
+    def recognize_google(self, audio_data):
+        import speech_recognition as sr
+
+        if self._latency.wait():
+            raise sr.RequestError("fake recognizer: simulated service error")
+        transcript = self.transcripts.get(audio_key(audio_data))
+        if transcript is None:
+            raise sr.UnknownValueError()
+        return transcript
+
+
+def audio_key(audio_data):
+    """Stable key for prepared audio"""
+    return hashlib.sha1(audio_data.get_raw_data()).hexdigest()
+
+
+class _FakeServiceHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 keeps connections open, so client-side reuse is visible
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        self.server.fake.count_connection()
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        status, reply = self.server.fake.handle(self.path, body)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(reply)))
+        self.end_headers()
+        self.wfile.write(reply)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeServiceServer:
+    """
+    Local HTTP server for Gemini generateContent and Google Speech requests
+
+    Every request waits a seeded latency. A share of requests stall for
+    `slow_ms` (slow_rate), which hedging should hide, and a share are
+    answered with HTTP 503 (failure_rate), which retries and the circuit
+    breaker should handle. The rates are plain attributes, so they can be
+    changed while the server runs. Point the clients at `url` with
+    GEMINI_API_URL and STT_API_URL (url + STT_PATH), or pass api_url to
+    circuit_remote.GeminiClient.
+
+    Args:
+        latency_ms (float): Fixed part of every request's latency
+        jitter_ms (float): Extra uniformly distributed latency
+        slow_rate (float): Fraction of requests that take slow_ms instead
+        slow_ms (float): Latency of a slow request
+        failure_rate (float): Fraction of requests answered with HTTP 503
+        transcripts (dict): sha1 of the FLAC request body -> transcript
+        seed (int): Seed for the latency, stall and failure draws
+    """
+
+    STT_PATH = '/speech-api/v2/recognize'
+
+    def __init__(self, latency_ms=50, jitter_ms=20, slow_rate=0.0, slow_ms=1000, failure_rate=0.0,
+                 transcripts=None, seed=2):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.slow_rate = slow_rate
+        self.slow_ms = slow_ms
+        self.failure_rate = failure_rate
+        self.transcripts = transcripts or {}
+        self.requests = 0
+        self.connections = 0
+        self._model = FakeGeminiModel(latency_ms=0, jitter_ms=0, seed=seed)
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), _FakeServiceHandler)
+        self._server.daemon_threads = True
+        self._server.fake = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='fake-services', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def count_connection(self):
+        with self._lock:
+            self.connections += 1
+
+    def handle(self, path, body):
+        """Answer one request after its simulated latency; returns (status, body bytes)"""
+        with self._lock:
+            self.requests += 1
+            delay = self.latency_ms + self._random.uniform(0, self.jitter_ms)
+            if self._random.random() < self.slow_rate:
+                delay = self.slow_ms
+            fail = self._random.random() < self.failure_rate
+        time.sleep(delay / 1000)
+        if fail:
+            return 503, json.dumps({'error': {'code': 503, 'message': 'fake: simulated overload'}}).encode()
+
+        if ':generateContent' in path:
+            prompt = json.loads(body)['contents'][0]['parts'][0]['text']
+            response = self._model.generate_content(prompt)
+            usage = response.usage_metadata
+            return 200, json.dumps({
+                'candidates': [{'content': {'role': 'model', 'parts': [{'text': response.text}]}}],
+                'usageMetadata': {'promptTokenCount': usage.prompt_token_count,
+                                  'candidatesTokenCount': usage.candidates_token_count,
+                                  'totalTokenCount': usage.total_token_count},
+            }).encode()
+
+        if path.startswith(self.STT_PATH):
+            # Like the real API: an empty result first, then the transcript if any
+            lines = [json.dumps({'result': []})]
+            transcript = self.transcripts.get(hashlib.sha1(body).hexdigest())
+            if transcript is not None:
+                lines.append(json.dumps({'result': [{'alternative': [{'transcript': transcript, 'confidence': 0.9}],
+                                                     'final': True}], 'result_index': 0}))
+            return 200, '\n'.join(lines).encode()
+
+        return 404, json.dumps({'error': {'code': 404, 'message': f'fake: no route {path}'}}).encode()
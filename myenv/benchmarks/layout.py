@@ -0,0 +1,76 @@
+"""
+Place and route random netlists of increasing size
+
+Each netlist is a chain of random parts. Transistors and op-amps connect
+their middle pin to a random earlier net or ground, so many nets span
+several rows. The layout is timed, its wires are checked for
+overlaps, and the schematic is read back with circuit_sim.parse_asc to check
+that every pin ended up on the intended net.
+
+Usage:
+    python benchmarks/layout.py [--sizes 10 100 500 2000] [--seed 0]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+
+# Symbol of each random part and its instance-name prefix
+PART_KINDS = [('res', 'R'), ('cap', 'C'), ('ind', 'L'), ('diode', 'D'), ('npn', 'Q'), ('nmos', 'M'), ('opamp', 'U')]
+
+
+def random_parts(count, rng):
+    """A connected random netlist of about count parts, one source first"""
+    nets = ['in']
+    parts = [('V1', 'voltage', ('in', '0'), 5)]
+    for index in range(1, count):
+        symbol, prefix = rng.choice(PART_KINDS)
+        pins = 3 if symbol in ('npn', 'nmos', 'opamp') else 2
+        new = f"N{index}"
+        # One pin on the newest net, the others anywhere, sometimes ground
+        chosen = [nets[-1]] + [rng.choice(nets + ['0']) for _ in range(pins - 2)] + [new]
+        nets.append(new)
+        parts.append((f"{prefix}{index}", symbol, tuple(chosen), None if symbol == 'opamp' else '1k'))
+    return parts
+
+
+def same_nets(parts, netlist):
+    """True if the parsed netlist groups pins exactly like the intended one"""
+    mapping = {}
+    by_name = {component.name: component.nodes for component in netlist.components}
+    for name, _, nets, *_ in parts:
+        for want, got in zip(nets, by_name[name]):
+            if mapping.setdefault(want, got) != got:
+                return False
+    return len(set(mapping.values())) == len(mapping)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 500, 2000])
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    import circuit_sim
+    from circuit_layout import layout_schematic, wire_overlaps
+
+    rng = random.Random(args.seed)
+    for size in args.sizes:
+        parts = random_parts(size, rng)
+        start = time.perf_counter()
+        schematic = layout_schematic(parts, ['.op'])
+        elapsed = time.perf_counter() - start
+        wires = schematic.count('\nWIRE ')
+        overlaps = len(wire_overlaps(schematic))
+        matches = same_nets(parts, circuit_sim.parse_asc(schematic))
+        print(f"{size:6d} parts {wires:7d} wires in {elapsed * 1000:8.1f} ms  "
+              f"overlaps {overlaps}  nets {'ok' if matches else 'MISMATCH'}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+"""
+Write a large synthetic LTspice .raw file and time reading it back
+
+A long .tran result (float64 time, float32 node voltages, point by point as
+LTspice writes it) is generated block by block, then opened, one trace is
+reduced, and every trace is decimated for plotting. The Python heap peak is
+reported with tracemalloc next to the file size, to show that reading does
+not grow with the file. An AC file is timed the same way.
+
+Usage:
+    python benchmarks/raw.py [--points 10000000] [--traces 4] [--dir /tmp/raw]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+
+# Points generated per block while writing
+BLOCK = 1 << 20
+
+
+def transient_blocks(points, traces):
+    """Blocks of a damped sine at a few frequencies, one per node"""
+    import numpy as np
+
+    for start in range(0, points, BLOCK):
+        t = np.arange(start, min(points, start + BLOCK)) * 1e-7
+        yield [t] + [np.exp(-t * (index + 1)) * np.sin(2 * np.pi * 1e3 * (index + 1) * t)
+                     for index in range(traces)]
+
+
+def timed(label, call, size=None):
+    """Run call() and print its time and Python heap peak"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = call()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    detail = f"  ({size / elapsed / 1e6:.0f} MB/s)" if size else ''
+    print(f"{label:34s} {elapsed * 1000:9.1f} ms  heap peak {peak / 1e6:7.2f} MB{detail}")
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--points', type=int, default=10_000_000, help="Transient points")
+    parser.add_argument('--traces', type=int, default=4, help="Node voltages besides time")
+    parser.add_argument('--ac-points', type=int, default=100_001, help="AC sweep points")
+    parser.add_argument('--dir', help="Keep the generated files here")
+    args = parser.parse_args(argv)
+
+    import numpy as np
+    from circuit_raw import decimate, read_raw, results_figure, write_raw
+
+    work_dir = args.dir or tempfile.mkdtemp(prefix='circuit_raw_')
+    os.makedirs(work_dir, exist_ok=True)
+    try:
+        tran_path = os.path.join(work_dir, 'tran.raw')
+        variables = [('time', 'time')] + [(f'V(n{index:03d})', 'voltage') for index in range(args.traces)]
+        start = time.perf_counter()
+        write_raw(tran_path, 'Transient Analysis', variables, transient_blocks(args.points, args.traces))
+        size = os.path.getsize(tran_path)
+        print(f"wrote {args.points} points x {len(variables)} traces, {size / 1e6:.0f} MB "
+              f"in {time.perf_counter() - start:.2f} s")
+
+        raw = timed("open", lambda: read_raw(tran_path))
+        name = variables[1][0]
+        timed(f"max of {name}", lambda: float(raw.trace(name).max()), raw.points * 4)
+        timed(f"decimate {name} to 4000", lambda: decimate(raw.trace('time'), raw.trace(name), 4000),
+              raw.points * 12)
+        timed("decimate all traces", lambda: [decimate(raw.trace('time'), raw.trace(n), 4000)
+                                              for n, _ in variables[1:]], size)
+        raw.close()
+        # Import matplotlib outside the timing; tracemalloc slows imports down a lot
+        import matplotlib.figure  # noqa: F401
+        timed("results_figure", lambda: results_figure(tran_path))
+
+        ac_path = os.path.join(work_dir, 'ac.raw')
+        freqs = np.logspace(0, 6, args.ac_points)
+        response = 1 / (1 + 1j * freqs / 1e3)
+        write_raw(ac_path, 'AC Analysis', [('frequency', 'frequency'), ('V(out)', 'voltage')],
+                  [[freqs.astype(complex), response]])
+        timed("AC results_figure", lambda: results_figure(ac_path))
+    finally:
+        if not args.dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
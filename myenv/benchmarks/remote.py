@@ -0,0 +1,139 @@
+"""
+Tail latency, retries and failover of remote calls against a local fake server
+
+A FakeServiceServer answers Gemini requests after a seeded latency, with a
+share of stalled requests and HTTP 503 errors. The same request stream is
+sent through circuit_remote's pooled Gemini client at several settings:
+
+    plain     one request per call, no retries or hedging
+    retries   jittered retries within the deadline
+    hedged    retries plus a duplicate request after the recent p95 latency
+
+For each setting it reports latency percentiles, failed calls, requests
+the server saw, and connections it accepted (pooling keeps these close to
+the concurrency). Finally the server fails every request, to show the
+circuit breaker opening so that calls fail at once and parsing falls back
+to the local grammar, then recovering after its reset time.
+
+Usage:
+    python benchmarks/remote.py [--calls 400] [--concurrency 8] [--slow-rate 0.02]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+sys.path.insert(0, BENCHMARK_DIR)
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else float('nan')
+
+
+def run_calls(service, client, prompts, concurrency):
+    """Send every prompt through service; returns (latencies in s, failed calls)"""
+    import circuit_core
+
+    def one(prompt):
+        start = time.perf_counter()
+        try:
+            service.call(lambda timeout: client.generate_content(
+                prompt, generation_config=circuit_core.GEMINI_GENERATION_CONFIG, timeout=timeout))
+        except Exception:
+            return time.perf_counter() - start, True
+        return time.perf_counter() - start, False
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, prompts))
+    return [latency for latency, _ in results], sum(failed for _, failed in results)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--calls', type=int, default=400)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--latency-ms', type=float, default=40)
+    parser.add_argument('--jitter-ms', type=float, default=20)
+    parser.add_argument('--slow-rate', type=float, default=0.02, help="Share of stalled requests; hedging at p95 only hides stalls rarer than 5%%")
+    parser.add_argument('--slow-ms', type=float, default=1000)
+    parser.add_argument('--failure-rate', type=float, default=0.02, help="Share of HTTP 503 replies")
+    parser.add_argument('--timeout', type=float, default=5, help="Deadline of one call in seconds")
+    args = parser.parse_args(argv)
+
+    from fakes import FakeServiceServer
+
+    with FakeServiceServer(args.latency_ms, args.jitter_ms, args.slow_rate, args.slow_ms,
+                           args.failure_rate) as server:
+        os.environ['GEMINI_API_URL'] = server.url
+        import circuit_core
+        from circuit_metrics import metrics
+        from circuit_remote import CircuitBreaker, GeminiClient, RemoteService, set_remote
+
+        circuit_core.parse_cache = circuit_core.ParseCache(None, size=0)
+        client = GeminiClient('fake-key', circuit_core.GEMINI_MODEL_NAME, api_url=server.url)
+        corpus = os.path.join(BENCHMARK_DIR, 'corpus.txt')
+        with open(corpus, encoding='utf-8') as f:
+            commands = [line.strip() for line in f if line.strip() and not line.startswith('#')]
+        prompts = [circuit_core.GEMINI_PROMPT.format(command=json.dumps(commands[i % len(commands)]))
+                   for i in range(args.calls)]
+
+        settings = [
+            ('plain', dict(retries=0, hedge_quantile=0)),
+            ('retries', dict(retries=2, hedge_quantile=0)),
+            ('hedged', dict(retries=2, hedge_quantile=0.95)),
+        ]
+        for label, options in settings:
+            # A breaker that never opens, so failures show up as failures
+            service = RemoteService('gemini', timeout=args.timeout, breaker=CircuitBreaker('gemini', failures=10 ** 9),
+                                    seed=0, **options)
+            # Warm the latency window (and the connection pool) first
+            run_calls(service, client, prompts[:50], args.concurrency)
+            metrics.reset()
+            requests, connections = server.requests, server.connections
+            latencies, failed = run_calls(service, client, prompts, args.concurrency)
+            counters = metrics.snapshot()['counters']
+            print(f"{label:8s} p50 {percentile(latencies, 0.5) * 1000:7.1f} ms  "
+                  f"p95 {percentile(latencies, 0.95) * 1000:7.1f} ms  "
+                  f"p99 {percentile(latencies, 0.99) * 1000:7.1f} ms  "
+                  f"max {max(latencies) * 1000:7.1f} ms  failed {failed:3d}  "
+                  f"requests {server.requests - requests:4d} ({counters.get('gemini_hedge', 0)} hedges, "
+                  f"{counters.get('gemini_retry', 0)} retries)  "
+                  f"new connections {server.connections - connections}")
+
+        # Outage: every request fails until the server recovers
+        reset_s = 1.0
+        service = RemoteService('gemini', timeout=args.timeout, retries=1, hedge_quantile=0,
+                                breaker=CircuitBreaker('gemini', failures=3, reset_s=reset_s), seed=0)
+        set_remote(service)
+        circuit_core.set_gemini_model(client)
+        server.failure_rate = 1.0
+        metrics.reset()
+        requests = server.requests
+        start = time.perf_counter()
+        latencies, failed = run_calls(service, client, prompts[:40], 1)
+        print(f"outage   {failed} of 40 calls failed in {time.perf_counter() - start:.2f} s, "
+              f"{server.requests - requests} requests sent, "
+              f"{metrics.snapshot()['counters'].get('gemini_breaker_open', 0)} refused by the open breaker "
+              f"(slowest {max(latencies) * 1000:.0f} ms, fastest {min(latencies) * 1000:.2f} ms)")
+        # A command the local grammar only partly understands would normally go to Gemini
+        command = "a low pass filter for my speaker"
+        start = time.perf_counter()
+        components = circuit_core.parse_command_with_gemini_v2(command)
+        print(f"         parsing {command!r} during the outage took {(time.perf_counter() - start) * 1000:.1f} ms, "
+              f"local fallback {metrics.snapshot()['counters'].get('parse_local_fallback', 0)}, "
+              f"topology {components.get('topology')}")
+
+        server.failure_rate = 0.0
+        time.sleep(reset_s)
+        latencies, failed = run_calls(service, client, prompts[:20], 1)
+        print(f"recovery {20 - failed} of 20 calls succeeded after {reset_s:g} s, breaker {service.breaker.state}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,75 @@
+"""
+Simulate a sweep of generated circuits headlessly at several pool sizes
+
+Random standard-value filters are rendered into a temporary directory, with
+a share of exact repeats, and every analysis of every schematic is run on
+the scheduler. Each pool size starts from an empty result cache, so repeats
+are only saved by sharing jobs within the sweep.
+
+Usage:
+    python benchmarks/simulate.py [--count 64] [--workers 1 4 8] [--backend builtin]
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+sys.path.insert(0, BENCHMARK_DIR)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--count', type=int, default=64, help="Schematics in the sweep")
+    parser.add_argument('--repeat-rate', type=float, default=0.25, help="Share of exact repeats")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, os.cpu_count() or 1])
+    parser.add_argument('--backend', default='auto', choices=['auto', 'ltspice', 'ngspice', 'builtin'])
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    work_dir = tempfile.mkdtemp(prefix='circuit_sim_')
+    os.environ['CIRCUIT_DIR'] = work_dir
+
+    import circuit_core
+    from circuit_metrics import metrics
+    from circuit_scheduler import SimulationScheduler
+    from store import random_components
+
+    rng = random.Random(args.seed)
+    paths, unique = [], []
+    try:
+        for index in range(args.count):
+            if unique and rng.random() < args.repeat_rate:
+                components = rng.choice(unique)
+            else:
+                components = random_components(rng)
+                unique.append(components)
+            path = os.path.join(work_dir, f'circuit_{index:04d}.asc')
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(circuit_core.generate_circuit_schematic(components))
+            paths.append(path)
+
+        for workers in args.workers:
+            metrics.reset()
+            cache_dir = os.path.join(work_dir, f'sim_{workers}')
+            start = time.perf_counter()
+            with SimulationScheduler(workers=workers, backend=args.backend, cache_dir=cache_dir) as scheduler:
+                records = list(scheduler.iter_simulations(paths))
+            elapsed = time.perf_counter() - start
+            counters = metrics.snapshot()['counters']
+            jobs = sum(len(record.get('results', {})) for record in records)
+            failed = sum(1 for record in records if record['status'] != 'ok')
+            print(f"{scheduler.backend} workers={workers:<3d} {args.count} circuits, {jobs} analyses in "
+                  f"{elapsed:6.2f} s ({args.count / elapsed:6.1f} circuits/s), "
+                  f"{counters.get('sim_dedup', 0) + counters.get('sim_cached', 0)} reused, {failed} failed")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+"""
+Measure cold-start import time of the circuit designer modules
+
+Each module is imported in a fresh interpreter several times and the median
+wall time is reported, so results are comparable between runs and machines.
+
+Usage:
+    python benchmarks/startup.py [--runs 15] [--json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(HERE)
+
+# Modules to time and the budget each one should stay under, in milliseconds
+MODULES = {
+    'circuit_core': 100,
+    'circuit_cli': 100,
+    'voice_circuit': 100,
+}
+
+_TIMER = (
+    "import time; t = time.perf_counter(); import {module}; "
+    "print((time.perf_counter() - t) * 1000)"
+)
+
+
+def time_import(module, runs):
+    """
+    Import a module in fresh interpreters and collect the wall times
+
+    Args:
+        module (str): Module name, importable from the project directory
+        runs (int): Number of interpreters to start
+
+    Returns:
+        list: Import times in milliseconds
+    """
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, '-c', _TIMER.format(module=module)],
+            cwd=PROJECT_DIR, capture_output=True, text=True, check=True
+        ).stdout
+        samples.append(float(output.strip().splitlines()[-1]))
+    return samples
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=15, help="Interpreters per module")
+    parser.add_argument('--json', action='store_true', help="Print machine-readable results")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for module, budget in MODULES.items():
+        samples = time_import(module, args.runs)
+        results[module] = {
+            'median_ms': statistics.median(samples),
+            'min_ms': min(samples),
+            'max_ms': max(samples),
+            'budget_ms': budget,
+        }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for module, result in results.items():
+            status = 'ok' if result['median_ms'] <= result['budget_ms'] else 'OVER BUDGET'
+            print(f"{module:15s} median {result['median_ms']:7.2f} ms "
+                  f"(min {result['min_ms']:.2f}, max {result['max_ms']:.2f}) {status}")
+    return 0 if all(r['median_ms'] <= r['budget_ms'] for r in results.values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+"""
+Fill a scratch circuit store and time writes, dedup hits and indexed queries
+
+Circuits with random standard values are rendered and stored, with a share
+of exact repeats, then value-range queries such as "band-pass filters with
+C1 < 1 uF" are timed against the index. Everything goes to a temporary
+CIRCUIT_DIR unless --dir is given.
+
+Usage:
+    python benchmarks/store.py [--count 20000] [--repeat-rate 0.2] [--dir /tmp/store]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+
+QUERIES = [
+    ('band_pass_filter', [('C1', '<', 1e-6)]),
+    ('band_pass_filter', [('C1', '<', 1e-6), ('R1', '>=', 1e4)]),
+    ('low_pass_filter', [('R', '=', 4700)]),
+    (None, [('C', '>', 1e-5)]),
+]
+
+
+def random_components(rng):
+    """A random circuit of one of the built-in topologies"""
+    from circuit_synthesis import E24
+
+    decades_r = [10 ** e for e in range(1, 6)]
+    decades_c = [10 ** -e for e in range(5, 12)]
+    mantissas = E24
+
+    def r():
+        return float('%.3g' % (rng.choice(mantissas) * rng.choice(decades_r)))
+
+    def c():
+        return float('%.3g' % (rng.choice(mantissas) * rng.choice(decades_c)))
+
+    topology = rng.choice(['low_pass_filter', 'high_pass_filter', 'band_pass_filter', 'basic_circuit'])
+    if topology == 'band_pass_filter':
+        return {'topology': topology, 'R1': r(), 'R2': r(), 'C1': c(), 'C2': c(), 'V': 1, 'freq': 1000}
+    if topology == 'basic_circuit':
+        return {'topology': topology, 'V': rng.choice([3.3, 5, 12]), 'R': r(), 'C': c()}
+    return {'topology': topology, 'R': r(), 'C': c(), 'V': 1, 'freq': rng.choice([100, 1000, 25000])}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--count', type=int, default=20000, help="Circuits to store")
+    parser.add_argument('--repeat-rate', type=float, default=0.2, help="Share of requests repeating an earlier one")
+    parser.add_argument('--runs', type=int, default=20, help="Repetitions per query")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--dir', help="CIRCUIT_DIR to fill (default: a temporary directory)")
+    args = parser.parse_args(argv)
+
+    # Must be set before the circuit modules read their configuration
+    os.environ['CIRCUIT_DIR'] = args.dir or tempfile.mkdtemp(prefix='circuit_store_')
+    import circuit_core
+    from circuit_store import get_store
+
+    store = get_store()
+    rng = random.Random(args.seed)
+    history = []
+    created = 0
+    start = time.perf_counter()
+    for index in range(args.count):
+        if history and rng.random() < args.repeat_rate:
+            components, command = rng.choice(history)
+        else:
+            components = random_components(rng)
+            command = f"request {index}"
+            history.append((components, command))
+        result = store.put(circuit_core.generate_circuit_schematic(components), components, command)
+        created += result['created']
+    elapsed = time.perf_counter() - start
+    print(f"stored {args.count} requests in {elapsed:.2f} s ({args.count / elapsed:.0f}/s), "
+          f"{created} unique files, {args.count - created} reused")
+    print(f"index: {store.stats()}")
+
+    for topology, conditions in QUERIES:
+        samples = []
+        for _ in range(args.runs):
+            query_start = time.perf_counter()
+            results = store.find(topology, conditions, limit=100)
+            samples.append((time.perf_counter() - query_start) * 1000)
+        label = ' and '.join(f"{key}{operator}{value:g}" for key, operator, value in conditions)
+        print(f"find {topology or 'any':17s} {label:26s} {len(results):4d} results  "
+              f"median {statistics.median(samples):7.3f} ms")
+
+    lookup_start = time.perf_counter()
+    for components, command in history[:1000]:
+        store.lookup(command)
+    print(f"lookup by command: {(time.perf_counter() - lookup_start) / min(len(history), 1000) * 1000:.3f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
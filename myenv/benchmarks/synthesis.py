@@ -0,0 +1,115 @@
+"""
+Time the component-value search and check its picks with the MNA simulator
+
+Every target is solved with each resistor series, the best candidate is
+rendered to an .asc schematic, and its -3 dB frequencies are measured with
+circuit_sim so the reported error is what LTspice would show. Bands that a
+passive RC band-pass cannot reach must be refused by the parser rather than
+answered with a far-off pair; the run fails if one is accepted.
+
+Usage:
+    python benchmarks/synthesis.py [--runs 20] [--json]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import circuit_core
+import circuit_sim
+import circuit_synthesis
+
+TARGETS = [
+    ('low_pass_filter', {'cutoff': 1000}),
+    ('high_pass_filter', {'cutoff': 50}),
+    ('band_pass_filter', {'f_low': 300, 'f_high': 3000}),
+    ('band_pass_filter', {'center': 1000, 'bandwidth': 5000}),
+]
+
+# Commands whose band needs a Q above 1/2, which only an active filter reaches
+INFEASIBLE_COMMANDS = [
+    "band pass filter from 900 Hz to 1100 Hz",
+    "band pass filter with center frequency 10 kHz and bandwidth 1 kHz",
+]
+
+OUTPUT_NODES = {'low_pass_filter': 'OUT', 'high_pass_filter': 'Output_high_pass', 'band_pass_filter': 'OUT'}
+
+
+def measured_edges(components):
+    """-3 dB frequencies (relative to the peak) of the rendered schematic"""
+    netlist = circuit_sim.parse_asc(circuit_core.generate_circuit_schematic(components))
+    freqs = np.logspace(0, 6, 60001)
+    magnitude = np.abs(circuit_sim.ac_analysis(netlist, freqs)[OUTPUT_NODES[components['topology']]])
+    passband = freqs[magnitude >= magnitude.max() / np.sqrt(2)]
+    return float(passband[0]), float(passband[-1])
+
+
+def measure(topology, targets, r_series, runs):
+    """Median search time and simulated error of the best candidate"""
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        best = circuit_synthesis.synthesize(topology, r_series=r_series, top=5, **targets)[0]
+        samples.append((time.perf_counter() - start) * 1000)
+
+    low, high = measured_edges(best)
+    if topology == 'low_pass_filter':
+        expected, actual = (targets['cutoff'],), (high,)
+    elif topology == 'high_pass_filter':
+        expected, actual = (targets['cutoff'],), (low,)
+    else:
+        expected, actual = circuit_synthesis.band_edges(**targets), (low, high)
+    error = max(abs(a / e - 1) for a, e in zip(actual, expected))
+    return {
+        'topology': topology,
+        'targets': targets,
+        'r_series': r_series,
+        'median_ms': statistics.median(samples),
+        'best': best,
+        'simulated_error': error,
+    }
+
+
+def accepted_infeasible():
+    """Commands from INFEASIBLE_COMMANDS that the local parser accepts anyway"""
+    accepted = []
+    for command in INFEASIBLE_COMMANDS:
+        try:
+            components, confidence = circuit_core.parse_command_locally(command)
+        except circuit_core.ParseError as e:
+            print(f"refused  {command!r}: {e}")
+            continue
+        accepted.append(command)
+        print(f"ACCEPTED {command!r} at confidence {confidence:.2f}: {components}")
+    return accepted
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=20, help="Repetitions per search")
+    parser.add_argument('--json', action='store_true', help="Print machine-readable results")
+    args = parser.parse_args(argv)
+
+    # Warm up NumPy so the first search is not charged for it
+    circuit_synthesis.synthesize('low_pass_filter', cutoff=1000)
+    results = [measure(topology, targets, series, args.runs)
+               for topology, targets in TARGETS for series in ('E24', 'E96')]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for result in results:
+            target = ', '.join(f"{key}={value:g}" for key, value in result['targets'].items())
+            print(f"{result['topology']:17s} {target:28s} {result['r_series']}  "
+                  f"{result['median_ms']:6.2f} ms  simulated error {result['simulated_error']:.2%}")
+    return 1 if accepted_infeasible() else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+"""
+Measure request latency of the Gradio app under concurrent load
+
+Fires --requests text commands from --concurrency simultaneous clients and
+reports throughput and p50/p99 latency. By default it talks to a running
+app through gradio_client; with --local it calls process_text directly on a
+thread pool the size of UI_WORKERS, which isolates handler cost from HTTP.
+
+Usage:
+    python voice_circuit.py &                  # start the app
+    python benchmarks/ui_load.py --concurrency 16 --requests 200
+    python benchmarks/ui_load.py --local --concurrency 8
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+COMMANDS = [
+    "RC low pass filter with 10k and 1uF",
+    "RC high pass filter with 4.7k resistor and 0.1uF capacitor",
+    "RC band pass filter with 1 ohm resistors and 100 microfarad capacitors at 25 kilohertz",
+    "simple circuit with 5V, 1 ohm resistor and 2 uF capacitor",
+]
+
+
+def percentile(samples, fraction):
+    """
+    Nearest-rank percentile
+
+    Args:
+        samples (list): Latencies
+        fraction (float): Percentile as a fraction, e.g. 0.99
+
+    Returns:
+        float: The requested percentile
+    """
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+
+def make_caller(args):
+    """Return a function that sends one command and blocks until it completes"""
+    if args.local:
+        import voice_circuit
+        # The handler streams its progress; drain it to the final update
+        return lambda command: list(voice_circuit.process_text(command))[-1]
+
+    from gradio_client import Client
+    client = Client(args.url, verbose=False)
+    return lambda command: client.predict(command, api_name="/process_text")
+
+
+def run_load(call, concurrency, requests):
+    """
+    Send requests from a pool of concurrent clients
+
+    Args:
+        call (callable): Sends one command
+        concurrency (int): Simultaneous clients
+        requests (int): Total requests
+
+    Returns:
+        dict: Throughput and latency statistics in milliseconds
+    """
+    def timed(index):
+        start = time.perf_counter()
+        call(COMMANDS[index % len(COMMANDS)])
+        return (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(timed, range(requests)))
+    elapsed = time.perf_counter() - start
+    return {
+        'concurrency': concurrency,
+        'requests': requests,
+        'elapsed_s': elapsed,
+        'requests_per_s': requests / elapsed,
+        'p50_ms': percentile(latencies, 0.50),
+        'p99_ms': percentile(latencies, 0.99),
+        'mean_ms': statistics.mean(latencies),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--url', default='http://127.0.0.1:7860/', help="Running app to load")
+    parser.add_argument('--local', action='store_true', help="Call process_text in-process instead")
+    parser.add_argument('--concurrency', type=int, default=8, help="Simultaneous clients")
+    parser.add_argument('--requests', type=int, default=100, help="Total requests")
+    parser.add_argument('--json', action='store_true', help="Print machine-readable results")
+    args = parser.parse_args(argv)
+
+    result = run_load(make_caller(args), args.concurrency, args.requests)
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print(f"{result['requests']} requests at concurrency {result['concurrency']}: "
+              f"{result['requests_per_s']:.1f} req/s, p50 {result['p50_ms']:.1f} ms, p99 {result['p99_ms']:.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,179 @@
+"""
+Validate the MNA simulator against the bundled topologies and time it at scale
+
+1. Every bundled reference schematic and a set of rendered variants are
+   parsed and simulated; AC and transient results are compared with the
+   closed-form models in circuit_preview.
+2. The default circuits are simulated through their own .tran directives,
+   as the scheduler runs them, and the output must swing as much as the
+   analytic steady state; a step that aliases the source reads flat.
+3. An RC ladder with --sections stages (two nodes per stage) is generated as
+   an .asc schematic, parsed and solved to show how the engine scales.
+
+Usage:
+    python benchmarks/validate_sim.py [--sections 2000] [--json]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import circuit_core
+import circuit_preview
+import circuit_sim
+
+# Output node of each analytic model in its reference schematic
+OUTPUT_NODES = {
+    'low_pass_filter': 'OUT',
+    'high_pass_filter': 'Output_high_pass',
+    'band_pass_filter': 'OUT',
+}
+
+VARIANTS = [
+    {},
+    {'R': 4700, 'C': 1e-7, 'R1': 1000, 'R2': 2200, 'C1': 1e-8, 'C2': 4.7e-8, 'V': 2, 'freq': 1000},
+    {'R': '10k', 'C': '1u', 'R1': '330', 'R2': '47k', 'C1': '220n', 'C2': '1u', 'freq': 50},
+]
+
+# Tolerances: AC is exact up to round-off; the trapezoidal transient is
+# checked at a step of 1/200 of the source period
+AC_TOLERANCE = 1e-6
+TRAN_TOLERANCE = 2e-3
+
+# Allowed relative difference of the simulated and analytic output swing
+SWING_TOLERANCE = 0.05
+
+
+def validate_topologies():
+    """Compare simulator and analytic results for every topology and variant"""
+    results = []
+    templates = circuit_core.get_topology_templates()
+    for topology, node in OUTPUT_NODES.items():
+        for variant in VARIANTS:
+            components = dict(variant, topology=topology)
+            netlist = circuit_sim.parse_asc(circuit_core.generate_circuit_schematic(components))
+            params = circuit_preview.parameters(components)
+
+            freqs = circuit_preview.ac_frequencies(circuit_preview.analysis_directives(topology)[0])
+            simulated = circuit_sim.ac_analysis(netlist, freqs)[node]
+            analytic = circuit_preview.sweep_frequency_response(topology, params, freqs)[0]
+            ac_error = float(np.max(np.abs(simulated - analytic)))
+
+            period = 1 / params['freq']
+            times, voltages = circuit_sim.transient_analysis(netlist, 5 * period, period / 200)
+            _, expected = circuit_preview.sweep_transient_response(topology, params, times, params['V'], params['freq'])
+            tran_error = float(np.max(np.abs(voltages[node] - expected[0])))
+
+            results.append({
+                'topology': topology,
+                'variant': variant,
+                'ac_error': ac_error,
+                'tran_error': tran_error,
+                'ok': ac_error < AC_TOLERANCE and tran_error < TRAN_TOLERANCE,
+            })
+
+    # The untouched reference files must parse into the same nets as the templates
+    for topology, template in templates.items():
+        path = os.path.join(circuit_core.CIRCUIT_TEMPLATE_DIR, circuit_core.TOPOLOGY_FILES.get(topology, ''))
+        if os.path.isfile(path):
+            with open(path, encoding='utf-8') as f:
+                reference = circuit_sim.parse_asc(f.read())
+            rendered = circuit_sim.parse_asc(circuit_core.generate_circuit_schematic({'topology': topology}))
+            same = [c.nodes for c in reference.components] == [c.nodes for c in rendered.components]
+            results.append({'topology': topology, 'reference_nets_match': same, 'ok': same})
+    return results
+
+
+def validate_default_swing():
+    """Check that the default circuits' transient, run as the directive asks, follows the source"""
+    results = []
+    for topology, node in OUTPUT_NODES.items():
+        components = {'topology': topology}
+        netlist = circuit_sim.parse_asc(circuit_core.generate_circuit_schematic(components))
+        netlist.directives = [circuit_preview.analysis_directives(topology)[1]]
+        times, voltages = circuit_sim.simulate_netlist(netlist)['tran']
+        params = circuit_preview.parameters(components)
+        # Peak-to-peak over the last source period against 2 V |H(f)|
+        last = voltages[node][times >= times[-1] - 1 / params['freq']]
+        swing = float(last.max() - last.min())
+        gain = abs(circuit_preview.sweep_frequency_response(topology, params, [params['freq']])[0, 0])
+        expected = float(2 * params['V'] * gain)
+        results.append({
+            'topology': topology,
+            'swing': swing,
+            'expected_swing': expected,
+            'ok': abs(swing - expected) <= SWING_TOLERANCE * expected,
+        })
+    return results
+
+
+def ladder_schematic(sections):
+    """An .asc RC ladder: a source followed by `sections` series-R/shunt-C stages"""
+    lines = ['Version 4', 'SHEET 1 880 680', 'SYMBOL voltage 0 96 R0', 'SYMATTR InstName V1',
+             'SYMATTR Value SINE(0 1 1k)', 'SYMATTR Value2 AC 1', 'FLAG 0 192 0', 'WIRE 0 112 0 48']
+    x = 0
+    for i in range(1, sections + 1):
+        # Resistor from (x, 48) to (x + 80, 48), capacitor from there to ground
+        lines += [f'WIRE {x} 48 {x + 16} 48',
+                  f'SYMBOL res {x + 112} 32 R90', f'SYMATTR InstName R{i}', 'SYMATTR Value 100',
+                  f'SYMBOL cap {x + 80} 48 R0', f'SYMATTR InstName C{i}', 'SYMATTR Value 10n',
+                  f'FLAG {x + 96} 112 0']
+        x += 96
+    lines += [f'FLAG {x} 48 OUT', '.end']
+    return '\n'.join(lines)
+
+
+def time_ladder(sections):
+    """Parse and solve a large ladder, returning timings in seconds"""
+    text = ladder_schematic(sections)
+    start = time.perf_counter()
+    netlist = circuit_sim.parse_asc(text)
+    parsed = time.perf_counter()
+    circuit_sim.ac_analysis(netlist, np.logspace(1, 6, 51))
+    ac_done = time.perf_counter()
+    circuit_sim.transient_analysis(netlist, 2e-3, 2e-6)
+    tran_done = time.perf_counter()
+    return {
+        'sections': sections,
+        'nodes': len(netlist.nodes),
+        'parse_s': parsed - start,
+        'ac_51_points_s': ac_done - parsed,
+        'tran_1000_steps_s': tran_done - ac_done,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sections', type=int, default=2000, help="RC ladder stages for the scaling run")
+    parser.add_argument('--json', action='store_true', help="Print machine-readable results")
+    args = parser.parse_args(argv)
+
+    validation = validate_topologies() + validate_default_swing()
+    scaling = time_ladder(args.sections)
+    ok = all(result['ok'] for result in validation)
+
+    if args.json:
+        print(json.dumps({'validation': validation, 'scaling': scaling, 'ok': ok}, indent=2))
+    else:
+        for result in validation:
+            if 'swing' in result:
+                print(f"{result['topology']:17s} default .tran swing {result['swing']:.4f} V "
+                      f"(expected {result['expected_swing']:.4f} V)  {'ok' if result['ok'] else 'FAIL'}")
+            elif 'ac_error' in result:
+                print(f"{result['topology']:17s} ac {result['ac_error']:.1e}  tran {result['tran_error']:.1e}  "
+                      f"{'ok' if result['ok'] else 'FAIL'}")
+            else:
+                print(f"{result['topology']:17s} reference nets {'ok' if result['ok'] else 'FAIL'}")
+        print(f"ladder: {scaling['nodes']} nodes, parse {scaling['parse_s'] * 1000:.0f} ms, "
+              f"51-point AC {scaling['ac_51_points_s'] * 1000:.0f} ms, "
+              f"1000-step transient {scaling['tran_1000_steps_s'] * 1000:.0f} ms")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
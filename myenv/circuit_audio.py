@@ -0,0 +1,427 @@
+"""
+In-memory audio preparation for speech recognition
+
+The upload is decoded once with pydub, downmixed to 16 kHz mono 16-bit and
+trimmed of leading and trailing silence with a simple energy-based voice
+activity detector, then handed to speech_recognition as AudioData without
+touching the disk. pydub and speech_recognition are imported on first use.
+
+LiveTranscriber takes microphone chunks while the user is still recording.
+It cuts the audio at pauses and recognizes each finished phrase in the
+background, so only the last phrase is left to transcribe when recording
+stops.
+
+Recognition calls go through circuit_remote's 'stt' policy (deadline,
+retries, hedging, circuit breaker). When the service fails, audio is
+recognized offline with PocketSphinx if it is installed.
+"""
+import math
+import os
+import threading
+
+# Sample rate sent to the recognizer; 16 kHz is plenty for speech
+RECOGNITION_SAMPLE_RATE = int(os.getenv('RECOGNITION_SAMPLE_RATE', '16000'))
+
+# Energy VAD: frame length, how far below the loudest frame counts as
+# silence, and how much audio to keep around detected speech
+VAD_FRAME_MS = 30
+VAD_RANGE_DB = float(os.getenv('VAD_RANGE_DB', '30'))
+VAD_PADDING_MS = 150
+
+# Live recognition: a pause this long closes a phrase, which is sent for
+# recognition while recording continues; phrases shorter than the minimum
+# wait for more audio so the recognizer still gets some context
+STREAM_PAUSE_MS = int(os.getenv('STREAM_PAUSE_MS', '600'))
+STREAM_MIN_PHRASE_MS = int(os.getenv('STREAM_MIN_PHRASE_MS', '1500'))
+
+# Phrases recognized concurrently across all live recordings
+STREAM_WORKERS = int(os.getenv('STREAM_WORKERS', '4'))
+
+# Fall back to offline PocketSphinx recognition when the speech service fails
+STT_LOCAL_FALLBACK = os.getenv('STT_LOCAL_FALLBACK', '1') == '1'
+
+# Recognizer used by recognize(); None means circuit_remote's pooled client
+_recognizer = None
+
+# Thread pool for live phrase recognition, created on first use
+_stream_pool = None
+_stream_pool_lock = threading.Lock()
+
+
+def load_audio(audio_path):
+    """
+    Decode an uploaded audio file
+
+    Args:
+        audio_path (str): Path to the uploaded file (any format ffmpeg can read)
+
+    Returns:
+        AudioSegment: Decoded audio
+    """
+    from pydub import AudioSegment
+    return AudioSegment.from_file(audio_path)
+
+
+def downmix(segment):
+    """
+    Convert audio to mono 16-bit
+
+    Args:
+        segment (AudioSegment): Decoded audio
+
+    Returns:
+        AudioSegment: Mono, 16-bit audio at the original sample rate
+    """
+    return segment.set_channels(1).set_sample_width(2)
+
+
+def resample(segment, sample_rate=RECOGNITION_SAMPLE_RATE):
+    """
+    Resample audio to the recognition sample rate
+
+    Args:
+        segment (AudioSegment): Mono audio
+        sample_rate (int): Target sample rate
+
+    Returns:
+        AudioSegment: Resampled audio
+    """
+    return segment.set_frame_rate(sample_rate)
+
+
+def frame_levels(segment, frame_ms=VAD_FRAME_MS):
+    """
+    Level of each frame in dB (-inf for digital silence)
+
+    Args:
+        segment (AudioSegment): Mono audio
+        frame_ms (int): Frame length in milliseconds
+
+    Returns:
+        list: One level per frame, the last frame possibly shorter
+    """
+    levels = []
+    for start in range(0, len(segment), frame_ms):
+        rms = segment[start:start + frame_ms].rms
+        levels.append(20 * math.log10(rms) if rms > 0 else -math.inf)
+    return levels
+
+
+def trim_silence(segment, frame_ms=VAD_FRAME_MS, range_db=VAD_RANGE_DB, padding_ms=VAD_PADDING_MS):
+    """
+    Drop leading and trailing silence using frame energy
+
+    A frame is speech when its level is within range_db of the loudest
+    frame. Everything before the first and after the last speech frame is
+    removed, keeping padding_ms on each side.
+
+    Args:
+        segment (AudioSegment): Mono audio
+        frame_ms (int): Analysis frame length in milliseconds
+        range_db (float): Dynamic range below the peak frame treated as speech
+        padding_ms (int): Audio kept around the detected speech
+
+    Returns:
+        AudioSegment: Trimmed audio, or the input if it is entirely silent
+    """
+    levels = frame_levels(segment, frame_ms)
+    if not levels or max(levels) == -math.inf:
+        return segment
+
+    threshold = max(levels) - range_db
+    speech = [index for index, level in enumerate(levels) if level >= threshold]
+    start = max(0, speech[0] * frame_ms - padding_ms)
+    end = min(len(segment), (speech[-1] + 1) * frame_ms + padding_ms)
+    return segment[start:end]
+
+
+def to_audio_data(segment):
+    """
+    Wrap decoded audio for speech_recognition without writing a file
+
+    Args:
+        segment (AudioSegment): Prepared audio
+
+    Returns:
+        sr.AudioData: Audio ready for Recognizer.recognize_* calls
+    """
+    import speech_recognition as sr
+    return sr.AudioData(segment.raw_data, segment.frame_rate, segment.sample_width)
+
+
+def prepare_audio(audio_path):
+    """
+    Decode, downmix and trim an upload for recognition
+
+    Args:
+        audio_path (str): Path to the uploaded file
+
+    Returns:
+        sr.AudioData: Audio ready for Recognizer.recognize_* calls
+    """
+    # Trim before resampling so only the speech itself is resampled
+    return to_audio_data(resample(trim_silence(downmix(load_audio(audio_path)))))
+
+
+def set_recognizer(recognizer):
+    """
+    Replace the speech recognizer, e.g. with a local stand-in for benchmarks
+
+    Args:
+        recognizer: Object with recognize_google(audio_data), or None to use
+            the pooled Google Speech API client again
+    """
+    global _recognizer
+    _recognizer = recognizer
+
+
+def recognize(audio_data):
+    """
+    Transcribe prepared audio with Google Speech Recognition
+
+    Args:
+        audio_data (sr.AudioData): Output of prepare_audio
+
+    Returns:
+        str: Recognized text; raises sr.UnknownValueError or sr.RequestError
+    """
+    import speech_recognition as sr
+    from circuit_remote import get_remote, recognize_google
+
+    recognizer = _recognizer
+
+    def attempt(timeout):
+        # No speech is an answer, not a failure worth retrying
+        try:
+            if recognizer is not None:
+                return recognizer.recognize_google(audio_data)
+            return recognize_google(audio_data, timeout=timeout)
+        except sr.UnknownValueError:
+            return None
+
+    try:
+        transcript = get_remote('stt').call(attempt)
+    except Exception as e:
+        transcript = recognize_offline(audio_data, e)
+    if transcript is None:
+        raise sr.UnknownValueError()
+    return transcript
+
+
+def recognize_offline(audio_data, error):
+    """
+    Transcribe audio locally with PocketSphinx after the speech service failed
+
+    Args:
+        audio_data (sr.AudioData): Output of prepare_audio
+        error (Exception): Why the service could not be used
+
+    Returns:
+        str: Recognized text, or None if no speech was recognized
+
+    Raises:
+        sr.RequestError: If the fallback is disabled or PocketSphinx is not installed
+    """
+    import speech_recognition as sr
+    from circuit_metrics import metrics
+
+    if not STT_LOCAL_FALLBACK:
+        raise sr.RequestError(f"Speech recognition failed: {error}")
+    try:
+        transcript = sr.Recognizer().recognize_sphinx(audio_data)
+    except sr.UnknownValueError:
+        transcript = None
+    except sr.RequestError as e:
+        raise sr.RequestError(f"Speech recognition failed: {error}; no offline fallback ({e})")
+    metrics.increment('stt_local_fallback')
+    print(f"Speech service unavailable ({error}), recognized offline: {transcript!r}")  # Debug print
+    return transcript
+
+
+def _get_stream_pool():
+    """Shared thread pool for live phrase recognition"""
+    global _stream_pool
+    with _stream_pool_lock:
+        if _stream_pool is None:
+            from concurrent.futures import ThreadPoolExecutor
+            _stream_pool = ThreadPoolExecutor(max_workers=STREAM_WORKERS, thread_name_prefix='stt-live')
+        return _stream_pool
+
+
+def chunk_to_segment(sample_rate, samples):
+    """
+    Wrap a microphone chunk from the UI as mono 16-bit audio
+
+    Args:
+        sample_rate (int): Sample rate in Hz
+        samples (ndarray): int16 samples, shape (n,) or (n, channels)
+
+    Returns:
+        AudioSegment: Mono, 16-bit audio at the chunk's sample rate
+    """
+    from pydub import AudioSegment
+    channels = samples.shape[1] if samples.ndim == 2 else 1
+    segment = AudioSegment(data=samples.astype('<i2').tobytes(), sample_width=2,
+                           frame_rate=sample_rate, channels=channels)
+    return downmix(segment)
+
+
+class LiveTranscriber:
+    """
+    Recognize a recording phrase by phrase while it is still being made
+
+    Audio is added with add_chunk() as the microphone delivers it. Whenever
+    a pause of at least `pause_ms` follows enough speech, the audio up to the
+    middle of the pause is trimmed and resampled like an upload and sent to
+    recognize() on a background thread. finish() sends the remainder and
+    joins the phrase transcripts in order.
+
+    Speech is judged against the loudest frame heard so far, like
+    trim_silence(), so no absolute level has to be configured.
+
+    Args:
+        pause_ms (int): Silence that ends a phrase
+        min_phrase_ms (int): Shortest audio sent as a phrase of its own
+    """
+
+    def __init__(self, pause_ms=STREAM_PAUSE_MS, min_phrase_ms=STREAM_MIN_PHRASE_MS):
+        self.pause_ms = pause_ms
+        self.min_phrase_ms = min_phrase_ms
+        self.finished = False
+        self._lock = threading.Lock()
+        self._pending = None
+        self._peak = -math.inf
+        self._phrases = []
+        # Scan state of the pending audio: level of each complete frame,
+        # quiet frames in a row at its end, and the frame the phrase started at
+        self._levels = []
+        self._quiet = 0
+        self._phrase_start = 0
+        self._heard_speech = False
+
+    def add_chunk(self, sample_rate, samples):
+        """
+        Append a microphone chunk and send any completed phrases
+
+        Chunks arriving after finish() are ignored.
+
+        Args:
+            sample_rate (int): Sample rate in Hz
+            samples (ndarray): int16 samples, shape (n,) or (n, channels)
+        """
+        segment = chunk_to_segment(sample_rate, samples)
+        with self._lock:
+            if self.finished:
+                return
+            if self._pending is not None and self._pending.frame_rate != segment.frame_rate:
+                segment = segment.set_frame_rate(self._pending.frame_rate)
+            self._pending = segment if self._pending is None else self._pending + segment
+            self._split()
+
+    def _split(self):
+        """
+        Send every phrase in the pending audio that a long enough pause closes
+
+        Only the complete frames added since the last call are measured, and
+        the scan picks up where it stopped. A louder peak raises the speech
+        threshold, so the pending frames are then scanned again.
+        """
+        frames = len(self._pending) // VAD_FRAME_MS
+        first = len(self._levels)
+        if frames <= first:
+            return
+        new = frame_levels(self._pending[first * VAD_FRAME_MS:frames * VAD_FRAME_MS])
+        self._levels.extend(new)
+        if max(new) > self._peak:
+            self._peak = max(new)
+            first = 0
+            self._quiet = 0
+            self._phrase_start = 0
+            self._heard_speech = False
+        threshold = self._peak - VAD_RANGE_DB
+        pause_frames = max(1, self.pause_ms // VAD_FRAME_MS)
+
+        # Cut positions in frames, at the middle of each qualifying pause
+        cuts = []
+        for index in range(first, frames):
+            if self._levels[index] >= threshold:
+                self._heard_speech = True
+                self._quiet = 0
+                continue
+            self._quiet += 1
+            pause_start = index - self._quiet + 1
+            if (self._heard_speech and self._quiet == pause_frames
+                    and (pause_start - self._phrase_start) * VAD_FRAME_MS >= self.min_phrase_ms):
+                cut = pause_start + self._quiet // 2
+                cuts.append(cut)
+                self._phrase_start = cut
+                self._heard_speech = False
+
+        # Silence before the first word is dropped rather than kept
+        if not cuts and not self._heard_speech and frames > pause_frames:
+            lead = frames - pause_frames
+            self._pending = self._pending[lead * VAD_FRAME_MS:]
+            del self._levels[:lead]
+            return
+
+        start = 0
+        for cut in cuts:
+            self._submit(self._pending[start * VAD_FRAME_MS:cut * VAD_FRAME_MS])
+            start = cut
+        if start:
+            self._pending = self._pending[start * VAD_FRAME_MS:]
+            del self._levels[:start]
+            self._phrase_start -= start
+
+    def _submit(self, segment):
+        """Recognize one phrase in the background"""
+        audio_data = to_audio_data(resample(trim_silence(segment)))
+        self._phrases.append(_get_stream_pool().submit(recognize, audio_data))
+
+    def partial(self):
+        """
+        Transcript of the phrases recognized so far, in order
+
+        Returns:
+            str: Text of the leading phrases that have finished
+        """
+        import speech_recognition as sr
+
+        texts = []
+        for phrase in list(self._phrases):
+            if not phrase.done():
+                break
+            try:
+                texts.append(phrase.result())
+            except (sr.UnknownValueError, sr.RequestError):
+                continue
+        return ' '.join(texts)
+
+    def finish(self):
+        """
+        Send the remaining audio and wait for the full transcript
+
+        Phrases the recognizer cannot understand (noise, coughs) are skipped.
+
+        Returns:
+            str: The recognized phrases joined in order; raises
+                sr.UnknownValueError if none was understood, or
+                sr.RequestError if the service failed
+        """
+        import speech_recognition as sr
+
+        with self._lock:
+            if not self.finished:
+                self.finished = True
+                if self._pending is not None and len(self._pending):
+                    self._submit(self._pending)
+                self._pending = None
+        texts = []
+        for phrase in self._phrases:
+            try:
+                texts.append(phrase.result())
+            except sr.UnknownValueError:
+                continue
+        if not texts:
+            raise sr.UnknownValueError()
+        return ' '.join(texts)
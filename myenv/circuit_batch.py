@@ -0,0 +1,257 @@
+"""
+Bulk circuit generation from a file of descriptions
+
+Commands are streamed from JSONL, CSV or plain-text input, parsed on a
+thread pool with at most remote_concurrency Gemini calls in flight, and rendered and written
+in chunks on a process pool. Only a bounded window of items is in flight at
+any time, so memory stays constant regardless of input size, and a manifest
+record is produced for every item as soon as its chunk completes.
+"""
+import csv
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from circuit_core import (
+    GeminiBatcher,
+    generate_circuit_schematic,
+    parse_command_with_gemini_v2,
+    save_circuit,
+    write_circuit,
+)
+
+# Gemini calls in flight at once; most commands are parsed locally without one
+BATCH_REMOTE_CONCURRENCY = int(os.getenv('BATCH_REMOTE_CONCURRENCY', '4'))
+
+# Items rendered per process-pool task, to amortize inter-process overhead
+BATCH_CHUNK_SIZE = int(os.getenv('BATCH_CHUNK_SIZE', '64'))
+
+# Field names that may hold the description in JSONL and CSV input
+COMMAND_FIELDS = ('command', 'text', 'description')
+
+
+def _item_from_record(record):
+    """Turn a JSON object or CSV row into a batch item"""
+    for field in COMMAND_FIELDS:
+        if record.get(field):
+            return {'id': record.get('id'), 'command': record[field]}
+    raise ValueError(f"No {'/'.join(COMMAND_FIELDS)} field in {record!r}")
+
+
+def _item_from_json(line, number):
+    """Turn a JSONL line into a batch item, or an error item if it is not a usable record"""
+    try:
+        record = json.loads(line)
+        if not isinstance(record, dict):
+            raise ValueError(f"expected a JSON object, got {type(record).__name__}")
+        return _item_from_record(record)
+    except ValueError as e:
+        return {'id': None, 'command': None, 'line': number, 'error': f"line {number}: {e}"}
+
+
+def iter_commands(path):
+    """
+    Stream batch items from a file without loading it into memory
+
+    JSONL lines must be objects with a command/text/description field, CSV
+    files need a header with one of those columns, and any other file is
+    read as one description per line. '-' reads plain text or JSONL from stdin.
+    A line that cannot be read yields an error item instead of ending the stream.
+
+    Args:
+        path (str): Input file path or '-'
+
+    Yields:
+        dict: {'id': optional identifier, 'command': description}, or
+            {'id', 'command': None, 'line': line number, 'error': message}
+    """
+    if path == '-':
+        for number, line in enumerate(sys.stdin, 1):
+            line = line.strip()
+            if line:
+                yield _item_from_json(line, number) if line.startswith('{') else {'id': None, 'command': line}
+        return
+
+    extension = os.path.splitext(path)[1].lower()
+    with open(path, newline='', encoding='utf-8') as f:
+        if extension in ('.jsonl', '.ndjson'):
+            for number, line in enumerate(f, 1):
+                if line.strip():
+                    yield _item_from_json(line, number)
+        elif extension == '.csv':
+            reader = csv.DictReader(f)
+            for row in reader:
+                try:
+                    yield _item_from_record(row)
+                except ValueError as e:
+                    yield {'id': row.get('id'), 'command': None, 'line': reader.line_num,
+                           'error': f"line {reader.line_num}: {e}"}
+        else:
+            for line in f:
+                if line.strip():
+                    yield {'id': None, 'command': line.strip()}
+
+
+def _parse_item(item, batcher):
+    """Parse one batch item, returning (components, error)"""
+    try:
+        return parse_command_with_gemini_v2(item['command'], batcher), None
+    except Exception as e:
+        return None, str(e)
+
+
+def _render_chunk(chunk, output_dir):
+    """
+    Render and write a chunk of parsed items (runs in a worker process)
+
+    Args:
+        chunk (list): (index, item, components) tuples
+        output_dir (str): Directory for the .asc files, or None to save into CIRCUIT_DIR
+
+    Returns:
+        list: Manifest records
+    """
+    records = []
+    for index, item, components in chunk:
+        record = {'index': index, 'id': item.get('id'), 'command': item['command'],
+                  'topology': components.get('topology', 'basic_circuit'), 'components': components}
+        try:
+            schematic_content = generate_circuit_schematic(components)
+            if output_dir is None:
+                # Identical circuits share one stored file
+                record['path'] = save_circuit(schematic_content, components, item['command'])
+            else:
+                record['path'] = write_circuit(schematic_content, output_dir)
+            record['status'] = 'ok'
+        except Exception as e:
+            record['status'] = 'error'
+            record['error'] = str(e)
+        records.append(record)
+    return records
+
+
+def iter_batch(items, output_dir=None, workers=None, remote_concurrency=BATCH_REMOTE_CONCURRENCY,
+               chunk_size=BATCH_CHUNK_SIZE):
+    """
+    Parse, render and write every item, yielding manifest records as they complete
+
+    Args:
+        items (iterable): Batch items from iter_commands()
+        output_dir (str): Directory for the .asc files (defaults to saving into CIRCUIT_DIR,
+            deduplicated when CIRCUIT_STORE is on)
+        workers (int): Render processes; 1 renders in this process (defaults to the CPU count)
+        remote_concurrency (int): Maximum concurrent Gemini calls
+        chunk_size (int): Items per render task
+
+    Yields:
+        dict: index, id, command, topology, components, status and path or error
+            (with the input line number for unreadable lines)
+    """
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    else:
+        output_dir = None
+    workers = workers or os.cpu_count() or 1
+    # The batch's own batcher keeps remote_concurrency Gemini calls in flight.
+    # With micro-batching each call carries up to max_items commands, so the
+    # parse threads that wait on those calls are sized to fill them.
+    batcher = GeminiBatcher(concurrency=remote_concurrency)
+    parse_threads = remote_concurrency * batcher.max_items if batcher.enabled else remote_concurrency
+    max_parsing = parse_threads * 4
+    max_rendering = workers * 2
+
+    items = enumerate(items)
+    exhausted = False
+    parsing = {}
+    rendering = set()
+    chunk = []
+
+    parse_pool = ThreadPoolExecutor(max_workers=parse_threads)
+    # Render processes start from a clean forkserver, not a fork of this
+    # process: the parse, batcher and remote threads are already running,
+    # and a lock one of them holds would be inherited locked
+    render_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('forkserver')) \
+        if workers > 1 else None
+    try:
+        while True:
+            # Read ahead only while the render stage keeps up (backpressure)
+            while not exhausted and len(parsing) < max_parsing and len(rendering) < max_rendering:
+                try:
+                    index, item = next(items)
+                except StopIteration:
+                    exhausted = True
+                    break
+                if 'error' in item:
+                    # Unreadable input lines are reported like parse failures
+                    yield {'index': index, 'id': item['id'], 'command': None, 'line': item['line'],
+                           'status': 'error', 'error': item['error']}
+                    continue
+                parsing[parse_pool.submit(_parse_item, item, batcher)] = (index, item)
+
+            if chunk and (len(chunk) >= chunk_size or (exhausted and not parsing)):
+                if render_pool is None:
+                    yield from _render_chunk(chunk, output_dir)
+                else:
+                    rendering.add(render_pool.submit(_render_chunk, chunk, output_dir))
+                chunk = []
+                continue
+
+            if exhausted and not parsing and not rendering:
+                break
+
+            done, _ = wait(list(parsing) + list(rendering), return_when=FIRST_COMPLETED)
+            for future in done:
+                if future in rendering:
+                    rendering.discard(future)
+                    yield from future.result()
+                    continue
+                index, item = parsing.pop(future)
+                components, error = future.result()
+                if error is None:
+                    chunk.append((index, item, components))
+                else:
+                    yield {'index': index, 'id': item.get('id'), 'command': item['command'],
+                           'status': 'error', 'error': error}
+    finally:
+        parse_pool.shutdown(cancel_futures=True)
+        batcher.close()
+        if render_pool is not None:
+            render_pool.shutdown(cancel_futures=True)
+
+
+def run_batch(input_path, output_dir=None, manifest=None, workers=None,
+              remote_concurrency=BATCH_REMOTE_CONCURRENCY, chunk_size=BATCH_CHUNK_SIZE):
+    """
+    Generate circuits for every description in a file
+
+    Args:
+        input_path (str): JSONL, CSV or text file of descriptions, or '-' for stdin
+        output_dir (str): Directory for the .asc files (defaults to CIRCUIT_DIR)
+        manifest (file): Text stream that receives one JSON record per line, or None
+        workers (int): Render processes (defaults to the CPU count)
+        remote_concurrency (int): Maximum concurrent Gemini calls
+        chunk_size (int): Items per render task
+
+    Returns:
+        dict: Summary with counts, elapsed seconds and circuits per second
+    """
+    summary = {'total': 0, 'ok': 0, 'errors': 0, 'topologies': {}}
+    start = time.perf_counter()
+    records = iter_batch(iter_commands(input_path), output_dir, workers, remote_concurrency, chunk_size)
+    for record in records:
+        summary['total'] += 1
+        if record['status'] == 'ok':
+            summary['ok'] += 1
+            topologies = summary['topologies']
+            topologies[record['topology']] = topologies.get(record['topology'], 0) + 1
+        else:
+            summary['errors'] += 1
+        if manifest is not None:
+            manifest.write(json.dumps(record) + '\n')
+            manifest.flush()
+    summary['elapsed'] = time.perf_counter() - start
+    summary['per_second'] = summary['total'] / summary['elapsed'] if summary['elapsed'] else 0.0
+    return summary
@@ -0,0 +1,283 @@
+"""
+Command-line entry point for the LTspice circuit designer
+
+Examples:
+    python circuit_cli.py parse "RC low pass filter with 10k and 1uF"
+    python circuit_cli.py render "RC high pass filter with 4.7k and 0.1uF" -o hp.asc
+    python circuit_cli.py create "RC band pass filter with 1k resistors and 10nF capacitors" --open
+    python circuit_cli.py batch assignments.jsonl -o out/ --manifest manifest.jsonl
+    python circuit_cli.py synth band_pass_filter --f-low 300 --f-high 3k --top 3 -o bp.asc
+    printf 'low pass filter at 1 kHz\nmake the resistor 10k\n' | python circuit_cli.py session
+    python circuit_cli.py find --topology band_pass_filter "C1<1u" "R1>=1k"
+    python circuit_cli.py raw lowpass.raw --plot lowpass.png
+    python circuit_cli.py simulate manifest.jsonl --backend ngspice --workers 8 > results.jsonl
+"""
+import argparse
+import contextlib
+import json
+import sys
+
+import circuit_core
+
+
+def cmd_parse(args):
+    """Print the parsed components as JSON"""
+    # Keep stdout machine-readable; the core's debug prints go to stderr
+    try:
+        with contextlib.redirect_stdout(sys.stderr):
+            components = circuit_core.parse_command_with_gemini_v2(args.command)
+    except circuit_core.ParseError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    print(json.dumps(components))
+    return 0
+
+
+def cmd_render(args):
+    """Print or save the rendered schematic"""
+    try:
+        with contextlib.redirect_stdout(sys.stderr):
+            components = circuit_core.parse_command_with_gemini_v2(args.command)
+    except circuit_core.ParseError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    schematic_content = circuit_core.generate_circuit_schematic(components)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(schematic_content)
+        print(f"Saved as: {args.output}")
+    else:
+        print(schematic_content)
+    return 0
+
+
+def cmd_create(args):
+    """Parse, render and write a circuit into CIRCUIT_DIR"""
+    try:
+        result = circuit_core.create_circuit(args.command, launch=args.open)
+    except circuit_core.ParseError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    print(f"Components: {result['components']}")
+    print(f"Saved as: {result['path']}")
+    if result['message']:
+        print(result['message'])
+    return 0
+
+
+def cmd_batch(args):
+    """Generate a circuit for every description in a file"""
+    import circuit_batch
+
+    options = {name: getattr(args, name) for name in ('workers', 'remote_concurrency', 'chunk_size')
+               if getattr(args, name) is not None}
+    manifest = open(args.manifest, 'w', encoding='utf-8') if args.manifest else sys.stdout
+    try:
+        # Debug prints from parsing must not interleave with a manifest on stdout
+        with contextlib.redirect_stdout(sys.stderr):
+            summary = circuit_batch.run_batch(args.input, output_dir=args.output_dir, manifest=manifest, **options)
+    finally:
+        if manifest is not sys.stdout:
+            manifest.close()
+    print(f"Generated {summary['ok']}/{summary['total']} circuits ({summary['errors']} errors) "
+          f"in {summary['elapsed']:.2f} s, {summary['per_second']:.1f} circuits/s", file=sys.stderr)
+    return 0 if summary['errors'] == 0 else 1
+
+
+def cmd_synth(args):
+    """Print ranked component sets for a frequency target and optionally render the best"""
+    import circuit_synthesis
+
+    targets = {name: circuit_core.parse_spice_value(getattr(args, name))
+               for name in ('cutoff', 'center', 'bandwidth', 'f_low', 'f_high') if getattr(args, name)}
+    candidates = circuit_synthesis.synthesize(
+        args.topology, r_series=args.r_series, c_series=args.c_series,
+        r_range=(circuit_core.parse_spice_value(args.r_min), circuit_core.parse_spice_value(args.r_max)),
+        top=args.top, **targets
+    )
+    for candidate in candidates:
+        print(json.dumps(candidate))
+    if args.output and candidates:
+        with open(args.output, 'w') as f:
+            f.write(circuit_core.generate_circuit_schematic(candidates[0]))
+        print(f"Saved as: {args.output}", file=sys.stderr)
+    return 0
+
+
+def cmd_session(args):
+    """Create a circuit, then apply each following line to it as an edit where possible"""
+    from circuit_session import CircuitSession
+
+    session = CircuitSession()
+    for line in sys.stdin:
+        command = line.strip()
+        if not command:
+            continue
+        try:
+            with contextlib.redirect_stdout(sys.stderr):
+                result = session.handle(command, use_gemini=not args.local)
+        except circuit_core.ParseError as e:
+            print(f"Error: {e}")
+            continue
+        if result['edited']:
+            print(f"Edited {result['path']} in {result['elapsed_ms']:.2f} ms: {result['changes']}")
+        else:
+            print(f"Created {result['path']} in {result['elapsed_ms']:.2f} ms: {result['components']}")
+        sys.stdout.flush()
+    return 0
+
+
+def cmd_find(args):
+    """Print stored circuits matching a topology, value conditions and command text"""
+    from circuit_store import get_store, parse_condition
+
+    try:
+        conditions = [parse_condition(text) for text in args.conditions]
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+    for record in get_store().find(args.topology, conditions, args.command, args.limit):
+        print(json.dumps({key: record[key] for key in ('path', 'topology', 'components')}))
+    return 0
+
+
+def cmd_raw(args):
+    """Summarize the traces of an LTspice .raw file and optionally plot them"""
+    from circuit_raw import read_raw, results_figure
+
+    try:
+        raw = read_raw(args.input)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+    with raw:
+        print(f"{raw.plotname}: {raw.points} points, flags {' '.join(sorted(raw.flags))}")
+        for name, kind in raw.variables:
+            values = raw.trace(name)
+            if raw.is_complex:
+                values = abs(values)
+            print(f"  {name:24s} {kind:16s} {values.dtype}  min {values.min():.6g}  max {values.max():.6g}")
+    if args.plot:
+        results_figure(args.input, args.trace).savefig(args.plot)
+        print(f"Plot saved to {args.plot}")
+    return 0
+
+
+def _simulation_inputs(inputs):
+    """Schematic paths from .asc arguments and from batch manifests"""
+    for path in inputs:
+        if not path.lower().endswith(('.jsonl', '.ndjson')):
+            yield path
+            continue
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                record = json.loads(line) if line.strip() else {}
+                if record.get('status') == 'ok' and record.get('path'):
+                    yield record['path']
+
+
+def cmd_simulate(args):
+    """Simulate schematics headlessly, printing one JSON record per circuit"""
+    from circuit_scheduler import SimulationScheduler
+
+    options = {name: getattr(args, name) for name in ('backend', 'workers', 'timeout', 'retries')
+               if getattr(args, name) is not None}
+    try:
+        scheduler = SimulationScheduler(**options)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+    counts = {}
+    with scheduler:
+        for record in scheduler.iter_simulations(_simulation_inputs(args.inputs)):
+            counts[record['status']] = counts.get(record['status'], 0) + 1
+            print(json.dumps(record))
+            sys.stdout.flush()
+    print(f"Simulated with {scheduler.backend}: {counts}", file=sys.stderr)
+    return 0 if set(counts) <= {'ok'} else 1
+
+
+def build_parser():
+    """
+    Build the argument parser
+
+    Returns:
+        argparse.ArgumentParser: Parser with one sub-command per pipeline stage
+    """
+    parser = argparse.ArgumentParser(description="Create LTspice circuits from text descriptions")
+    subparsers = parser.add_subparsers(dest='cmd', required=True)
+
+    parse_parser = subparsers.add_parser('parse', help="Parse a description into components")
+    parse_parser.add_argument('command', help="Circuit description")
+    parse_parser.set_defaults(func=cmd_parse)
+
+    render_parser = subparsers.add_parser('render', help="Render a description to an .asc schematic")
+    render_parser.add_argument('command', help="Circuit description")
+    render_parser.add_argument('-o', '--output', help="Write the schematic here instead of stdout")
+    render_parser.set_defaults(func=cmd_render)
+
+    create_parser = subparsers.add_parser('create', help="Render and save a circuit into CIRCUIT_DIR")
+    create_parser.add_argument('command', help="Circuit description")
+    create_parser.add_argument('--open', action='store_true', help="Open the circuit in LTspice")
+    create_parser.set_defaults(func=cmd_create)
+
+    batch_parser = subparsers.add_parser('batch', help="Generate circuits for a JSONL, CSV or text file")
+    batch_parser.add_argument('input', help="Input file, or - for stdin")
+    batch_parser.add_argument('-o', '--output-dir', help="Directory for the .asc files (default: CIRCUIT_DIR)")
+    batch_parser.add_argument('--manifest', help="JSONL manifest streamed as results complete (default: stdout)")
+    batch_parser.add_argument('--workers', type=int, help="Render processes (default: CPU count)")
+    batch_parser.add_argument('--remote-concurrency', type=int, help="Maximum concurrent Gemini calls (default: 4)")
+    batch_parser.add_argument('--chunk-size', type=int, help="Items per render task (default: 64)")
+    batch_parser.set_defaults(func=cmd_batch)
+
+    synth_parser = subparsers.add_parser('synth', help="Choose standard values for a frequency target")
+    synth_parser.add_argument('topology', choices=['low_pass_filter', 'high_pass_filter', 'band_pass_filter'])
+    synth_parser.add_argument('--cutoff', help="Cutoff frequency of a low/high-pass filter, e.g. 1k")
+    synth_parser.add_argument('--center', help="Band-pass center frequency (with --bandwidth)")
+    synth_parser.add_argument('--bandwidth', help="Band-pass bandwidth (with --center)")
+    synth_parser.add_argument('--f-low', help="Band-pass lower edge (with --f-high)")
+    synth_parser.add_argument('--f-high', help="Band-pass upper edge (with --f-low)")
+    synth_parser.add_argument('--r-series', default='E24', choices=['E12', 'E24', 'E96'])
+    synth_parser.add_argument('--c-series', default='E12', choices=['E12', 'E24', 'E96'])
+    synth_parser.add_argument('--r-min', default='10', help="Smallest resistor to use (default: 10)")
+    synth_parser.add_argument('--r-max', default='1meg', help="Largest resistor to use (default: 1meg)")
+    synth_parser.add_argument('--top', type=int, default=5, help="Number of ranked candidates")
+    synth_parser.add_argument('-o', '--output', help="Render the best candidate to this .asc file")
+    synth_parser.set_defaults(func=cmd_synth)
+
+    session_parser = subparsers.add_parser('session', help="Create and then edit a circuit, one command per stdin line")
+    session_parser.add_argument('--local', action='store_true', help="Read edits with the local grammar only")
+    session_parser.set_defaults(func=cmd_session)
+
+    find_parser = subparsers.add_parser('find', help="Search the circuit store")
+    find_parser.add_argument('conditions', nargs='*', help="Value conditions such as C1<1u or R>=4.7k")
+    find_parser.add_argument('--topology', help="Only circuits of this topology")
+    find_parser.add_argument('--command', help="Text the original command contained")
+    find_parser.add_argument('--limit', type=int, default=100, help="Maximum results, newest first (default: 100)")
+    find_parser.set_defaults(func=cmd_find)
+
+    raw_parser = subparsers.add_parser('raw', help="Summarize or plot an LTspice .raw results file")
+    raw_parser.add_argument('input', help=".raw file written by LTspice or ngspice")
+    raw_parser.add_argument('--trace', nargs='+', help="Traces to plot, e.g. 'V(out)' (default: node voltages)")
+    raw_parser.add_argument('--plot', help="Save a plot of the results to this image file")
+    raw_parser.set_defaults(func=cmd_raw)
+
+    simulate_parser = subparsers.add_parser('simulate', help="Run the analyses of .asc files headlessly")
+    simulate_parser.add_argument('inputs', nargs='+', help=".asc files, or batch manifests (.jsonl) listing them")
+    simulate_parser.add_argument('--backend', choices=['auto', 'ltspice', 'ngspice', 'builtin'],
+                                 help="Simulator (default: SIM_BACKEND, auto)")
+    simulate_parser.add_argument('--workers', type=int, help="Simulator processes (default: CPU count)")
+    simulate_parser.add_argument('--timeout', type=float, help="Seconds per simulation (default: 120)")
+    simulate_parser.add_argument('--retries', type=int, help="Extra attempts per failed job (default: 1)")
+    simulate_parser.set_defaults(func=cmd_simulate)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1674 @@
+"""
+Core of the voice-controlled LTspice circuit designer
+
+Parses circuit descriptions, renders LTspice schematics and writes them to
+CIRCUIT_DIR. Importing this module has no side effects: the Gemini client,
+the schematic templates and the parse cache are all set up on first use, so
+it can be reused from the CLI, the Gradio UI and worker processes.
+"""
+import os
+import time
+import subprocess
+import re
+import json
+import sqlite3
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from circuit_metrics import metrics
+
+# Gemini API configuration
+GEMINI_API_KEY = os.getenv('GEMINI_API_KEY', '')
+GEMINI_MODEL_NAME = os.getenv('GEMINI_MODEL_NAME', 'gemini-2.0-flash')
+
+# Gemini client: 'http' for circuit_remote's pooled REST client, 'sdk' for google.generativeai
+GEMINI_TRANSPORT = os.getenv('GEMINI_TRANSPORT', 'http')
+
+# LTspice path configuration
+LTSPICE_PATH = os.getenv('LTSPICE_PATH', r'C:\Users\antony brijesh\AppData\Roaming\Microsoft\Windows\Start Menu\Programs\LTspice\LTspice.lnk')
+
+# Dedicated directory for circuit files, created on first write
+CIRCUIT_DIR = os.getenv('CIRCUIT_DIR', os.path.join(os.path.expanduser('~'), 'ltspice_circuits'))
+
+_model = None
+_model_lock = threading.Lock()
+
+
+def get_gemini_model():
+    """
+    Return the Gemini model, configuring the client on first use
+
+    Returns:
+        GeminiClient or GenerativeModel: Shared Gemini model instance
+    """
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                if GEMINI_TRANSPORT == 'sdk':
+                    import google.generativeai as genai
+                    genai.configure(api_key=GEMINI_API_KEY)
+                    _model = genai.GenerativeModel(GEMINI_MODEL_NAME)
+                else:
+                    from circuit_remote import GeminiClient
+                    _model = GeminiClient(GEMINI_API_KEY, GEMINI_MODEL_NAME)
+    return _model
+
+
+def generate_content(prompt, generation_config):
+    """
+    Send a prompt to Gemini under the 'gemini' remote-call policy
+
+    The call is bounded by a deadline, retried with jitter, hedged when slow
+    and refused while the circuit breaker is open (see circuit_remote).
+
+    Args:
+        prompt (str): Prompt text
+        generation_config (dict): Generation config in the SDK's format
+
+    Returns:
+        Response with `.text` and `.usage_metadata`
+
+    Raises:
+        RemoteError: If the call fails, times out or the breaker is open
+    """
+    from circuit_remote import GeminiClient, get_remote
+
+    model = get_gemini_model()
+
+    def attempt(timeout):
+        if isinstance(model, GeminiClient):
+            return model.generate_content(prompt, generation_config=generation_config, timeout=timeout)
+        if type(model).__module__.startswith('google.'):
+            return model.generate_content(prompt, generation_config=generation_config,
+                                          request_options={'timeout': timeout})
+        # Stand-ins set with set_gemini_model() take no timeout
+        return model.generate_content(prompt, generation_config=generation_config)
+
+    return get_remote('gemini').call(attempt)
+
+
+def set_gemini_model(model):
+    """
+    Replace the Gemini model, e.g. with a local stand-in for benchmarks
+
+    Args:
+        model: Object with generate_content(prompt) returning a response with
+            a `.text` attribute, or None to go back to the real client
+    """
+    global _model
+    with _model_lock:
+        _model = model
+
+
+def ensure_circuit_dir():
+    """
+    Create CIRCUIT_DIR if it does not exist yet
+
+    Returns:
+        str: Path of the circuit directory
+    """
+    os.makedirs(CIRCUIT_DIR, exist_ok=True)
+    return CIRCUIT_DIR
+
+def check_ltspice_installation():
+    """
+    Check if LTspice is installed and accessible
+    """
+    global LTSPICE_PATH
+    
+    if not os.path.exists(LTSPICE_PATH):
+        # Try alternative common installation paths
+        alt_paths = [
+            r'C:\Program Files\LTspice\XVII\XVIIx64.exe',
+            r'C:\Program Files (x86)\LTspice\XVII\XVIIx64.exe',
+            r'C:\Program Files\LTspice\XVII\XVII.exe',
+            r'C:\Program Files (x86)\LTspice\XVII\XVII.exe',
+            r'C:\Users\antony brijesh\AppData\Roaming\Microsoft\Windows\Start Menu\Programs\LTspice\LTspice.lnk'
+        ]
+        
+        for path in alt_paths:
+            if os.path.exists(path):
+                LTSPICE_PATH = path
+                return True, f"LTspice found at {path}"
+        
+        return False, f"LTspice not found. Please install LTspice or set the LTSPICE_PATH environment variable."
+    return True, "LTspice installation found."
+
+# Schematic templates
+#
+# Each topology is rendered from a reference .asc file. The file is read
+# once, every component value is replaced by a named slot, and rendering is
+# a single %-format pass over the compiled template. Dropping another
+# .asc file into CIRCUIT_TEMPLATE_DIR registers it under its file name,
+# e.g. "RC Notch filter.asc" -> "rc_notch_filter".
+CIRCUIT_TEMPLATE_DIR = os.getenv('CIRCUIT_TEMPLATE_DIR', os.path.dirname(os.path.abspath(__file__)))
+
+# Bundled reference schematics for the built-in topologies
+TOPOLOGY_FILES = {
+    'basic_circuit': 'Draft1.asc',
+    'low_pass_filter': 'RC Lowpassfilter.asc',
+    'high_pass_filter': 'RC Highpassfilter.asc',
+    'band_pass_filter': 'RC Band pass filter.asc',
+}
+
+# Symbol names whose SYMATTR Value is a component value, keyed by letter
+VALUE_SYMBOLS = {'res': 'R', 'cap': 'C', 'ind': 'L', 'voltage': 'V'}
+
+# Component keys rendered into the voltage source's value
+SOURCE_KEYS = {'V', 'V_type', 'freq'}
+
+_ASC_KEYWORDS_RE = re.compile(
+    r'\s+(?=(?:Version|SHEET|WIRE|FLAG|IOPIN|SYMBOL|WINDOW|SYMATTR|TEXT|LINE|RECTANGLE|CIRCLE|ARC|BUSTAP|DATAFLAG)\b)'
+)
+_SPICE_VALUE_RE = re.compile(r'^\s*([-+]?(?:\d+(?:\.\d*)?|\.\d+)(?:e[-+]?\d+)?)\s*(meg|[fpnumkgt])?', re.IGNORECASE)
+_SPICE_SCALE = {'f': 1e-15, 'p': 1e-12, 'n': 1e-9, 'u': 1e-6, 'm': 1e-3, 'k': 1e3, 'meg': 1e6, 'g': 1e9, 't': 1e12}
+
+_templates = None
+_templates_lock = threading.Lock()
+
+
+def format_value(val):
+    """
+    Format a component value for an LTspice SYMATTR line
+
+    Args:
+        val: Number or string value
+
+    Returns:
+        str: Integers without a trailing .0, everything else as str()
+    """
+    # bool is an int subclass, but True is not the component value 1
+    if isinstance(val, bool):
+        return str(val)
+    if isinstance(val, (int, float)):
+        if isinstance(val, int) or val.is_integer():
+            return str(int(val))
+        return repr(float(val))
+    try:
+        fval = float(val)
+        if fval.is_integer():
+            return str(int(fval))
+    except (TypeError, ValueError):
+        pass
+    return str(val)
+
+
+def parse_spice_value(text):
+    """
+    Convert an LTspice value such as "100µ", "4.7k" or "1Meg" to a number
+
+    Args:
+        text (str): Value as written in a schematic
+
+    Returns:
+        int or float: Numeric value, or the original text if it is not numeric
+    """
+    match = _SPICE_VALUE_RE.match(text.replace('µ', 'u').replace('μ', 'u'))
+    if not match:
+        return text
+    value = float(match.group(1))
+    if match.group(2):
+        value = float('%.12g' % (value * _SPICE_SCALE[match.group(2).lower()]))
+    return int(value) if value.is_integer() else value
+
+
+def split_asc_lines(text):
+    """
+    Split .asc content into directive lines
+
+    Args:
+        text (str): Schematic content
+
+    Returns:
+        list: Non-empty directive lines
+    """
+    lines = text.splitlines()
+    # Some exported references have every directive on a single line
+    if len(lines) == 1:
+        lines = _ASC_KEYWORDS_RE.split(lines[0].strip())
+    return [line.rstrip() for line in lines if line.strip()]
+
+
+def _read_asc_lines(path):
+    """Read an .asc file as a list of directive lines"""
+    with open(path, encoding='utf-8', errors='replace') as f:
+        return split_asc_lines(f.read())
+
+
+class SchematicTemplate:
+    """
+    A reference .asc file compiled into a format string with parameter slots
+
+    Attributes:
+        topology (str): Topology name
+        text (str): %-format string with one placeholder per component value
+        order (list): Slot names in placeholder order
+        slots (dict): Slot name -> (component key, default value)
+        source (str): Slot name of the voltage source, or None
+        source_kind (str): 'SINE' if the reference source is a sine, else 'DC'
+        directives (list): SPICE directives from TEXT lines, e.g. '.ac dec 100 1 100k'
+    """
+
+    def __init__(self, topology, lines):
+        self.topology = topology
+        self.slots = {}
+        self.source = None
+        self.source_kind = 'DC'
+        self.source_defaults = {}
+        self.directives = [line.split(' !', 1)[1] for line in lines if line.startswith('TEXT ') and ' !' in line]
+
+        # First pass: find which symbol block each SYMATTR Value belongs to
+        symbols = []
+        for index, line in enumerate(lines):
+            parts = line.split()
+            if parts[0] == 'SYMBOL':
+                symbols.append({'kind': VALUE_SYMBOLS.get(parts[1]), 'name': None, 'value': None})
+            elif parts[0] == 'SYMATTR' and symbols and len(parts) >= 3:
+                if parts[1] == 'InstName':
+                    symbols[-1]['name'] = parts[2]
+                elif parts[1] == 'Value':
+                    symbols[-1]['value'] = (index, line.split(None, 2)[2])
+
+        # Components that appear once use the bare letter ("R"), others keep
+        # their instance name ("R1", "R2"), matching the parser's output
+        counts = {}
+        for symbol in symbols:
+            if symbol['kind'] and symbol['kind'] != 'V':
+                counts[symbol['kind']] = counts.get(symbol['kind'], 0) + 1
+
+        replacements = {}
+        for symbol in symbols:
+            if not symbol['kind'] or symbol['value'] is None:
+                continue
+            index, value = symbol['value']
+            name = symbol['name'] or symbol['kind']
+            if symbol['kind'] == 'V':
+                # Only the first source is driven by the V/V_type/freq keys
+                if self.source is not None:
+                    continue
+                self.source = name
+                if value.upper().startswith('SINE('):
+                    self.source_kind = 'SINE'
+                    args = value[value.index('(') + 1:value.rindex(')')].split()
+                    self.source_defaults = {
+                        'V': parse_spice_value(args[1]) if len(args) > 1 else 1,
+                        'freq': parse_spice_value(args[2]) if len(args) > 2 else 25000,
+                    }
+                else:
+                    self.source_defaults = {'V': parse_spice_value(value), 'freq': 25000}
+            else:
+                key = symbol['kind'] if counts[symbol['kind']] == 1 else name
+                self.slots[name] = (key, parse_spice_value(value))
+            replacements[index] = name
+
+        # Compile to a %-format string so rendering is one C-level substitution
+        self.order = []
+        self._value_lines = []
+        compiled = []
+        for index, line in enumerate(lines):
+            if index in replacements:
+                self.order.append(replacements[index])
+                self._value_lines.append(index)
+                compiled.append('SYMATTR Value %s')
+            else:
+                compiled.append(line.replace('%', '%%'))
+        self.text = '\n'.join(compiled)
+        # (component key, pre-formatted default) per placeholder, None for the source
+        self._fill = []
+        for name in self.order:
+            if name in self.slots:
+                key, default = self.slots[name]
+                self._fill.append((key, format_value(default)))
+            else:
+                self._fill.append(None)
+
+    def render(self, components):
+        """
+        Fill the template with component values
+
+        Args:
+            components (dict): Component specifications (see generate_circuit_schematic)
+
+        Returns:
+            str: LTspice schematic content
+        """
+        values = []
+        for slot in self._fill:
+            if slot is None:
+                values.append(self._render_source(components))
+                continue
+            key, formatted = slot
+            value = components.get(key)
+            values.append(formatted if value is None else format_value(value))
+        return self.text % tuple(values)
+
+    def patch(self, schematic, components, keys):
+        """
+        Rewrite only the SYMATTR Value lines that depend on changed keys
+
+        Args:
+            schematic (str): Earlier output of render() for this template
+            components (dict): Updated component specifications
+            keys (iterable): Component keys whose values changed
+
+        Returns:
+            tuple: (patched schematic, number of lines rewritten)
+
+        Raises:
+            ValueError: If the schematic was not rendered from this template
+        """
+        keys = set(keys)
+        lines = schematic.split('\n')
+        patched = 0
+        for index, slot in zip(self._value_lines, self._fill):
+            if slot is None:
+                if not keys & SOURCE_KEYS:
+                    continue
+                value = self._render_source(components)
+            else:
+                key, formatted = slot
+                if key not in keys:
+                    continue
+                value = components.get(key)
+                value = formatted if value is None else format_value(value)
+            if index >= len(lines) or not lines[index].startswith('SYMATTR Value '):
+                raise ValueError(f"schematic does not match the {self.topology} template")
+            line = 'SYMATTR Value ' + value
+            if lines[index] != line:
+                lines[index] = line
+                patched += 1
+        return '\n'.join(lines), patched
+
+    def _render_source(self, components):
+        """Format the voltage source value from V, V_type and freq"""
+        amplitude = format_value(components.get('V', self.source_defaults['V']))
+        if self.source_kind == 'SINE' and components.get('V_type', 'SINE') == 'SINE':
+            freq = format_value(components.get('freq', self.source_defaults['freq']))
+            return f"SINE(1 {amplitude} {freq})"
+        return amplitude
+
+
+def _topology_name(filename):
+    """Derive a topology name from an .asc file name"""
+    return re.sub(r'[^a-z0-9]+', '_', os.path.splitext(filename)[0].lower()).strip('_')
+
+
+def load_topology_templates(template_dir=None):
+    """
+    Compile every reference schematic into a template
+
+    Args:
+        template_dir (str): Directory holding the .asc files (defaults to CIRCUIT_TEMPLATE_DIR)
+
+    Returns:
+        dict: Topology name -> SchematicTemplate
+    """
+    template_dir = template_dir or CIRCUIT_TEMPLATE_DIR
+    files = dict(TOPOLOGY_FILES)
+    bundled = set(files.values())
+    for filename in sorted(os.listdir(template_dir)):
+        if filename.lower().endswith('.asc') and filename not in bundled:
+            files.setdefault(_topology_name(filename), filename)
+
+    templates = {}
+    for topology, filename in files.items():
+        path = os.path.join(template_dir, filename)
+        if not os.path.exists(path):
+            print(f"Warning: template for {topology} not found: {path}")
+            continue
+        templates[topology] = SchematicTemplate(topology, _read_asc_lines(path))
+    return templates
+
+
+def get_topology_templates():
+    """
+    Return the compiled templates, loading them on first use
+
+    Returns:
+        dict: Topology name -> SchematicTemplate
+    """
+    global _templates
+    if _templates is None:
+        with _templates_lock:
+            if _templates is None:
+                _templates = load_topology_templates()
+    return _templates
+
+def generate_circuit_schematic(components):
+    """
+    Generate LTspice schematic from component specifications
+    
+    Args:
+        components (dict): Dictionary containing component specifications
+            - topology: Circuit topology (basic_circuit, low_pass_filter, high_pass_filter, etc.)
+            - R: Resistor value in ohms
+            - C: Capacitor value in farads
+            - L: Inductor value in henries
+            - V: Voltage source value in volts
+            - V_type: Type of voltage source ('DC', 'AC', 'SINE', 'PULSE')
+            Topologies with transistors, diodes or op-amps (common_emitter,
+            boost_converter, astable_multivibrator, wien_oscillator,
+            full_bridge_rectifier) take their own value keys; see
+            circuit_layout.COMPLEX_DEFAULTS.
+    
+    Returns:
+        str: LTspice schematic content
+    """
+    # Check if we're using a complex circuit topology
+    topology = components.get('topology', 'basic_circuit')
+    
+    # If this is a complex topology, use the dedicated function
+    if topology in COMPLEX_TOPOLOGIES:
+        return generate_complex_circuit_netlist(topology, components)
+    
+    # Render from the compiled reference template, defaulting to the basic circuit
+    templates = get_topology_templates()
+    template = templates.get(topology) or templates['basic_circuit']
+    return template.render(components)
+
+
+def generate_complex_circuit_netlist(topology, components):
+    """
+    Generate a schematic for a topology without a reference template
+
+    The netlist is built from the topology's defaults and the given values,
+    then placed and wire-routed by circuit_layout.
+
+    Args:
+        topology (str): One of the complex topologies
+        components (dict): Component values overriding the defaults
+
+    Returns:
+        str: LTspice schematic content
+    """
+    from circuit_layout import complex_circuit_schematic
+
+    return complex_circuit_schematic(topology, components)
+
+
+def patch_circuit_schematic(schematic, old_components, components):
+    """
+    Update a rendered schematic for new component values
+
+    Only the SYMATTR Value lines of changed components are rewritten. A
+    topology change, or a topology without a template, is rendered afresh.
+
+    Args:
+        schematic (str): Schematic rendered from old_components
+        old_components (dict): Components the schematic was rendered from
+        components (dict): Updated components
+
+    Returns:
+        tuple: (schematic, number of lines rewritten, or None if it was re-rendered)
+    """
+    topology = components.get('topology', 'basic_circuit')
+    template = get_topology_templates().get(topology)
+    if template is None or topology != old_components.get('topology', 'basic_circuit'):
+        return generate_circuit_schematic(components), None
+    changed = {key for key in set(old_components) | set(components)
+               if old_components.get(key) != components.get(key)}
+    try:
+        return template.patch(schematic, components, changed)
+    except ValueError as e:
+        print(f"Warning: {e}; rendering again")
+        return generate_circuit_schematic(components), None
+
+# Local fast-path parser
+#
+# Commands for the supported topologies follow a small, regular grammar
+# ("RC low pass filter with 10k and 1uF at 25 kilohertz"), so they can be
+# parsed deterministically without a Gemini round trip. Gemini is only
+# consulted when the local parser is not confident in its result.
+LOCAL_PARSE_CONFIDENCE = float(os.getenv('LOCAL_PARSE_CONFIDENCE', '0.9'))
+
+# SPICE-style SI prefixes; 'm' is milli and 'meg' is mega, as in LTspice
+SI_PREFIXES = {
+    'pico': 1e-12, 'p': 1e-12,
+    'nano': 1e-9, 'n': 1e-9,
+    'micro': 1e-6, 'u': 1e-6,
+    'milli': 1e-3, 'm': 1e-3,
+    'kilo': 1e3, 'k': 1e3,
+    'mega': 1e6, 'meg': 1e6,
+}
+
+# Unit words mapped to the quantity they measure
+UNIT_WORDS = {
+    'ohms': 'R', 'ohm': 'R', 'r': 'R',
+    'farads': 'C', 'farad': 'C', 'f': 'C',
+    'henries': 'L', 'henrys': 'L', 'henry': 'L', 'h': 'L',
+    'hertz': 'freq', 'hz': 'freq',
+    'volts': 'V', 'volt': 'V', 'v': 'V',
+}
+
+# Component nouns that may follow or precede a unitless value
+COMPONENT_WORDS = {
+    'resistor': 'R', 'resistors': 'R', 'resistance': 'R',
+    'capacitor': 'C', 'capacitors': 'C', 'capacitance': 'C',
+    'inductor': 'L', 'inductors': 'L', 'inductance': 'L',
+    'frequency': 'freq',
+    'voltage': 'V', 'amplitude': 'V', 'source': 'V',
+}
+
+# Words that turn a frequency into a design target rather than the source
+# frequency ("1 kHz cutoff", "centre frequency of 2 kHz")
+TARGET_WORDS = {
+    'cutoff': 'cutoff', 'corner': 'cutoff',
+    'center': 'center', 'centre': 'center',
+    'bandwidth': 'bandwidth',
+}
+
+TOPOLOGY_PATTERNS = [
+    ('common_emitter', re.compile(r'\bcommon[\s-]?emitter\b')),
+    ('boost_converter', re.compile(r'\bboost\s+(?:converter|regulator)\b|\bstep[\s-]?up\s+converter\b')),
+    ('astable_multivibrator', re.compile(r'\bastable\b|\bmultivibrator\b')),
+    ('wien_oscillator', re.compile(r'\bwi[ae]n(?:[\s-]?bridge)?\s+oscillator\b')),
+    ('full_bridge_rectifier', re.compile(r'\b(?:full[\s-]?(?:wave|bridge)|bridge)\s+rectifier\b')),
+    ('band_pass_filter', re.compile(r'\bband[\s-]?pass\b')),
+    ('high_pass_filter', re.compile(r'\bhigh[\s-]?pass\b')),
+    ('low_pass_filter', re.compile(r'\blow[\s-]?pass\b')),
+    ('basic_circuit', re.compile(r'\b(?:basic|simple)\s+circuit\b')),
+]
+
+# Default values per topology, matching the reference schematics
+TOPOLOGY_DEFAULTS = {
+    'low_pass_filter': {'R': 1, 'C': 100e-6, 'V': 1, 'freq': 25000},
+    'high_pass_filter': {'R': 1, 'C': 100e-6, 'V': 1, 'freq': 25000},
+    'band_pass_filter': {'R1': 1, 'R2': 1, 'C1': 100e-6, 'C2': 100e-6, 'V': 1, 'freq': 25000},
+    'basic_circuit': {'V': 5, 'R': 1, 'C': 2},
+}
+
+# Topologies placed and routed by circuit_layout instead of rendered from a
+# reference schematic; their defaults are circuit_layout.COMPLEX_DEFAULTS
+COMPLEX_TOPOLOGIES = ('common_emitter', 'boost_converter', 'astable_multivibrator',
+                      'wien_oscillator', 'full_bridge_rectifier')
+
+
+def topology_defaults(topology):
+    """
+    Default component values of a topology
+
+    Args:
+        topology (str): Template or complex topology name
+
+    Returns:
+        dict: Value key -> default, empty for an unknown topology
+    """
+    if topology in COMPLEX_TOPOLOGIES:
+        from circuit_layout import COMPLEX_DEFAULTS
+        return COMPLEX_DEFAULTS[topology]
+    return TOPOLOGY_DEFAULTS.get(topology, {})
+
+_PREFIX_ALT = '|'.join(sorted(SI_PREFIXES, key=len, reverse=True))
+_UNIT_ALT = '|'.join(sorted(UNIT_WORDS, key=len, reverse=True))
+_QUANTITY_RE = re.compile(
+    r'(?<![\w.])(\d+(?:\.\d+)?|\.\d+)\s*'
+    r'(?:(' + _PREFIX_ALT + r')(?![a-z])\s*|(' + _PREFIX_ALT + r'))?'
+    r'(' + _UNIT_ALT + r')?(?![a-z])'
+)
+_WORD_RE = re.compile(r'[a-z]+')
+
+
+def normalize_command(command):
+    """
+    Normalize a command for local parsing
+
+    Args:
+        command (str): Raw text or recognized speech command
+
+    Returns:
+        str: Lower-cased command with unit symbols spelled out and collapsed whitespace
+    """
+    text = command.lower()
+    text = text.replace('µ', 'u').replace('μ', 'u').replace('ω', ' ohm ').replace('Ω', ' ohm ')
+    text = text.replace(',', ' ')
+    return ' '.join(text.split())
+
+
+def _nearest_component_word(text, start, end):
+    """Return the quantity named by the closest component noun around a value"""
+    after = _WORD_RE.findall(text[end:end + 24])[:2]
+    for word in after:
+        if word in COMPONENT_WORDS:
+            return COMPONENT_WORDS[word]
+    before = _WORD_RE.findall(text[max(0, start - 24):start])[-3:]
+    for word in reversed(before):
+        if word in COMPONENT_WORDS:
+            return COMPONENT_WORDS[word]
+    return None
+
+
+def _frequency_target(text, start, end):
+    """Return the design target a frequency value is named as, if any"""
+    after = _WORD_RE.findall(text[end:end + 24])[:2]
+    before = _WORD_RE.findall(text[max(0, start - 32):start])[-3:][::-1]
+    # Nearest word first; at equal distance the preceding word wins, as in
+    # "center 1 kHz and bandwidth 5 kHz"
+    for distance in range(3):
+        for words in (before, after):
+            if distance < len(words) and words[distance] in TARGET_WORDS:
+                return TARGET_WORDS[words[distance]]
+    return None
+
+
+def _extract_quantities(text):
+    """
+    Extract (quantity, value, explicit) tuples from a normalized command
+
+    A value is classified by its unit word, then by the nearest component
+    noun, and finally by its SI prefix (p/n/u suggest a capacitor, k/meg a
+    resistor). `explicit` is False when only the prefix heuristic was used.
+    """
+    quantities = []
+    for match in _QUANTITY_RE.finditer(text):
+        number, spaced_prefix, prefix, unit = match.groups()
+        prefix = spaced_prefix or prefix
+        value = float(number)
+        if prefix:
+            # Round away binary noise such as 4.7 * 1e3 == 4700.000000000001
+            value = float('%.12g' % (value * SI_PREFIXES[prefix]))
+        quantity = UNIT_WORDS.get(unit) if unit else None
+        explicit = quantity is not None
+        if quantity is None:
+            quantity = _nearest_component_word(text, match.start(), match.end())
+            explicit = quantity is not None
+        if quantity is None and prefix:
+            if SI_PREFIXES[prefix] < 1e-3:
+                quantity = 'C'
+            elif SI_PREFIXES[prefix] >= 1e3:
+                quantity = 'R'
+        if quantity is None:
+            continue
+        if quantity == 'freq':
+            quantity = _frequency_target(text, match.start(), match.end()) or quantity
+        if value.is_integer():
+            value = int(value)
+        quantities.append((quantity, value, explicit))
+    return quantities
+
+
+def _design_targets(topology, found):
+    """
+    Pick frequency targets for synthesis from the extracted quantities
+
+    Targets are only used when some component values are missing. A bare
+    frequency counts as the cutoff of a low/high-pass filter (and stays the
+    source frequency), and two frequencies as the band edges of a band-pass
+    filter.
+
+    Returns:
+        dict: Keyword arguments for circuit_synthesis.apply_targets, or {}
+    """
+    if topology == 'band_pass_filter':
+        if found.get('R') and len(found['R']) >= 2 and found.get('C') and len(found['C']) >= 2:
+            return {}
+        if found.get('center') and found.get('bandwidth'):
+            return {'center': found['center'][0], 'bandwidth': found['bandwidth'][0]}
+        edges = found.get('cutoff', []) + found.get('freq', [])
+        if len(edges) >= 2:
+            # Both bare frequencies are band edges, not the source frequency
+            found.pop('freq', None)
+            return {'f_low': min(edges[:2]), 'f_high': max(edges[:2])}
+        return {}
+    if topology in ('low_pass_filter', 'high_pass_filter'):
+        if found.get('R') and found.get('C'):
+            return {}
+        if found.get('cutoff'):
+            return {'cutoff': found['cutoff'][0]}
+        if found.get('freq'):
+            return {'cutoff': found['freq'][0]}
+    return {}
+
+
+def parse_command_locally(command):
+    """
+    Parse a circuit command with the local grammar
+
+    Args:
+        command (str): Recognized speech or typed command
+
+    Returns:
+        tuple: (components, confidence) where components has the same shape as
+            parse_command_with_gemini_v2 results and confidence is in [0, 1]
+    """
+    text = normalize_command(command)
+
+    topology = None
+    for name, pattern in TOPOLOGY_PATTERNS:
+        if pattern.search(text):
+            topology = name
+            break
+    if topology is None:
+        return {}, 0.0
+
+    components = {'topology': topology}
+    defaults = topology_defaults(topology)
+    components.update(defaults)
+
+    found = {}
+    guessed = 0
+    for quantity, value, explicit in _extract_quantities(text):
+        found.setdefault(quantity, []).append(value)
+        if not explicit:
+            guessed += 1
+
+    if topology == 'band_pass_filter':
+        # "1 ohm resistors" sets both resistors, "1k and 2k resistors" sets each
+        for base in ('R', 'C'):
+            values = found.pop(base, [])
+            if len(values) == 1:
+                components[base + '1'] = components[base + '2'] = values[0]
+            elif len(values) >= 2:
+                components[base + '1'], components[base + '2'] = values[0], values[1]
+            found[base] = values
+        required = ('R', 'C')
+    elif topology == 'basic_circuit':
+        for quantity in ('V', 'R', 'C'):
+            if found.get(quantity):
+                components[quantity] = found[quantity][0]
+        required = ()
+    elif topology in COMPLEX_TOPOLOGIES:
+        # Plain quantities only set the keys the circuit has, e.g. a boost
+        # converter's L and C; named parts such as RE keep their defaults
+        for quantity in ('V', 'R', 'C', 'L', 'freq'):
+            if found.get(quantity) and quantity in defaults:
+                components[quantity] = found[quantity][0]
+        required = ()
+    else:
+        for quantity in ('R', 'C'):
+            if found.get(quantity):
+                components[quantity] = found[quantity][0]
+        required = ('R', 'C')
+
+    # A filter described by its frequencies ("low pass filter at 1 kHz",
+    # "band pass from 300 Hz to 3 kHz") gets its missing values synthesized;
+    # only values the command gave are kept, template defaults are replaced
+    targets = _design_targets(topology, found)
+    if targets:
+        from circuit_synthesis import TARGET_TOLERANCE, apply_targets
+
+        value_keys = ('R1', 'R2', 'C1', 'C2') if topology == 'band_pass_filter' else ('R', 'C')
+        given = {key: components[key] for key in value_keys if found.get(key[0])}
+        try:
+            components.update(apply_targets(dict(given, topology=topology, **targets),
+                                            tolerance=TARGET_TOLERANCE))
+        except ValueError as e:
+            raise ParseError(str(e))
+
+    if topology != 'basic_circuit' and topology not in COMPLEX_TOPOLOGIES:
+        if found.get('V'):
+            components['V'] = found['V'][0]
+        if found.get('freq'):
+            components['freq'] = found['freq'][0]
+        elif targets:
+            # Drive the circuit at the frequency it was designed around
+            components['freq'] = targets.get('cutoff') or targets.get('center') or \
+                float('%.6g' % (targets['f_low'] * targets['f_high']) ** 0.5)
+
+    # Confidence drops for every required value that fell back to a default,
+    # every value classified only by its prefix, and unsupported components
+    confidence = 1.0
+    confidence -= 0.3 * sum(1 for quantity in required if not found.get(quantity) and not targets)
+    confidence -= 0.1 * guessed
+    if found.get('L') and 'L' not in defaults:
+        confidence -= 0.5
+    return components, max(confidence, 0.0)
+
+# Parse-result cache
+#
+# Two tiers: a bounded in-process LRU and a persistent SQLite store under
+# CIRCUIT_DIR that survives restarts. Both are keyed on the normalized
+# command so "10k ohm" and "10 kilo ohms" share an entry.
+PARSE_CACHE_SIZE = int(os.getenv('PARSE_CACHE_SIZE', '256'))
+PARSE_CACHE_TTL = float(os.getenv('PARSE_CACHE_TTL', str(7 * 24 * 3600)))
+PARSE_CACHE_MAX_ENTRIES = int(os.getenv('PARSE_CACHE_MAX_ENTRIES', '10000'))
+PARSE_CACHE_PATH = os.path.join(CIRCUIT_DIR, 'parse_cache.sqlite3')
+
+# Version of what a command parses to. Bump it whenever the local grammar,
+# the Gemini prompts or _complete_components change their output; a store
+# written by another version is emptied when it is opened.
+PARSE_CACHE_VERSION = 3
+
+_QUANTITY_SUFFIX = {'R': 'ohm', 'C': 'f', 'L': 'h', 'freq': 'hz', 'V': 'v'}
+
+
+def cache_key(command):
+    """
+    Build the cache key for a command
+
+    Case, whitespace and unit spelling are normalized and every value is
+    rewritten in base units, e.g. "10 kilo ohms" -> "10000ohm".
+
+    Args:
+        command (str): Recognized speech or typed command
+
+    Returns:
+        str: Normalized cache key
+    """
+    def canonical(match):
+        number, spaced_prefix, prefix, unit = match.groups()
+        prefix = spaced_prefix or prefix
+        value = float(number) * SI_PREFIXES.get(prefix, 1)
+        suffix = _QUANTITY_SUFFIX[UNIT_WORDS[unit]] if unit else ''
+        return '%.12g%s' % (value, suffix)
+
+    return _QUANTITY_RE.sub(canonical, normalize_command(command))
+
+
+class ParseCache:
+    """
+    Two-tier cache for parsed components
+
+    Args:
+        path (str): SQLite file for the persistent tier, or None to disable it
+        size (int): Maximum number of entries in the in-memory LRU
+        ttl (float): Seconds before a persistent entry expires
+        max_entries (int): Maximum number of persistent entries
+    """
+
+    def __init__(self, path, size=PARSE_CACHE_SIZE, ttl=PARSE_CACHE_TTL, max_entries=PARSE_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.size = size
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self.counters = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+
+    def _connect(self):
+        """Open the persistent store on first use"""
+        if self._db is None and self.path:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS parse_cache ("
+                "key TEXT PRIMARY KEY, components TEXT NOT NULL, "
+                "created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS parse_cache_accessed ON parse_cache (accessed)")
+            version = self._db.execute("PRAGMA user_version").fetchone()[0]
+            if version != PARSE_CACHE_VERSION:
+                dropped = self._db.execute("DELETE FROM parse_cache").rowcount
+                self._db.execute(f"PRAGMA user_version = {int(PARSE_CACHE_VERSION)}")
+                if dropped:
+                    print(f"Parse cache: dropped {dropped} entries from version {version}")  # Debug print
+            self._db.commit()
+        return self._db
+
+    def _remember(self, key, components):
+        """Insert into the LRU tier, evicting the least recently used entry"""
+        self._memory[key] = components
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.size:
+            self._memory.popitem(last=False)
+
+    def get(self, key):
+        """
+        Look up a cached result
+
+        Args:
+            key (str): Cache key from cache_key()
+
+        Returns:
+            dict or None: A copy of the cached components, or None on a miss
+        """
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.counters['memory_hits'] += 1
+                return dict(self._memory[key])
+
+            try:
+                db = self._connect()
+                row = None
+                if db is not None:
+                    now = time.time()
+                    row = db.execute(
+                        "SELECT components FROM parse_cache WHERE key = ? AND created >= ?",
+                        (key, now - self.ttl)
+                    ).fetchone()
+                    if row is not None:
+                        db.execute("UPDATE parse_cache SET accessed = ? WHERE key = ?", (now, key))
+                        db.commit()
+            except sqlite3.Error as e:
+                print(f"Warning: parse cache read failed: {e}")
+                row = None
+
+            if row is None:
+                self.counters['misses'] += 1
+                return None
+
+            components = json.loads(row[0])
+            self._remember(key, components)
+            self.counters['disk_hits'] += 1
+            return dict(components)
+
+    def put(self, key, components):
+        """
+        Store a parse result in both tiers
+
+        Args:
+            key (str): Cache key from cache_key()
+            components (dict): Parsed components
+        """
+        try:
+            payload = json.dumps(components)
+        except (TypeError, ValueError):
+            # Not JSON-serializable, keep it in memory only
+            payload = None
+
+        with self._lock:
+            self._remember(key, dict(components))
+            self.counters['stores'] += 1
+            if payload is None:
+                return
+            try:
+                db = self._connect()
+                if db is None:
+                    return
+                now = time.time()
+                db.execute(
+                    "INSERT OR REPLACE INTO parse_cache (key, components, created, accessed) VALUES (?, ?, ?, ?)",
+                    (key, payload, now, now)
+                )
+                self._evict(db, now)
+                db.commit()
+            except sqlite3.Error as e:
+                print(f"Warning: parse cache write failed: {e}")
+
+    def _evict(self, db, now):
+        """Drop expired entries and trim the store to max_entries"""
+        expired = db.execute("DELETE FROM parse_cache WHERE created < ?", (now - self.ttl,)).rowcount
+        overflow = db.execute(
+            "DELETE FROM parse_cache WHERE key IN ("
+            "SELECT key FROM parse_cache ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        ).rowcount
+        self.counters['evictions'] += max(expired, 0) + max(overflow, 0)
+
+    def clear(self):
+        """Empty both tiers"""
+        with self._lock:
+            self._memory.clear()
+            try:
+                db = self._connect()
+                if db is not None:
+                    db.execute("DELETE FROM parse_cache")
+                    db.commit()
+            except sqlite3.Error as e:
+                print(f"Warning: parse cache clear failed: {e}")
+
+    def stats(self):
+        """
+        Return hit/miss counters
+
+        Returns:
+            dict: Counters plus the current in-memory size and overall hit rate
+        """
+        with self._lock:
+            stats = dict(self.counters)
+            stats['memory_size'] = len(self._memory)
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['memory_hits'] + stats['disk_hits']) / lookups if lookups else 0.0
+        return stats
+
+
+parse_cache = ParseCache(PARSE_CACHE_PATH)
+metrics.register_collector('parse_cache', parse_cache.stats)
+
+
+# Gemini structured output
+#
+# The model is asked for JSON constrained by COMPONENT_SCHEMA, so a reply is
+# decoded with one json.loads. Values are validated and coerced to base-unit
+# floats; a reply that still does not fit gets one repair round trip.
+GEMINI_REPAIR_ATTEMPTS = int(os.getenv('GEMINI_REPAIR_ATTEMPTS', '1'))
+
+# Numeric component keys Gemini may return, in base SI units
+COMPONENT_VALUE_KEYS = ('R', 'C', 'L', 'R1', 'R2', 'C1', 'C2', 'V', 'freq',
+                        'cutoff', 'center', 'bandwidth', 'f_low', 'f_high',
+                        'Vin', 'RC', 'RE', 'RL', 'RB', 'CE', 'Rf', 'Rg', 'duty')
+
+COMPONENT_SCHEMA = {
+    'type': 'object',
+    'properties': dict(
+        {'topology': {'type': 'string', 'enum': sorted(TOPOLOGY_DEFAULTS) + list(COMPLEX_TOPOLOGIES)},
+         'V_type': {'type': 'string', 'enum': ['SINE', 'DC']}},
+        **{key: {'type': 'number'} for key in COMPONENT_VALUE_KEYS}
+    ),
+    'required': ['topology'],
+}
+
+GEMINI_GENERATION_CONFIG = {
+    'response_mime_type': 'application/json',
+    'response_schema': COMPONENT_SCHEMA,
+    'temperature': 0,
+    'max_output_tokens': 256,
+}
+
+GEMINI_INSTRUCTIONS = (
+    "topology: low_pass_filter, high_pass_filter, band_pass_filter, basic_circuit, "
+    "common_emitter, boost_converter, astable_multivibrator, wien_oscillator or full_bridge_rectifier.\n"
+    "Values are numbers in base units (10k -> 10000, 47uF -> 4.7e-05). "
+    "low/high_pass_filter: R, C; band_pass_filter: R1, R2, C1, C2; basic_circuit: V, R, C; "
+    "common_emitter: V, Vin, freq, R1, R2, RC, RE, RL, C1, C2, CE; boost_converter: V, L, C, R, freq, duty; "
+    "astable_multivibrator: V, RC, RB, C; wien_oscillator: R, C, Rf, Rg; full_bridge_rectifier: V, freq, C, R. "
+    "Optional: V (source amplitude), freq (source Hz).\n"
+    "Given only a design target, return it in Hz instead of values: cutoff (low/high pass), "
+    "f_low and f_high or center and bandwidth (band pass).\n"
+    "Omit anything not stated.\n"
+)
+
+GEMINI_PROMPT = (
+    "Extract the LTspice circuit from the command as JSON.\n"
+    + GEMINI_INSTRUCTIONS
+    + "Command: {command}"
+)
+
+GEMINI_REPAIR_PROMPT = (
+    "\nYour previous reply was rejected ({error}):\n{reply}\n"
+    "Reply with only the corrected JSON object."
+)
+
+
+class ParseError(ValueError):
+    """Raised when a command cannot be turned into components"""
+
+
+def coerce_value(value):
+    """
+    Convert a number or a value string such as '4.7k', '47 uF' or '10 kilo ohms' to a float
+
+    Args:
+        value: Number or string
+
+    Returns:
+        float: Value in base units
+
+    Raises:
+        ValueError: If the value is not a finite number
+    """
+    if isinstance(value, bool):
+        raise ValueError(f"not a number: {value!r}")
+    if isinstance(value, (int, float)):
+        number = float(value)
+    elif isinstance(value, str):
+        match = _QUANTITY_RE.search(normalize_command(value))
+        if match is None:
+            raise ValueError(f"not a number: {value!r}")
+        digits, spaced_prefix, prefix, _ = match.groups()
+        number = float('%.12g' % (float(digits) * SI_PREFIXES.get(spaced_prefix or prefix, 1)))
+        if value.strip().startswith('-'):
+            number = -number
+    else:
+        raise ValueError(f"not a number: {value!r}")
+    if number != number or number in (float('inf'), float('-inf')):
+        raise ValueError(f"not a finite number: {value!r}")
+    return number
+
+
+def decode_components(text):
+    """
+    Decode and validate a Gemini reply
+
+    Args:
+        text (str): Reply text, a JSON object (code fences are tolerated)
+
+    Returns:
+        dict: topology plus coerced numeric values; unknown keys are dropped
+
+    Raises:
+        ValueError: If the reply is not a JSON object that fits COMPONENT_SCHEMA
+    """
+    start, end = text.find('{'), text.rfind('}')
+    if start == -1 or end < start:
+        raise ValueError("no JSON object in reply")
+    return validate_components(json.loads(text[start:end + 1]))
+
+
+def validate_components(data):
+    """
+    Validate one decoded JSON object against COMPONENT_SCHEMA
+
+    Args:
+        data (dict): Decoded reply object
+
+    Returns:
+        dict: topology plus coerced numeric values; unknown keys are dropped
+
+    Raises:
+        ValueError: If the object does not fit the schema
+    """
+    if not isinstance(data, dict):
+        raise ValueError("reply is not a JSON object")
+
+    topology = data.get('topology')
+    if topology not in TOPOLOGY_DEFAULTS and topology not in COMPLEX_TOPOLOGIES \
+            and topology not in get_topology_templates():
+        raise ValueError(f"unknown topology {topology!r}")
+    components = {'topology': topology}
+    problems = []
+    for key in COMPONENT_VALUE_KEYS:
+        if data.get(key) is None:
+            continue
+        try:
+            number = coerce_value(data[key])
+        except ValueError as e:
+            problems.append(f"{key}: {e}")
+            continue
+        if number <= 0 and key != 'V':
+            problems.append(f"{key}: must be positive, got {number:g}")
+            continue
+        components[key] = int(number) if number.is_integer() else number
+    if data.get('V_type') is not None:
+        if str(data['V_type']).upper() not in ('SINE', 'DC'):
+            problems.append(f"V_type: unknown source type {data['V_type']!r}")
+        else:
+            components['V_type'] = str(data['V_type']).upper()
+    if problems:
+        raise ValueError('; '.join(problems))
+    return components
+
+
+def _token_counts(response, prompt, reply):
+    """Prompt/output token counts from usage metadata, estimated at 4 chars per token without it"""
+    usage = getattr(response, 'usage_metadata', None)
+    if usage is not None and getattr(usage, 'prompt_token_count', None):
+        return usage.prompt_token_count, usage.candidates_token_count or 0
+    return len(prompt) // 4, len(reply) // 4
+
+
+def parse_with_gemini(command):
+    """
+    Parse a command with Gemini's structured JSON output
+
+    A reply that fails validation is sent back once (GEMINI_REPAIR_ATTEMPTS)
+    with the error. Token counts and decode time are recorded in the metrics.
+
+    Args:
+        command (str): Recognized speech or typed command
+
+    Returns:
+        dict: Component specifications and circuit topology
+
+    Raises:
+        ParseError: If the request fails or no valid reply arrives
+    """
+    prompt = GEMINI_PROMPT.format(command=json.dumps(command))
+    request = prompt
+    error = None
+    for attempt in range(1 + GEMINI_REPAIR_ATTEMPTS):
+        metrics.increment('parse_gemini' if attempt == 0 else 'parse_gemini_repair')
+        try:
+            with metrics.span('gemini'):
+                response = generate_content(request, GEMINI_GENERATION_CONFIG)
+            reply = response.text
+        except Exception as e:
+            # Service errors are not worth a repair round trip
+            metrics.increment('parse_gemini_error')
+            error = f"Gemini request failed: {e}"
+            break
+
+        prompt_tokens, output_tokens = _token_counts(response, request, reply)
+        metrics.increment('gemini_prompt_tokens', prompt_tokens)
+        metrics.increment('gemini_output_tokens', output_tokens)
+        start = time.perf_counter()
+        try:
+            with metrics.span('gemini_decode'):
+                components = decode_components(reply)
+        except ValueError as e:
+            metrics.increment('parse_gemini_invalid')
+            error = f"invalid Gemini reply: {e}"
+            print(f"Rejected Gemini reply ({e}): {reply!r}")  # Debug print
+            request = prompt + GEMINI_REPAIR_PROMPT.format(error=e, reply=reply[:500])
+            continue
+        print(f"Gemini reply: {prompt_tokens} prompt / {output_tokens} output tokens, "
+              f"decoded in {(time.perf_counter() - start) * 1000:.3f} ms")  # Debug print
+        return _complete_components(command, components)
+
+    raise ParseError(f"Could not parse command ({error})")
+
+
+def _complete_components(command, components):
+    """Apply the topology override, design-target synthesis and defaults to decoded components"""
+    # Check for basic circuit case and set topology explicitly
+    if "simple circuit" in command.lower() or "basic circuit" in command.lower():
+        components['topology'] = 'basic_circuit'
+
+    # Fill in values for design targets such as a cutoff frequency, then
+    # the topology's defaults for anything still unstated
+    if any(key in components for key in ('cutoff', 'center', 'f_low')):
+        from circuit_synthesis import TARGET_TOLERANCE, apply_targets
+        try:
+            components = apply_targets(components, tolerance=TARGET_TOLERANCE)
+        except ValueError as e:
+            raise ParseError(str(e))
+    return {'topology': components['topology'], **topology_defaults(components['topology']), **components}
+
+
+# Gemini micro-batching
+#
+# Under load, parse requests that arrive within GEMINI_BATCH_WINDOW_MS of each
+# other are sent as one prompt of up to GEMINI_BATCH_SIZE commands, and the
+# reply array is fanned back out to each caller. Items missing from or
+# invalid in the reply are sent again together, so one bad command never
+# fails the others. A window of 0 sends every command separately.
+GEMINI_BATCH_WINDOW_MS = float(os.getenv('GEMINI_BATCH_WINDOW_MS', '25'))
+GEMINI_BATCH_SIZE = int(os.getenv('GEMINI_BATCH_SIZE', '16'))
+
+# Gemini requests in flight at once across all batches
+GEMINI_CONCURRENCY = int(os.getenv('GEMINI_CONCURRENCY', '4'))
+
+GEMINI_BATCH_SCHEMA = {
+    'type': 'array',
+    'items': {
+        'type': 'object',
+        'properties': dict(COMPONENT_SCHEMA['properties'], id={'type': 'integer'}),
+        'required': ['id', 'topology'],
+    },
+}
+
+GEMINI_BATCH_GENERATION_CONFIG = dict(
+    GEMINI_GENERATION_CONFIG,
+    response_schema=GEMINI_BATCH_SCHEMA,
+    # Room for one ~40-token object per command
+    max_output_tokens=64 * GEMINI_BATCH_SIZE + 64,
+)
+
+GEMINI_BATCH_PROMPT = (
+    "Extract the LTspice circuit from each command as JSON. Reply with an array "
+    "holding one object per command, each with the command's id.\n"
+    + GEMINI_INSTRUCTIONS
+    + "Commands: {commands}"
+)
+
+
+def parse_batch_with_gemini(commands):
+    """
+    Parse several commands with one Gemini request
+
+    Args:
+        commands (list): Recognized speech or typed commands
+
+    Returns:
+        list: Components for each command, or None where the reply had no
+            valid entry for it
+
+    Raises:
+        ParseError: If the request itself fails
+    """
+    prompt = GEMINI_BATCH_PROMPT.format(
+        commands=json.dumps([{'id': i, 'command': command} for i, command in enumerate(commands)])
+    )
+    metrics.increment('parse_gemini_batch')
+    metrics.increment('parse_gemini_batched_items', len(commands))
+    try:
+        with metrics.span('gemini_batch'):
+            response = generate_content(prompt, GEMINI_BATCH_GENERATION_CONFIG)
+        reply = response.text
+    except Exception as e:
+        metrics.increment('parse_gemini_error')
+        raise ParseError(f"Could not parse commands (Gemini request failed: {e})")
+
+    prompt_tokens, output_tokens = _token_counts(response, prompt, reply)
+    metrics.increment('gemini_prompt_tokens', prompt_tokens)
+    metrics.increment('gemini_output_tokens', output_tokens)
+
+    results = [None] * len(commands)
+    with metrics.span('gemini_decode'):
+        start, end = reply.find('['), reply.rfind(']')
+        try:
+            entries = json.loads(reply[start:end + 1]) if start != -1 and end > start else None
+        except ValueError:
+            entries = None
+        if not isinstance(entries, list):
+            metrics.increment('parse_gemini_invalid')
+            print(f"Rejected Gemini batch reply: {reply[:200]!r}")  # Debug print
+            return results
+        for entry in entries:
+            index = entry.get('id') if isinstance(entry, dict) else None
+            if not isinstance(index, int) or not 0 <= index < len(commands) or results[index] is not None:
+                continue
+            try:
+                results[index] = _complete_components(commands[index], validate_components(entry))
+            except ValueError as e:
+                metrics.increment('parse_gemini_invalid')
+                print(f"Rejected Gemini batch entry {index} ({e}): {entry!r}")  # Debug print
+    print(f"Gemini batch of {len(commands)}: {prompt_tokens} prompt / {output_tokens} output tokens, "
+          f"{sum(r is not None for r in results)} valid")  # Debug print
+    return results
+
+
+class GeminiBatcher:
+    """
+    Coalesce concurrent Gemini parse requests into batched calls
+
+    A collector thread, started on first use, waits for a free request slot,
+    then gathers pending commands until the oldest has waited `window_ms` or
+    `max_items` are queued. While all slots are busy, commands keep queueing,
+    so batches grow with load.
+
+    Args:
+        window_ms (float): How long the first command of a batch may wait for company
+        max_items (int): Commands per Gemini request
+        concurrency (int): Gemini requests in flight at once
+    """
+
+    def __init__(self, window_ms=GEMINI_BATCH_WINDOW_MS, max_items=GEMINI_BATCH_SIZE,
+                 concurrency=GEMINI_CONCURRENCY):
+        self.window = window_ms / 1000
+        self.max_items = max_items
+        self.concurrency = concurrency
+        self._pending = []
+        self._cond = threading.Condition()
+        self._slots = threading.Semaphore(concurrency)
+        self._pool = None
+        self._closed = False
+
+    @property
+    def enabled(self):
+        return self.window > 0 and self.max_items > 1
+
+    def parse(self, command):
+        """
+        Parse a command, batched with any others that arrive at the same time
+
+        Returns:
+            dict: Component specifications and circuit topology
+
+        Raises:
+            ParseError: If Gemini fails for this command
+        """
+        if not self.enabled:
+            return parse_with_gemini(command)
+        return self.submit(command).result()
+
+    def submit(self, command):
+        """
+        Queue a command for the next batch
+
+        Returns:
+            Future: Resolves to the components, or raises ParseError
+        """
+        future = Future()
+        with self._cond:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='gemini-batch')
+                threading.Thread(target=self._collect, name='gemini-batcher', daemon=True).start()
+            self._pending.append((command, future, time.monotonic()))
+            self._cond.notify()
+        return future
+
+    def close(self):
+        """Send what is queued, then stop the collector thread and the request pool"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+
+    def _collect(self):
+        """Form batches whenever a request slot is free"""
+        while True:
+            self._slots.acquire()
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    # Batches already sent finish on the pool's threads
+                    self._slots.release()
+                    self._pool.shutdown(wait=False)
+                    return
+                deadline = self._pending[0][2] + self.window
+                while len(self._pending) < self.max_items:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._pending[:self.max_items]
+                del self._pending[:self.max_items]
+            self._pool.submit(self._dispatch, batch)
+
+    def _dispatch(self, batch):
+        """Send one batch and resolve its futures"""
+        try:
+            # Items the reply got wrong are sent again together, like the
+            # repair round of a single request; a lone item takes the
+            # single-command path with its own repair prompt
+            pending = batch
+            for attempt in range(1 + GEMINI_REPAIR_ATTEMPTS):
+                if len(pending) == 1:
+                    command, future, _ = pending[0]
+                    try:
+                        future.set_result(parse_with_gemini(command))
+                    except Exception as e:
+                        future.set_exception(e)
+                    return
+                if attempt > 0:
+                    metrics.increment('parse_gemini_batch_retry', len(pending))
+                try:
+                    results = parse_batch_with_gemini([command for command, _, _ in pending])
+                except ParseError as e:
+                    for _, future, _ in pending:
+                        future.set_exception(ParseError(str(e)))
+                    return
+                for (_, future, _), components in zip(pending, results):
+                    if components is not None:
+                        future.set_result(components)
+                pending = [item for item, components in zip(pending, results) if components is None]
+                if not pending:
+                    return
+            for command, future, _ in pending:
+                future.set_exception(ParseError(f"Could not parse command {command!r} (no valid Gemini reply)"))
+        except BaseException as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            self._slots.release()
+
+
+gemini_batcher = GeminiBatcher()
+
+
+def parse_command_with_gemini_v2(command, batcher=None):
+    """
+    Enhanced version of parse_command_with_gemini with support for netlists from Circuits-LTSpice
+    
+    Args:
+        command (str): Recognized speech command
+        batcher (GeminiBatcher): Batcher for the Gemini call (default: the shared gemini_batcher)
+    
+    Returns:
+        dict: Component specifications and circuit topology
+
+    Raises:
+        ParseError: If Gemini fails and the local grammar found no topology
+    """
+    # Repeated commands skip parsing entirely
+    key = cache_key(command)
+    cached = parse_cache.get(key)
+    if cached is not None:
+        metrics.increment('parse_cache_hit')
+        print(f"Parse cache hit: {cached}")  # Debug print
+        return cached
+
+    # Try the local grammar first and only pay for a Gemini call when needed
+    components, confidence = parse_command_locally(command)
+    if confidence >= LOCAL_PARSE_CONFIDENCE:
+        metrics.increment('parse_local')
+        print(f"Parsed locally (confidence {confidence:.2f}): {components}")  # Debug print
+        parse_cache.put(key, components)
+        return components
+
+    # While Gemini's circuit breaker is open, any local parse beats waiting
+    # for a call that is refused anyway
+    from circuit_remote import get_remote
+    if components and not get_remote('gemini').available():
+        metrics.increment('parse_local_fallback')
+        print(f"Gemini unavailable, using the local parse: {components}")  # Debug print
+        return components
+
+    try:
+        parsed = (batcher or gemini_batcher).parse(command)
+    except ParseError as e:
+        print(f"Gemini parsing error: {e}")
+        if not components:
+            metrics.increment('parse_failed')
+            raise
+        # Not cached: the next attempt may reach Gemini
+        metrics.increment('parse_local_fallback')
+        print(f"Using the local parse instead: {components}")  # Debug print
+        return components
+    parse_cache.put(key, parsed)
+    return parsed
+
+
+def open_in_ltspice(circuit_path):
+    """
+    Open the circuit file in LTspice
+    
+    Args:
+        circuit_path (str): Path to the circuit file
+    
+    Returns:
+        tuple: (success, message)
+    """
+    try:
+        if not os.path.exists(LTSPICE_PATH):
+            return False, f"LTspice executable not found at {LTSPICE_PATH}"
+            
+        if not os.path.exists(circuit_path):
+            return False, f"Circuit file not found: {circuit_path}"
+            
+        # Try to open with shell=True to handle permission issues
+        try:
+            # Use absolute paths
+            abs_ltspice = os.path.abspath(LTSPICE_PATH)
+            abs_circuit = os.path.abspath(circuit_path)
+            
+            # For shortcut files, use the full command string
+            if abs_ltspice.endswith('.lnk'):
+                subprocess.Popen(f'"{abs_ltspice}" "{abs_circuit}"', shell=True)
+            else:
+                # For executable files, try both methods
+                try:
+                    subprocess.Popen([abs_ltspice, abs_circuit], shell=True)
+                except Exception:
+                    subprocess.Popen(f'"{abs_ltspice}" "{abs_circuit}"', shell=True)
+                
+            return True, "Circuit opened in LTspice"
+        except PermissionError:
+            return False, "Permission denied. Please run the script as administrator or check LTspice installation."
+        except Exception as e:
+            return False, f"Error launching LTspice: {str(e)}"
+    except Exception as e:
+        return False, f"Error opening LTspice: {str(e)}"
+
+
+def write_circuit(schematic_content, directory=None):
+    """
+    Write a schematic to a new, uniquely named .asc file
+
+    The name keeps the circuit_<timestamp> prefix and adds a random suffix,
+    and the file is opened in exclusive mode, so concurrent writers never
+    overwrite each other.
+
+    Args:
+        schematic_content (str): LTspice schematic content
+        directory (str): Target directory (defaults to CIRCUIT_DIR)
+
+    Returns:
+        str: Path of the written circuit file
+    """
+    directory = directory or ensure_circuit_dir()
+    os.makedirs(directory, exist_ok=True)
+    timestamp = time.strftime("%Y%m%d_%H%M%S")
+    while True:
+        circuit_path = os.path.join(directory, f"circuit_{timestamp}_{uuid.uuid4().hex[:8]}.asc")
+        try:
+            with open(circuit_path, 'x') as f:
+                f.write(schematic_content)
+            return circuit_path
+        except FileExistsError:
+            continue
+
+
+def save_circuit(schematic_content, components=None, command=None):
+    """
+    Save a schematic under CIRCUIT_DIR
+
+    With CIRCUIT_STORE on (the default) the schematic goes into the
+    content-addressed store, so identical schematics share one file, and is
+    indexed with its components and command. Otherwise it is written to a
+    new timestamped file.
+
+    Args:
+        schematic_content (str): LTspice schematic content
+        components (dict): Components it was rendered from
+        command (str): Request that produced it
+
+    Returns:
+        str: Path of the circuit file
+    """
+    from circuit_store import CIRCUIT_STORE, get_store
+
+    if not CIRCUIT_STORE:
+        return write_circuit(schematic_content)
+    return get_store().put(schematic_content, components, command)['path']
+
+
+def rewrite_circuit(circuit_path, schematic_content):
+    """
+    Replace an existing circuit file's content atomically
+
+    The new content goes to a temporary file in the same directory that is
+    then renamed over the original, so LTspice never sees a partial file.
+
+    Args:
+        circuit_path (str): Circuit file to replace
+        schematic_content (str): New LTspice schematic content
+
+    Returns:
+        str: circuit_path
+    """
+    temp_path = f"{circuit_path}.{uuid.uuid4().hex[:8]}.tmp"
+    try:
+        with open(temp_path, 'x') as f:
+            f.write(schematic_content)
+        os.replace(temp_path, circuit_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return circuit_path
+
+
+def create_circuit(command, launch=False):
+    """
+    Run the text pipeline: parse, render, write and optionally open in LTspice
+
+    Args:
+        command (str): Circuit description
+        launch (bool): Open the written file in LTspice
+
+    Returns:
+        dict: components, schematic, path and the LTspice launch message
+    """
+    with metrics.span('parse'):
+        components = parse_command_with_gemini_v2(command)
+    with metrics.span('render'):
+        schematic_content = generate_circuit_schematic(components)
+    with metrics.span('write'):
+        circuit_path = save_circuit(schematic_content, components, command)
+    message = ''
+    if launch:
+        with metrics.span('launch'):
+            success, message = open_in_ltspice(circuit_path)
+    return {
+        'components': components,
+        'schematic': schematic_content,
+        'path': circuit_path,
+        'message': message,
+    }
@@ -0,0 +1,517 @@
+"""
+Automatic placement and wire routing of LTspice schematics
+
+Turns a netlist-level description (parts with one net per pin) into an .asc
+schematic on LTspice's 16-unit grid. It renders the topologies that have no
+reference schematic, and netlists of any size.
+
+Placement: parts are ordered by a breadth-first walk of the net graph,
+starting from the sources, so connected parts sit side by side. They are
+then packed into rows of slots, all in R0 orientation.
+
+Routing: every pin leaves its row upward into the routing channel above
+it. The topmost pin goes straight up. The others jog sideways to a private
+column beside the part body, ordered so that jogs never cross. In a
+channel, each net gets one horizontal track that spans its pins. Tracks
+are packed with the left-edge algorithm, so nets whose spans don't overlap
+share a track. A net with pins in several rows extends its tracks to a
+vertical trunk left of the rows; trunk columns are packed the same way.
+Each pin has its own column and no two tracks overlap, so wires of
+different nets only cross at right angles, which LTspice does not connect.
+The work is O(n log n) in the number of pins; no pair of wires is ever
+compared.
+
+wire_overlaps() checks a schematic with a per-row/per-column sorted index
+of its wires.
+"""
+import heapq
+import math
+import re
+from collections import deque
+
+from circuit_core import format_value
+
+# LTspice's grid step; every pin and wire end lies on it
+GRID = 16
+
+GROUND = '0'
+
+# Pin offsets of each symbol in R0, in SPICE pin order
+SYMBOL_PINS = {
+    'res': ((16, 16), (16, 96)),
+    'cap': ((16, 0), (16, 64)),
+    'ind': ((16, 16), (16, 96)),
+    'voltage': ((0, 16), (0, 96)),
+    'current': ((0, 0), (0, 80)),
+    'diode': ((16, 0), (16, 64)),
+    'npn': ((64, 0), (0, 48), (64, 96)),
+    'nmos': ((48, 0), (0, 80), (48, 96)),
+    'opamp': ((-32, 80), (-32, 48), (32, 64)),
+}
+
+# Drawn extent of each symbol in R0: (left, top, right, bottom)
+SYMBOL_BODIES = {
+    'res': (0, 16, 32, 96),
+    'cap': (0, 0, 32, 64),
+    'ind': (0, 16, 32, 96),
+    'voltage': (-32, 16, 32, 96),
+    'current': (-32, 0, 32, 80),
+    'diode': (0, 0, 32, 64),
+    'npn': (0, 0, 64, 96),
+    'nmos': (0, 0, 48, 96),
+    'opamp': (-32, 32, 32, 96),
+}
+
+# Library path of symbols that are not in LTspice's top-level folder
+SYMBOL_PATHS = {'opamp': 'OpAmps\\opamp'}
+
+# Space between the lowest track of a channel and the row below it
+CHANNEL_GAP = 32
+
+# Space between the bottom of a row and the next channel
+ROW_GAP = 48
+
+# Space between neighbouring slots in a row
+SLOT_GAP = 32
+
+# Estimated width of one label character at LTspice's default font size
+LABEL_CHAR = 10
+
+# Net names LTspice would generate itself; other names get a FLAG label
+_AUTO_NET_RE = re.compile(r'^N\d+$')
+
+
+class Part:
+    """
+    One component of a netlist to lay out
+
+    Attributes:
+        name (str): Instance name, e.g. 'R1'
+        symbol (str): Symbol name, one of SYMBOL_PINS
+        nets (tuple): Net name per pin, in SYMBOL_PINS order; '0' is ground
+        value (str): SYMATTR Value, or None
+        value2 (str): SYMATTR Value2 (e.g. 'AC 1' for a source), or None
+    """
+
+    def __init__(self, name, symbol, nets, value=None, value2=None):
+        if symbol not in SYMBOL_PINS:
+            raise ValueError(f"{name}: unsupported symbol '{symbol}'")
+        if len(nets) != len(SYMBOL_PINS[symbol]):
+            raise ValueError(f"{name}: {symbol} has {len(SYMBOL_PINS[symbol])} pins, got {len(nets)} nets")
+        self.name = name
+        self.symbol = symbol
+        self.nets = tuple(str(net) for net in nets)
+        self.value = None if value is None else format_value(value)
+        self.value2 = value2
+
+    def __repr__(self):
+        return f"Part({self.name!r}, {self.symbol!r}, {self.nets!r}, {self.value!r})"
+
+
+_escapes = {}
+
+
+def _escape_columns(symbol):
+    """
+    Column each pin of a symbol leaves its row by, relative to the symbol origin
+
+    The topmost pin goes straight up if it is on the top edge of the body.
+    The other pins jog to columns beside the body, on the side they are on.
+    On each side the higher a pin, the nearer its column, so the jogs of lower
+    pins pass under the columns of higher ones instead of crossing them.
+
+    Returns:
+        tuple: (column x per pin, leftmost x, rightmost x)
+    """
+    if symbol not in _escapes:
+        pins = SYMBOL_PINS[symbol]
+        left, top, right, _ = SYMBOL_BODIES[symbol]
+        center = (left + right) / 2
+        columns = [None] * len(pins)
+        topmost = min(range(len(pins)), key=lambda i: pins[i][1])
+        if pins[topmost][1] <= top:
+            columns[topmost] = pins[topmost][0]
+        # Pins on the center line go left; the labels are on the right
+        sides = ([], [])
+        for i in sorted(range(len(pins)), key=lambda i: pins[i][1]):
+            if columns[i] is None:
+                sides[pins[i][0] > center].append(i)
+        for k, i in enumerate(sides[0]):
+            columns[i] = left - GRID * (k + 1)
+        for k, i in enumerate(sides[1]):
+            columns[i] = right + GRID * (k + 1)
+        _escapes[symbol] = (columns, min(columns + [left]), max(columns + [right]))
+    return _escapes[symbol]
+
+
+def _placement_order(parts):
+    """
+    Order parts by a breadth-first walk over shared nets, sources first
+
+    Ground is not followed, as it would make every part a neighbour. Each
+    net is expanded once, so the walk is linear in the number of pins.
+    """
+    by_net = {}
+    for index, part in enumerate(parts):
+        for net in part.nets:
+            if net != GROUND:
+                by_net.setdefault(net, []).append(index)
+    seen = [False] * len(parts)
+    expanded = set()
+    order = []
+    sources = [i for i, part in enumerate(parts) if part.symbol in ('voltage', 'current')]
+    for start in sources + list(range(len(parts))):
+        if seen[start]:
+            continue
+        seen[start] = True
+        queue = deque([start])
+        while queue:
+            index = queue.popleft()
+            order.append(parts[index])
+            for net in parts[index].nets:
+                if net == GROUND or net in expanded:
+                    continue
+                expanded.add(net)
+                for neighbour in by_net[net]:
+                    if not seen[neighbour]:
+                        seen[neighbour] = True
+                        queue.append(neighbour)
+    return order
+
+
+def _pack(intervals):
+    """
+    Left-edge packing: assign intervals to as few tracks as their overlap needs
+
+    Intervals on one track stay at least a grid step apart, so their wires
+    never touch.
+
+    Args:
+        intervals (list): (start, end, key) tuples
+
+    Returns:
+        tuple: (key -> track index, number of tracks)
+    """
+    busy = []
+    free = []
+    assigned = {}
+    count = 0
+    for start, end, key in sorted(intervals, key=lambda interval: interval[:2]):
+        while busy and busy[0][0] + GRID <= start:
+            heapq.heappush(free, heapq.heappop(busy)[1])
+        if free:
+            track = heapq.heappop(free)
+        else:
+            track = count
+            count += 1
+        assigned[key] = track
+        heapq.heappush(busy, (end, track))
+    return assigned, count
+
+
+def layout_schematic(parts, directives=(), row_size=None):
+    """
+    Place and route a netlist as an LTspice schematic
+
+    Args:
+        parts (list): Part instances or (name, symbol, nets[, value[, value2]]) tuples
+        directives (iterable): SPICE directives to add as TEXT lines, e.g. '.tran 1m'
+        row_size (int): Parts per row (default: about sqrt(2n), at least 4)
+
+    Returns:
+        str: LTspice schematic content
+
+    Raises:
+        ValueError: If a part has an unknown symbol or the wrong number of nets
+    """
+    parts = [part if isinstance(part, Part) else Part(*part) for part in parts]
+    order = _placement_order(parts)
+    row_size = row_size or max(4, math.ceil(math.sqrt(2 * len(parts))))
+    rows = [order[i:i + row_size] for i in range(0, len(order), row_size)]
+
+    # Horizontal placement: each part gets a slot wide enough for its body,
+    # escape columns and labels
+    placed = []
+    pin_count = {}
+    for part in parts:
+        for net in part.nets:
+            pin_count[net] = pin_count.get(net, 0) + 1
+    net_rows = {}
+    width = 0
+    for row_index, row in enumerate(rows):
+        x = 0
+        for part in row:
+            columns, leftmost, rightmost = _escape_columns(part.symbol)
+            label_x = rightmost + 8
+            label = LABEL_CHAR * max(len(part.name), len(part.value or ''))
+            origin_x = x - leftmost
+            placed.append((part, row_index, origin_x, label_x, columns))
+            for net in part.nets:
+                if pin_count[net] > 1:
+                    net_rows.setdefault(net, set()).add(row_index)
+            span = rightmost - leftmost + 8 + label + SLOT_GAP
+            x += -(-span // GRID) * GRID
+        width = max(width, x)
+
+    multi_row = {net for net, found in net_rows.items() if len(found) > 1}
+
+    # Columns of each net per row; multi-row nets run left to their trunk
+    row_columns = [{} for _ in rows]
+    for part, row_index, origin_x, _, columns in placed:
+        for net, column in zip(part.nets, columns):
+            if pin_count[net] > 1:
+                row_columns[row_index].setdefault(net, []).append(origin_x + column)
+    trunk_edge = -GRID * 2
+    row_tracks = []
+    for columns in row_columns:
+        intervals = [(trunk_edge if net in multi_row else min(xs), max(xs), net) for net, xs in columns.items()]
+        row_tracks.append(_pack(intervals))
+
+    # Vertical placement: channel, then row, top to bottom
+    row_top = []
+    track_y = []
+    y = 0
+    for (assigned, count), row in zip(row_tracks, rows):
+        track_y.append({net: y + GRID * track for net, track in assigned.items()})
+        top = y + GRID * max(count - 1, 0) + CHANNEL_GAP
+        row_top.append(top)
+        height = max(SYMBOL_BODIES[part.symbol][3] - SYMBOL_BODIES[part.symbol][1] for part in row)
+        y = top + height + ROW_GAP
+
+    # Trunks of the multi-row nets, packed into columns left of the rows
+    spans = {}
+    for tracks in track_y:
+        for net, ty in tracks.items():
+            if net in multi_row:
+                low, high = spans.get(net, (ty, ty))
+                spans[net] = (min(low, ty), max(high, ty))
+    trunk_columns, trunk_count = _pack([(low, high, net) for net, (low, high) in spans.items()])
+    trunk_x = {net: trunk_edge - GRID * column for net, column in trunk_columns.items()}
+
+    wires = []
+    symbols = []
+    labels = {}
+    for part, row_index, origin_x, label_x, columns in placed:
+        left, top, _, _ = SYMBOL_BODIES[part.symbol]
+        origin_y = row_top[row_index] - top
+        for net, (px, py), column in zip(part.nets, SYMBOL_PINS[part.symbol], columns):
+            pin = (origin_x + px, origin_y + py)
+            if pin_count[net] == 1:
+                labels.setdefault(net, pin)
+                continue
+            column_x = origin_x + column
+            if column_x != pin[0]:
+                wires.append((pin[0], pin[1], column_x, pin[1]))
+            wires.append((column_x, pin[1], column_x, track_y[row_index][net]))
+        symbols.append(_symbol_lines(part, origin_x, origin_y, label_x, top))
+
+    for row_index, columns in enumerate(row_columns):
+        for net, xs in columns.items():
+            ty = track_y[row_index][net]
+            start = trunk_x[net] if net in multi_row else min(xs)
+            if start < max(xs):
+                wires.append((start, ty, max(xs), ty))
+            labels.setdefault(net, (start, ty))
+    for net, (low, high) in spans.items():
+        wires.append((trunk_x[net], low, trunk_x[net], high))
+
+    flags = [(point, net) for net, point in labels.items() if net == GROUND or not _AUTO_NET_RE.match(net)]
+    text_y = y + GRID
+    left_edge = trunk_edge - GRID * trunk_count
+    lines = [
+        "Version 4",
+        f"SHEET 1 {max(width - left_edge, 880)} {max(text_y + 24 * len(directives) + 32, 680)}",
+    ]
+    lines += [f"WIRE {x1} {y1} {x2} {y2}" for x1, y1, x2, y2 in wires]
+    lines += [f"FLAG {x} {fy} {net}" for (x, fy), net in flags]
+    for block in symbols:
+        lines += block
+    lines += [f"TEXT {left_edge} {text_y + 24 * i} Left 2 !{directive}" for i, directive in enumerate(directives)]
+    return '\n'.join(lines) + '\n'
+
+
+def _symbol_lines(part, x, y, label_x, top):
+    """SYMBOL block of a placed part, with its labels right of its escape columns"""
+    lines = [f"SYMBOL {SYMBOL_PATHS.get(part.symbol, part.symbol)} {x} {y} R0",
+             f"WINDOW 0 {label_x} {top + 16} Left 2"]
+    if part.value is not None:
+        lines.append(f"WINDOW 3 {label_x} {top + 48} Left 2")
+    lines.append(f"SYMATTR InstName {part.name}")
+    if part.value is not None:
+        lines.append(f"SYMATTR Value {part.value}")
+    if part.value2:
+        lines.append(f"SYMATTR Value2 {part.value2}")
+    return lines
+
+
+def wire_overlaps(schematic):
+    """
+    Find wires that overlap another wire along its length
+
+    Horizontal wires are grouped by row and vertical ones by column, then
+    each group is swept in order of start, so the check is O(n log n).
+
+    Args:
+        schematic (str): .asc content
+
+    Returns:
+        list: Pairs of overlapping (x1, y1, x2, y2) wires
+    """
+    groups = {}
+    for line in schematic.splitlines():
+        if not line.startswith('WIRE '):
+            continue
+        x1, y1, x2, y2 = map(int, line.split()[1:5])
+        if y1 == y2:
+            groups.setdefault(('y', y1), []).append((min(x1, x2), max(x1, x2), (x1, y1, x2, y2)))
+        elif x1 == x2:
+            groups.setdefault(('x', x1), []).append((min(y1, y2), max(y1, y2), (x1, y1, x2, y2)))
+    overlaps = []
+    for segments in groups.values():
+        segments.sort()
+        reach, widest = None, None
+        for start, end, wire in segments:
+            if reach is not None and start < reach:
+                overlaps.append((widest, wire))
+            if reach is None or end > reach:
+                reach, widest = end, wire
+    return overlaps
+
+
+# Models of the semiconductors the topologies use, written into the netlist
+# so that simulators without LTspice's bundled libraries can run them
+DEVICE_MODELS = {
+    '2N3904': ('.model 2N3904 NPN(IS=6.734f XTI=3 EG=1.11 VAF=74.03 BF=416.4 NE=1.259 ISE=6.734f '
+               'IKF=66.78m XTB=1.5 BR=.7371 NC=2 ISC=0 IKR=0 RC=1 CJC=3.638p MJC=.3085 VJC=.75 FC=.5 '
+               'CJE=4.493p MJE=.2593 VJE=.75 TR=239.5n TF=301.2p ITF=.4 VTF=4 XTF=2 RB=10)'),
+    '1N4148': '.model 1N4148 D(IS=2.52n RS=.568 N=1.752 CJO=4p M=.4 TT=20n BV=100 IBV=100u)',
+    '1N5819': '.model 1N5819 D(IS=31.7u RS=.051 N=1.373 CJO=110p M=.35 EG=.69 XTI=2 BV=40 IBV=1m)',
+}
+
+# Topologies without a reference schematic, built as netlists and laid out.
+# Values not given in the components dict fall back to these defaults.
+COMPLEX_DEFAULTS = {
+    'common_emitter': {'V': 12, 'Vin': 0.01, 'freq': 1000, 'R1': 47000, 'R2': 10000,
+                       'RC': 4700, 'RE': 1000, 'RL': 100000, 'C1': 10e-6, 'C2': 10e-6, 'CE': 100e-6},
+    'boost_converter': {'V': 5, 'L': 10e-6, 'C': 100e-6, 'R': 100, 'freq': 100000, 'duty': 0.5},
+    'astable_multivibrator': {'V': 9, 'RC': 1000, 'RB': 47000, 'C': 10e-6},
+    'wien_oscillator': {'R': 10000, 'C': 16e-9, 'Rf': 21000, 'Rg': 10000},
+    'full_bridge_rectifier': {'V': 10, 'freq': 50, 'C': 470e-6, 'R': 1000},
+}
+
+
+def _seconds(value):
+    """Format a time for a directive with three significant digits"""
+    return format_value(float('%.3g' % value))
+
+
+def _common_emitter(v):
+    parts = [
+        ('V1', 'voltage', ('vcc', GROUND), v['V']),
+        ('V2', 'voltage', ('in', GROUND), f"SINE(0 {format_value(v['Vin'])} {format_value(v['freq'])})", 'AC 1'),
+        ('C1', 'cap', ('in', 'base'), v['C1']),
+        ('R1', 'res', ('vcc', 'base'), v['R1']),
+        ('R2', 'res', ('base', GROUND), v['R2']),
+        ('RC', 'res', ('vcc', 'collector'), v['RC']),
+        ('Q1', 'npn', ('collector', 'base', 'emitter'), '2N3904'),
+        ('RE', 'res', ('emitter', GROUND), v['RE']),
+        ('CE', 'cap', ('emitter', GROUND), v['CE']),
+        ('C2', 'cap', ('collector', 'out'), v['C2']),
+        ('RL', 'res', ('out', GROUND), v['RL']),
+    ]
+    freq = float(v['freq'])
+    return parts, [f".tran 0 {_seconds(5 / freq)} 0 {_seconds(1 / (200 * freq))}"]
+
+
+def _boost_converter(v):
+    freq = float(v['freq'])
+    pulse = f"PULSE(0 10 0 10n 10n {_seconds(float(v['duty']) / freq)} {_seconds(1 / freq)})"
+    parts = [
+        ('V1', 'voltage', ('in', GROUND), v['V']),
+        ('L1', 'ind', ('in', 'sw'), v['L']),
+        ('M1', 'nmos', ('sw', 'gate', GROUND), 'SW'),
+        ('V2', 'voltage', ('gate', GROUND), pulse),
+        ('D1', 'diode', ('sw', 'out'), '1N5819'),
+        ('C1', 'cap', ('out', GROUND), v['C']),
+        ('R1', 'res', ('out', GROUND), v['R']),
+    ]
+    return parts, ['.model SW NMOS(Vto=2 Kp=20)', f".tran 0 {_seconds(200 / freq)} 0 {_seconds(1 / (100 * freq))}"]
+
+
+def _astable_multivibrator(v):
+    parts = [
+        ('V1', 'voltage', ('vcc', GROUND), v['V']),
+        ('RC1', 'res', ('vcc', 'c1'), v['RC']),
+        ('RB1', 'res', ('vcc', 'b1'), v['RB']),
+        ('C1', 'cap', ('c1', 'b2'), v['C']),
+        ('Q1', 'npn', ('c1', 'b1', GROUND), '2N3904'),
+        ('RB2', 'res', ('vcc', 'b2'), v['RB']),
+        ('C2', 'cap', ('c2', 'b1'), v['C']),
+        ('RC2', 'res', ('vcc', 'c2'), v['RC']),
+        ('Q2', 'npn', ('c2', 'b2', GROUND), '2N3904'),
+    ]
+    # Each half period lasts about ln(2) * RB * C
+    period = 2 * math.log(2) * float(v['RB']) * float(v['C'])
+    return parts, [f".tran {_seconds(5 * period)}"]
+
+
+def _wien_oscillator(v):
+    parts = [
+        ('U1', 'opamp', ('p', 'n', 'out')),
+        ('R1', 'res', ('out', 'a'), v['R']),
+        ('C1', 'cap', ('a', 'p'), v['C']),
+        ('R2', 'res', ('p', GROUND), v['R']),
+        ('C2', 'cap', ('p', GROUND), v['C']),
+        ('Rf', 'res', ('out', 'n'), v['Rf']),
+        ('Rg', 'res', ('n', GROUND), v['Rg']),
+    ]
+    f0 = 1 / (2 * math.pi * float(v['R']) * float(v['C']))
+    # The op-amp comes from LTspice's opamp.sub; Netlist.to_spice swaps in a
+    # macro model for ngspice. The initial condition starts the oscillation.
+    return parts, ['.lib opamp.sub', '.ic V(p)=10m', f".tran 0 {_seconds(20 / f0)} 0 {_seconds(1 / (200 * f0))}"]
+
+
+def _full_bridge_rectifier(v):
+    parts = [
+        ('V1', 'voltage', ('ac1', 'ac2'), f"SINE(0 {format_value(v['V'])} {format_value(v['freq'])})"),
+        ('D1', 'diode', ('ac1', 'out'), '1N4148'),
+        ('D2', 'diode', ('ac2', 'out'), '1N4148'),
+        ('D3', 'diode', (GROUND, 'ac1'), '1N4148'),
+        ('D4', 'diode', (GROUND, 'ac2'), '1N4148'),
+        ('C1', 'cap', ('out', GROUND), v['C']),
+        ('R1', 'res', ('out', GROUND), v['R']),
+    ]
+    freq = float(v['freq'])
+    return parts, [f".tran 0 {_seconds(5 / freq)} 0 {_seconds(1 / (500 * freq))}"]
+
+
+COMPLEX_BUILDERS = {
+    'common_emitter': _common_emitter,
+    'boost_converter': _boost_converter,
+    'astable_multivibrator': _astable_multivibrator,
+    'wien_oscillator': _wien_oscillator,
+    'full_bridge_rectifier': _full_bridge_rectifier,
+}
+
+
+def complex_circuit_schematic(topology, components):
+    """
+    Build, place and route one of the COMPLEX_BUILDERS topologies
+
+    Args:
+        topology (str): Topology name
+        components (dict): Values overriding COMPLEX_DEFAULTS[topology]
+
+    Returns:
+        str: LTspice schematic content
+
+    Raises:
+        ValueError: If the topology is not one of COMPLEX_BUILDERS
+    """
+    if topology not in COMPLEX_BUILDERS:
+        raise ValueError(f"No netlist for topology '{topology}'")
+    values = dict(COMPLEX_DEFAULTS[topology])
+    values.update({key: value for key, value in components.items() if key in values and value is not None})
+    parts, directives = COMPLEX_BUILDERS[topology](values)
+    models = sorted({part[3] for part in parts if len(part) > 3 and part[3] in DEVICE_MODELS})
+    return layout_schematic(parts, [DEVICE_MODELS[model] for model in models] + directives)
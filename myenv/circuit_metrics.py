@@ -0,0 +1,305 @@
+"""
+Per-stage latency spans, counters and an optional metrics endpoint
+
+Pipeline stages (decode, stt, parse, render, write, launch) are timed with
+`metrics.span(stage)`. Each stage keeps a rolling window of recent samples for
+percentiles and cumulative histogram buckets for Prometheus. Notable events
+(cache hits, Gemini calls, fallbacks to the default circuit) are counted with
+`metrics.increment(name)`.
+
+`start_metrics_server()` serves the numbers as Prometheus text on /metrics
+and as JSON on /metrics.json. `profile_request()` captures a cProfile dump
+for requests slower than PROFILE_SLOW_MS.
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Samples kept per stage for the rolling percentiles
+METRICS_WINDOW = int(os.getenv('METRICS_WINDOW', '1024'))
+
+# Port for the /metrics endpoint started by the UI; 0 disables it
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))
+
+# Requests slower than this are profiled with cProfile; 0 disables profiling
+PROFILE_SLOW_MS = float(os.getenv('PROFILE_SLOW_MS', '0'))
+PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join(
+    os.getenv('CIRCUIT_DIR', os.path.join(os.path.expanduser('~'), 'ltspice_circuits')), 'profiles'))
+
+# Histogram bucket upper bounds in seconds, as in the Prometheus client defaults
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+PERCENTILES = (50, 95, 99)
+
+
+class Metrics:
+    """
+    Thread-safe registry of stage timings and event counters
+
+    Args:
+        window (int): Recent samples kept per stage for percentiles
+    """
+
+    def __init__(self, window=METRICS_WINDOW):
+        self.window = window
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._recent = {}
+        self._buckets = {}
+        self._totals = {}
+        self._errors = {}
+        self._counters = {}
+        self._collectors = {}
+        self.slow_requests = deque(maxlen=20)
+
+    def observe(self, stage, seconds, error=False):
+        """
+        Record one timing sample for a stage
+
+        Args:
+            stage (str): Stage name
+            seconds (float): Duration
+            error (bool): The stage raised
+        """
+        with self._lock:
+            if stage not in self._recent:
+                self._recent[stage] = deque(maxlen=self.window)
+                self._buckets[stage] = [0] * len(LATENCY_BUCKETS)
+                self._totals[stage] = [0, 0.0]
+                self._errors[stage] = 0
+            self._recent[stage].append(seconds)
+            buckets = self._buckets[stage]
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    buckets[i] += 1
+            self._totals[stage][0] += 1
+            self._totals[stage][1] += seconds
+            if error:
+                self._errors[stage] += 1
+
+    @contextmanager
+    def span(self, stage):
+        """
+        Time the enclosed block as one sample of `stage`
+
+        Exceptions propagate and are counted as stage errors.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.observe(stage, time.perf_counter() - start, error=True)
+            raise
+        self.observe(stage, time.perf_counter() - start)
+
+    def increment(self, name, amount=1):
+        """Add to an event counter"""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def register_collector(self, name, collect):
+        """
+        Include another component's counters in every snapshot
+
+        Args:
+            name (str): Section name, e.g. 'parse_cache'
+            collect (callable): Returns a dict of numbers
+        """
+        self._collectors[name] = collect
+
+    def reset(self):
+        """Drop all samples and counters"""
+        with self._lock:
+            for registry in (self._recent, self._buckets, self._totals, self._errors, self._counters):
+                registry.clear()
+            self.slow_requests.clear()
+            self.started = time.time()
+
+    def snapshot(self):
+        """
+        Current metrics as plain data
+
+        Returns:
+            dict: stages (count, errors, mean and rolling percentiles in ms,
+                buckets), counters, collector sections and slow requests
+        """
+        with self._lock:
+            stages = {}
+            for stage, recent in self._recent.items():
+                ordered = sorted(recent)
+                count, total = self._totals[stage]
+                summary = {
+                    'count': count,
+                    'errors': self._errors[stage],
+                    'mean_ms': total / count * 1000 if count else 0.0,
+                    'buckets': dict(zip(LATENCY_BUCKETS, self._buckets[stage])),
+                    'sum_s': total,
+                }
+                for p in PERCENTILES:
+                    index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+                    summary[f'p{p}_ms'] = ordered[index] * 1000 if ordered else 0.0
+                stages[stage] = summary
+            result = {
+                'uptime_s': time.time() - self.started,
+                'stages': stages,
+                'counters': dict(self._counters),
+                'slow_requests': list(self.slow_requests),
+            }
+        for name, collect in self._collectors.items():
+            try:
+                result[name] = collect()
+            except Exception as e:
+                result[name] = {'error': str(e)}
+        return result
+
+    def to_json(self):
+        """Snapshot serialized as JSON"""
+        return json.dumps(self.snapshot(), indent=2, default=str)
+
+    def to_prometheus(self):
+        """
+        Snapshot in the Prometheus text exposition format
+
+        Returns:
+            str: Histogram, rolling-quantile, error and counter families
+        """
+        snapshot = self.snapshot()
+        lines = [
+            '# HELP circuit_stage_seconds Pipeline stage latency',
+            '# TYPE circuit_stage_seconds histogram',
+        ]
+        for stage, summary in snapshot['stages'].items():
+            for bound, count in summary['buckets'].items():
+                lines.append(f'circuit_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {count}')
+            lines.append(f'circuit_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {summary["count"]}')
+            lines.append(f'circuit_stage_seconds_sum{{stage="{stage}"}} {summary["sum_s"]:.6f}')
+            lines.append(f'circuit_stage_seconds_count{{stage="{stage}"}} {summary["count"]}')
+
+        lines += ['# HELP circuit_stage_recent_seconds Percentiles over the last '
+                  f'{self.window} samples per stage',
+                  '# TYPE circuit_stage_recent_seconds gauge']
+        for stage, summary in snapshot['stages'].items():
+            for p in PERCENTILES:
+                lines.append(f'circuit_stage_recent_seconds{{stage="{stage}",quantile="{p / 100}"}} '
+                             f'{summary[f"p{p}_ms"] / 1000:.6f}')
+
+        lines += ['# HELP circuit_stage_errors_total Stage executions that raised',
+                  '# TYPE circuit_stage_errors_total counter']
+        for stage, summary in snapshot['stages'].items():
+            lines.append(f'circuit_stage_errors_total{{stage="{stage}"}} {summary["errors"]}')
+
+        lines += ['# HELP circuit_events_total Pipeline events such as cache hits and fallbacks',
+                  '# TYPE circuit_events_total counter']
+        for name, value in sorted(snapshot['counters'].items()):
+            lines.append(f'circuit_events_total{{event="{name}"}} {value}')
+
+        for name in self._collectors:
+            values = {key: value for key, value in snapshot.get(name, {}).items()
+                      if isinstance(value, (int, float)) and not isinstance(value, bool)}
+            if values:
+                lines.append(f'# TYPE circuit_{name} gauge')
+                lines += [f'circuit_{name}{{field="{key}"}} {value}' for key, value in sorted(values.items())]
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+
+
+@contextmanager
+def profile_request(name, threshold_ms=None):
+    """
+    Profile the enclosed request and keep the profile if it was slow
+
+    Does nothing unless PROFILE_SLOW_MS (or `threshold_ms`) is positive. A
+    slow request's cProfile stats are written to PROFILE_DIR and listed in
+    the metrics snapshot together with the top functions by cumulative time.
+
+    Args:
+        name (str): Request kind, used in the file name
+        threshold_ms (float): Override for PROFILE_SLOW_MS
+    """
+    threshold_ms = PROFILE_SLOW_MS if threshold_ms is None else threshold_ms
+    if threshold_ms <= 0:
+        yield
+        return
+
+    import cProfile
+
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Another request on this interpreter is already being profiled
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if elapsed_ms >= threshold_ms:
+            _save_profile(profiler, name, elapsed_ms)
+
+
+def _save_profile(profiler, name, elapsed_ms):
+    """Dump a slow request's profile and record it in the metrics"""
+    import io
+    import pstats
+
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, f"{name}_{time.strftime('%Y%m%d_%H%M%S')}_{int(elapsed_ms)}ms.prof")
+    profiler.dump_stats(path)
+    text = io.StringIO()
+    pstats.Stats(profiler, stream=text).sort_stats('cumulative').print_stats(15)
+    metrics.increment('slow_requests')
+    metrics.slow_requests.append({'request': name, 'ms': elapsed_ms, 'path': path, 'top': text.getvalue()})
+    print(f"Slow {name} request ({elapsed_ms:.0f} ms), profile saved to {path}")
+
+
+def start_metrics_server(port=None, host='127.0.0.1'):
+    """
+    Serve the metrics endpoint from a background thread
+
+    Args:
+        port (int): Port to listen on (defaults to METRICS_PORT; 0 picks a free port)
+        host (str): Interface to bind
+
+    Returns:
+        ThreadingHTTPServer: The running server; call shutdown() to stop it
+    """
+    # Imported here: http.server pulls in the email package, which costs
+    # more at startup than the rest of this module
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        """Serve /metrics (Prometheus text) and /metrics.json"""
+
+        def do_GET(self):
+            path = self.path.split('?', 1)[0]
+            if path == '/metrics':
+                body, content_type = metrics.to_prometheus(), 'text/plain; version=0.0.4'
+            elif path == '/metrics.json':
+                body, content_type = metrics.to_json(), 'application/json'
+            else:
+                self.send_error(404)
+                return
+            payload = body.encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            # Scrapes every few seconds would flood the console
+            pass
+
+    server = ThreadingHTTPServer((host, METRICS_PORT if port is None else port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True).start()
+    print(f"Metrics at http://{host}:{server.server_address[1]}/metrics")
+    return server
@@ -0,0 +1,303 @@
+"""
+Analytic frequency and transient preview for the built-in topologies
+
+Each topology is described by a small state-space model (one state per
+capacitor voltage) and solved in modal form, so both the .ac sweep and the
+.tran response are closed-form NumPy expressions evaluated for every
+frequency, time point and parameter set at once. No simulator is needed,
+and thousands of parameter sets can be swept in one call.
+
+The analyses follow the TEXT directives of each topology's reference
+schematic; where a schematic has none, DEFAULT_AC and DEFAULT_TRAN are used.
+"""
+import numpy as np
+
+from circuit_core import get_topology_templates, parse_spice_value
+
+DEFAULT_AC = '.ac dec 100 1 100k'
+DEFAULT_TRAN = '.tran 0 0.1 0 0.0001'
+
+# Upper bound on transient samples, regardless of the directive's step
+MAX_TRAN_POINTS = 20001
+
+# Transient samples per source period; coarser sampling aliases the sine
+TRAN_POINTS_PER_PERIOD = 20
+
+
+def _lowpass(p):
+    """RC low-pass: output across C, fed through R"""
+    k = 1 / (p['R'] * p['C'])
+    return k[:, None, None] * -1.0, k[:, None], np.array([1.0]), 0.0
+
+
+def _highpass(p):
+    """RC high-pass: state is the series capacitor voltage, output across R"""
+    k = 1 / (p['R'] * p['C'])
+    return k[:, None, None] * -1.0, k[:, None], np.array([-1.0]), 1.0
+
+
+def _bandpass(p):
+    """C2/R2 high-pass section loaded by the R1/C1 low-pass section"""
+    g1, g2 = 1 / p['R1'], 1 / p['R2']
+    c1, c2 = p['C1'], p['C2']
+    a = np.empty(g1.shape + (2, 2))
+    a[:, 0, 0] = -(g1 + g2) / c2
+    a[:, 0, 1] = -g1 / c2
+    a[:, 1, 0] = -g1 / c1
+    a[:, 1, 1] = -g1 / c1
+    b = np.stack([(g1 + g2) / c2, g1 / c1], axis=-1)
+    return a, b, np.array([0.0, 1.0]), 0.0
+
+
+# Topology -> (parameter keys, model). A model maps parameter arrays of shape
+# (P,) to A (P, n, n), B (P, n), C (n,) and D for x' = Ax + Bu, y = Cx + Du.
+STATE_SPACE_MODELS = {
+    'low_pass_filter': (('R', 'C'), _lowpass),
+    'high_pass_filter': (('R', 'C'), _highpass),
+    'band_pass_filter': (('R1', 'R2', 'C1', 'C2'), _bandpass),
+    # Draft1.asc is a series RC across the source; preview the capacitor voltage
+    'basic_circuit': (('R', 'C'), _lowpass),
+}
+
+
+def _numeric(value):
+    """Accept numbers or LTspice value strings such as '4.7k'"""
+    return float(parse_spice_value(value) if isinstance(value, str) else value)
+
+
+def _modal(topology, params):
+    """
+    Diagonalize the state-space model for every parameter set
+
+    Returns:
+        tuple: eigenvalues (P, n), input residues b (P, n), output residues c (P, n), D
+    """
+    keys, model = STATE_SPACE_MODELS[topology]
+    arrays = {key: np.atleast_1d(np.asarray(params[key], dtype=float)) for key in keys}
+    arrays = dict(zip(keys, np.broadcast_arrays(*arrays.values())))
+    a, b, c, d = model(arrays)
+    eigenvalues, vectors = np.linalg.eig(a)
+    b_modal = np.linalg.solve(vectors, b[..., None])[..., 0]
+    c_modal = np.einsum('j,pjk->pk', c, vectors)
+    return eigenvalues, b_modal, c_modal, d
+
+
+def parameters(components):
+    """
+    Resolve the model parameters for a components dict, applying template defaults
+
+    Args:
+        components (dict): Parsed components (see generate_circuit_schematic)
+
+    Returns:
+        dict: Parameter name -> float, plus 'V', 'freq' and 'V_type'
+    """
+    topology = components.get('topology', 'basic_circuit')
+    if topology not in STATE_SPACE_MODELS:
+        raise ValueError(f"No analytic model for topology '{topology}'")
+    template = get_topology_templates()[topology]
+    defaults = {key: default for key, default in template.slots.values()}
+    keys, _ = STATE_SPACE_MODELS[topology]
+    params = {key: _numeric(components.get(key, defaults.get(key, 1))) for key in keys}
+    params['V'] = _numeric(components.get('V', template.source_defaults.get('V', 1)))
+    params['freq'] = _numeric(components.get('freq', template.source_defaults.get('freq', 25000)))
+    params['V_type'] = components.get('V_type', 'SINE') if template.source_kind == 'SINE' else 'DC'
+    return params
+
+
+def analysis_directives(topology):
+    """
+    Return the .ac and .tran directives the topology's schematic requests
+
+    Returns:
+        tuple: (ac directive, tran directive)
+    """
+    directives = get_topology_templates()[topology].directives
+    ac = next((d for d in directives if d.lower().startswith('.ac ')), DEFAULT_AC)
+    tran = next((d for d in directives if d.lower().startswith('.tran ')), DEFAULT_TRAN)
+    return ac, tran
+
+
+def ac_frequencies(directive):
+    """
+    Frequencies of an LTspice '.ac dec|oct|lin N fstart fstop' sweep
+
+    Returns:
+        np.ndarray: Frequencies in Hz
+    """
+    parts = directive.split()
+    kind, points = parts[1].lower(), int(_numeric(parts[2]))
+    start, stop = _numeric(parts[3]), _numeric(parts[4])
+    if kind == 'lin':
+        return np.linspace(start, stop, points)
+    per_octave = kind == 'oct'
+    span = np.log2(stop / start) if per_octave else np.log10(stop / start)
+    count = int(np.floor(span * points + 1e-9)) + 1
+    return start * (2.0 if per_octave else 10.0) ** (np.arange(count) / points)
+
+
+def tran_times(directive, freq=None):
+    """
+    Sample times for an LTspice '.tran [Tprint] Tstop [Tstart [Tmaxstep]]' directive
+
+    With a source frequency the step is at most 1/TRAN_POINTS_PER_PERIOD of
+    its period. Past MAX_TRAN_POINTS the step is coarsened, unless that would
+    undersample the source; then the window is shortened instead.
+
+    Args:
+        directive (str): .tran directive
+        freq (float): Frequency of a periodic source in Hz, if any
+
+    Returns:
+        np.ndarray: Times in seconds
+    """
+    args = [_numeric(arg) for arg in directive.split()[1:] if not arg.lower().startswith(('uic', 'startup'))]
+    if len(args) == 1:
+        args = [0.0] + args
+    tprint, tstop = args[0], args[1]
+    tstart = args[2] if len(args) > 2 else 0.0
+    step = args[3] if len(args) > 3 and args[3] > 0 else (tprint if tprint > 0 else (tstop - tstart) / 1000)
+    finest = 1 / (TRAN_POINTS_PER_PERIOD * freq) if freq else None
+    if finest:
+        step = min(step, finest)
+    if (tstop - tstart) / step + 1 > MAX_TRAN_POINTS:
+        coarse = (tstop - tstart) / (MAX_TRAN_POINTS - 1)
+        if finest and coarse > finest:
+            tstop = tstart + (MAX_TRAN_POINTS - 1) * step
+        else:
+            step = coarse
+    points = min(MAX_TRAN_POINTS, int(round((tstop - tstart) / step)) + 1)
+    return np.linspace(tstart, tstop, points)
+
+
+def sweep_frequency_response(topology, params, freqs):
+    """
+    Complex transfer function for many parameter sets at once
+
+    Args:
+        topology (str): One of STATE_SPACE_MODELS
+        params (dict): Parameter name -> scalar or array of shape (P,)
+        freqs (array): Frequencies in Hz, shape (F,)
+
+    Returns:
+        np.ndarray: H(j2πf) with shape (P, F)
+    """
+    eigenvalues, b, c, d = _modal(topology, params)
+    s = 2j * np.pi * np.asarray(freqs, dtype=float)
+    residues = (b * c)[:, None, :]
+    return (residues / (s[None, :, None] - eigenvalues[:, None, :])).sum(axis=-1) + d
+
+
+def sweep_transient_response(topology, params, times, amplitude, freq, offset=1.0, sine=True):
+    """
+    Output voltage over time for many parameter sets at once
+
+    A SINE(offset amplitude freq) source starts from its DC operating point,
+    as in LTspice. A DC source is applied as a step of `amplitude` at t=0 so
+    the preview shows the charging curve.
+
+    Args:
+        topology (str): One of STATE_SPACE_MODELS
+        params (dict): Parameter name -> scalar or array of shape (P,)
+        times (array): Sample times in seconds, shape (T,)
+        amplitude (float): Sine amplitude, or DC step voltage
+        freq (float): Sine frequency in Hz
+        offset (float): Sine DC offset
+        sine (bool): SINE source if True, DC step otherwise
+
+    Returns:
+        tuple: (input voltage (T,), output voltage (P, T))
+    """
+    eigenvalues, b, c, d = _modal(topology, params)
+    t = np.asarray(times, dtype=float)[None, :, None]
+    lam = eigenvalues[:, None, :]
+    decay = np.exp(lam * t)
+
+    if sine:
+        w = 2 * np.pi * freq
+        # The offset is in steady state from t=0; only the sine excites transients
+        u = offset + amplitude * np.sin(w * t[0, :, 0])
+        forced = ((np.exp(1j * w * t) - decay) / (1j * w - lam)
+                  - (np.exp(-1j * w * t) - decay) / (-1j * w - lam)) / 2j
+        states = b[:, None, :] * (amplitude * forced - offset / lam)
+    else:
+        u = np.full(t.shape[1], float(amplitude))
+        states = b[:, None, :] * amplitude * (decay - 1) / lam
+
+    output = (c[:, None, :] * states).sum(axis=-1).real + d * u[None, :]
+    return u, output
+
+
+def preview(components):
+    """
+    Compute the AC sweep and transient response a circuit's directives request
+
+    Args:
+        components (dict): Parsed components (see generate_circuit_schematic)
+
+    Returns:
+        dict: freqs, magnitude_db, phase_deg, times, vin, vout arrays plus the directives used
+    """
+    topology = components.get('topology', 'basic_circuit')
+    params = parameters(components)
+    ac, tran = analysis_directives(topology)
+
+    freqs = ac_frequencies(ac)
+    response = sweep_frequency_response(topology, params, freqs)[0]
+    sine = params['V_type'] == 'SINE'
+    times = tran_times(tran, params['freq'] if sine else None)
+    vin, vout = sweep_transient_response(
+        topology, params, times, params['V'], params['freq'], sine=sine
+    )
+    return {
+        'topology': topology,
+        'ac': ac,
+        'tran': tran,
+        'freqs': freqs,
+        'magnitude_db': 20 * np.log10(np.maximum(np.abs(response), 1e-300)),
+        'phase_deg': np.degrees(np.angle(response)),
+        'times': times,
+        'vin': vin,
+        'vout': vout[0],
+    }
+
+
+def preview_figure(components):
+    """
+    Plot the Bode magnitude/phase and transient response of a circuit
+
+    Args:
+        components (dict): Parsed components
+
+    Returns:
+        matplotlib.figure.Figure: Figure for gr.Plot, or None if the topology has no model
+    """
+    if components.get('topology', 'basic_circuit') not in STATE_SPACE_MODELS:
+        return None
+    import matplotlib
+    matplotlib.use('Agg')
+    from matplotlib.figure import Figure
+
+    result = preview(components)
+    figure = Figure(figsize=(8, 6), tight_layout=True)
+    magnitude, phase, transient = figure.subplots(3, 1)
+
+    magnitude.semilogx(result['freqs'], result['magnitude_db'])
+    magnitude.set_ylabel('Magnitude (dB)')
+    magnitude.set_title(f"{result['topology']}: {result['ac']}")
+    magnitude.grid(True, which='both', alpha=0.3)
+
+    phase.semilogx(result['freqs'], result['phase_deg'], color='tab:orange')
+    phase.set_xlabel('Frequency (Hz)')
+    phase.set_ylabel('Phase (deg)')
+    phase.grid(True, which='both', alpha=0.3)
+
+    transient.plot(result['times'], result['vin'], label='V(in)', alpha=0.6)
+    transient.plot(result['times'], result['vout'], label='V(out)')
+    # The window may be shorter than the directive's to keep a fast source sampled
+    transient.set_title(f"{result['tran']} (shown to {result['times'][-1]:.3g} s)")
+    transient.set_xlabel('Time (s)')
+    transient.set_ylabel('Voltage (V)')
+    transient.legend(loc='upper right')
+    transient.grid(True, alpha=0.3)
+    return figure
@@ -0,0 +1,423 @@
+"""
+Memory-mapped reader for LTspice and ngspice binary .raw waveform files
+
+The header is parsed once; the data section is never read into memory.
+Every trace is a NumPy view over an mmap of the file, so opening a
+multi-GB .tran result costs the same as opening a small one, and only the
+pages a trace actually touches are read from disk.
+
+Supported layouts:
+    real     - transient/DC/operating point; the axis is float64 and the
+               other traces are float32, or float64 with the 'double' flag
+               (ngspice always writes float64)
+    complex  - AC/noise; every value, including the frequency, is complex128
+    fastaccess - LTspice's column-major layout; each trace is contiguous
+               instead of interleaved point by point
+
+decimate() reduces a trace to per-bucket min/max pairs for plotting without
+losing peaks, and results_figure() plots a .raw file the way the preview
+plots the analytic response: Bode magnitude/phase for .ac, traces over time
+for .tran. write_raw() produces files in LTspice's layout.
+"""
+import mmap
+import os
+
+import numpy as np
+
+# Points kept per trace when plotting; traces are min/max decimated above this
+RAW_PLOT_POINTS = int(os.getenv('RAW_PLOT_POINTS', '4000'))
+
+# Samples decimate() reduces at once, bounding the copies NumPy makes of strided traces
+DECIMATE_BAND = 1 << 18
+
+# Header encodings tried in order: LTspice writes UTF-16LE, ngspice ASCII
+_BINARY_MARKERS = (
+    ('utf-16-le', 'Binary:\n'.encode('utf-16-le')),
+    ('utf-16-le', 'Binary:\r\n'.encode('utf-16-le')),
+    ('latin-1', b'Binary:\n'),
+    ('latin-1', b'Binary:\r\n'),
+)
+
+# Width of the 'No. Points:' field written by write_raw, patched once the count is known
+_POINTS_WIDTH = 20
+
+
+class RawFile:
+    """
+    An open .raw file with lazy, zero-copy access to its traces
+
+    Use it as a context manager, or call close(). Views returned by trace()
+    keep the mapping alive; close() releases it once none are left.
+
+    Attributes:
+        path (str): File path
+        title (str): Title line, usually the schematic path
+        plotname (str): e.g. 'Transient Analysis' or 'AC Analysis'
+        flags (set): Lower-case header flags, e.g. {'real', 'forward'}
+        command (str): Simulator that wrote the file
+        variables (list): (name, kind) pairs, the axis first
+        points (int): Samples per trace
+        is_complex (bool): Whether values are complex (AC analysis)
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            header, data_offset = self._read_header()
+            self._parse_header(header)
+            self._traces = self._map_traces(data_offset)
+        except Exception:
+            self._mmap.close()
+            raise
+
+    def _read_header(self):
+        """
+        Find and decode the text header
+
+        Returns:
+            tuple: (header text, offset of the first data byte)
+
+        Raises:
+            ValueError: If the file has no binary data section
+        """
+        # The header is a few hundred bytes per variable; don't scan the data
+        limit = min(len(self._mmap), 1 << 22)
+        found = [(self._mmap.find(marker, 0, limit), encoding, marker) for encoding, marker in _BINARY_MARKERS]
+        found = [entry for entry in found if entry[0] >= 0]
+        if not found:
+            ascii_markers = (b'Values:', 'Values:'.encode('utf-16-le'))
+            if any(self._mmap.find(marker, 0, limit) >= 0 for marker in ascii_markers):
+                raise ValueError(f"{self.path}: ASCII .raw files are not supported; save them as binary")
+            raise ValueError(f"{self.path}: no 'Binary:' section found")
+        # The marker may recur by chance inside the data, so take the earliest
+        position, encoding, marker = min(found)
+        self._utf16 = encoding == 'utf-16-le'
+        return self._mmap[:position].decode(encoding), position + len(marker)
+
+    def _parse_header(self, header):
+        """Read the header fields and variable list"""
+        fields = {}
+        self.variables = []
+        lines = iter(header.replace('\r', '').split('\n'))
+        for line in lines:
+            key, _, value = line.partition(':')
+            if key.strip().lower() == 'variables':
+                break
+            fields[key.strip().lower()] = value.strip()
+        for line in lines:
+            parts = line.split()
+            if len(parts) >= 3 and parts[0].isdigit():
+                self.variables.append((parts[1], parts[2]))
+
+        self.title = fields.get('title', '')
+        self.date = fields.get('date', '')
+        self.plotname = fields.get('plotname', '')
+        self.command = fields.get('command', '')
+        self.flags = set(fields.get('flags', '').lower().split())
+        self.points = int(fields.get('no. points', '0'))
+        count = int(fields.get('no. variables', len(self.variables)))
+        if count != len(self.variables):
+            raise ValueError(f"{self.path}: header lists {len(self.variables)} of {count} variables")
+        self.is_complex = 'complex' in self.flags
+        self._names = {name.lower(): index for index, (name, _) in enumerate(self.variables)}
+
+    def _dtypes(self):
+        """
+        On-disk dtype of every variable
+
+        LTspice stores transient traces as float32 after a float64 axis unless
+        the file has the 'double' flag; ngspice always writes float64.
+        """
+        if self.is_complex:
+            return ['<c16'] * len(self.variables)
+        ltspice = self._utf16 or any(name in self.command.lower() for name in ('ltspice', 'linear technology'))
+        if 'double' in self.flags or not ltspice:
+            return ['<f8'] * len(self.variables)
+        return ['<f8'] + ['<f4'] * (len(self.variables) - 1)
+
+    def _map_traces(self, offset):
+        """
+        Create one view per variable over the mapped data section
+
+        Returns:
+            list: 1-D arrays, one per variable
+        """
+        dtypes = [np.dtype(dtype) for dtype in self._dtypes()]
+        record = sum(dtype.itemsize for dtype in dtypes)
+        if offset + record * self.points > len(self._mmap):
+            # A run that was interrupted; use the points that made it to disk
+            self.points = (len(self._mmap) - offset) // record
+        if 'fastaccess' in self.flags:
+            traces = []
+            for dtype in dtypes:
+                traces.append(np.ndarray((self.points,), dtype, self._mmap, offset))
+                offset += dtype.itemsize * self.points
+            return traces
+        # Point-by-point records; each field of a structured view is a strided view
+        names = [f'v{index}' for index in range(len(dtypes))]
+        records = np.ndarray((self.points,), np.dtype({'names': names, 'formats': dtypes}), self._mmap, offset)
+        return [records[name] for name in names]
+
+    @property
+    def names(self):
+        """Variable names, the axis first"""
+        return [name for name, _ in self.variables]
+
+    @property
+    def axis_name(self):
+        """Name of the sweep variable, e.g. 'time' or 'frequency'"""
+        return self.variables[0][0] if self.variables else ''
+
+    def __contains__(self, name):
+        return name.lower() in self._names
+
+    def trace(self, name):
+        """
+        Zero-copy view of a trace
+
+        Args:
+            name (str): Variable name, case-insensitive, e.g. 'V(out)'
+
+        Returns:
+            np.ndarray: Read-only view; float32/float64 or complex128
+
+        Raises:
+            KeyError: If the file has no such variable
+        """
+        index = self._names.get(name.lower())
+        if index is None:
+            raise KeyError(f"{name!r} not in {self.path}; traces are {', '.join(self.names)}")
+        return self._traces[index]
+
+    def axis(self, step=1):
+        """
+        Sweep values (time or frequency) as float64
+
+        LTspice marks some transient samples by flipping the sign of their
+        time, and stores the AC frequency as a complex number, so unlike
+        trace() this returns a copy; pass `step` to copy only every
+        step-th point.
+
+        Returns:
+            np.ndarray: Axis values
+        """
+        values = self._traces[0][::step]
+        return values.real.copy() if self.is_complex else np.abs(values)
+
+    def close(self):
+        """Release the mapping; deferred until views handed out are gone"""
+        self._traces = []
+        try:
+            self._mmap.close()
+        except BufferError:
+            # Views still reference it; the mapping is released with them
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_raw(path):
+    """
+    Open a .raw file for lazy trace access
+
+    Args:
+        path (str): LTspice or ngspice binary .raw file
+
+    Returns:
+        RawFile: Open file; close it or use it as a context manager
+    """
+    return RawFile(path)
+
+
+def find_raw(asc_path):
+    """
+    Results left next to a schematic
+
+    LTspice's own run writes <name>.raw; the headless scheduler writes one
+    <name>.<analysis>.raw per analysis.
+
+    Returns:
+        str: Path of the .raw file, or None if the circuit has not been run
+    """
+    if not asc_path:
+        return None
+    stem = os.path.splitext(asc_path)[0]
+    for suffix in ('.raw', '.ac.raw', '.tran.raw'):
+        if os.path.exists(stem + suffix):
+            return stem + suffix
+    return None
+
+
+def decimate(x, y, max_points=RAW_PLOT_POINTS):
+    """
+    Reduce a trace for plotting, keeping each bucket's minimum and maximum
+
+    The views are reshaped into buckets rather than copied, so memory use
+    depends on `max_points` only, however long the trace is.
+
+    Args:
+        x (np.ndarray): Axis values, or an axis view of the same length
+        y (np.ndarray): Real trace values
+        max_points (int): Upper bound on the returned points
+
+    Returns:
+        tuple: (x, y) float64 arrays of at most max_points points in axis order
+    """
+    count = len(y)
+    if count <= max_points:
+        return np.abs(np.asarray(x, dtype=float)), np.asarray(y, dtype=float)
+    bucket = -(-count // (max_points // 2))
+    full = count // bucket * bucket
+    # Reduce a band of buckets at a time; argmin copies strided input first
+    rows = max(1, DECIMATE_BAND // bucket)
+    spans = [(start, min(full, start + rows * bucket), bucket) for start in range(0, full, rows * bucket)]
+    if full < count:
+        spans.append((full, count, count - full))
+    xs, ys = [], []
+    for start, stop, size in spans:
+        values = y[start:stop].reshape(-1, size)
+        lows, highs = values.argmin(axis=1), values.argmax(axis=1)
+        # Keep each bucket's extremes in axis order so the line doesn't fold back
+        order = np.stack([np.minimum(lows, highs), np.maximum(lows, highs)], axis=1)
+        positions = (order + np.arange(start, stop, size)[:, None]).ravel()
+        xs.append(np.abs(np.asarray(x[positions], dtype=float)))
+        ys.append(np.asarray(y[positions], dtype=float))
+    return np.concatenate(xs), np.concatenate(ys)
+
+
+def _plotted_traces(raw, traces):
+    """Requested traces, or every node voltage (the first few if there are many)"""
+    if traces:
+        return [name for name in traces if name in raw]
+    voltages = [name for name, kind in raw.variables[1:] if kind.lower() == 'voltage']
+    return (voltages or raw.names[1:])[:8]
+
+
+def results_figure(path, traces=None, max_points=RAW_PLOT_POINTS):
+    """
+    Plot the results of an LTspice run
+
+    AC results are shown as Bode magnitude and phase, transient results as
+    voltages over time, min/max decimated to `max_points` per trace.
+
+    Args:
+        path (str): .raw file
+        traces (list): Variable names to plot (default: the node voltages)
+        max_points (int): Points kept per trace
+
+    Returns:
+        matplotlib.figure.Figure: Figure for gr.Plot
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    from matplotlib.figure import Figure
+
+    with read_raw(path) as raw:
+        names = _plotted_traces(raw, traces)
+        title = f"{os.path.basename(path)}: {raw.plotname}"
+        if raw.is_complex:
+            figure = Figure(figsize=(8, 5), tight_layout=True)
+            magnitude, phase = figure.subplots(2, 1, sharex=True)
+            step = max(1, -(-raw.points // max_points))
+            freqs = raw.axis(step)
+            for name in names:
+                values = raw.trace(name)[::step]
+                magnitude.semilogx(freqs, 20 * np.log10(np.maximum(np.abs(values), 1e-300)), label=name)
+                phase.semilogx(freqs, np.degrees(np.angle(values)), label=name)
+            magnitude.set_title(title)
+            magnitude.set_ylabel('Magnitude (dB)')
+            magnitude.legend(loc='best')
+            magnitude.grid(True, which='both', alpha=0.3)
+            phase.set_xlabel('Frequency (Hz)')
+            phase.set_ylabel('Phase (deg)')
+            phase.grid(True, which='both', alpha=0.3)
+        else:
+            figure = Figure(figsize=(8, 4), tight_layout=True)
+            plot = figure.subplots(1, 1)
+            axis = raw.trace(raw.axis_name)
+            for name in names:
+                x, y = decimate(axis, raw.trace(name), max_points)
+                plot.plot(x, y, label=name)
+            plot.set_title(title)
+            plot.set_xlabel('Time (s)' if raw.axis_name.lower() == 'time' else raw.axis_name)
+            plot.set_ylabel('Voltage (V)')
+            plot.legend(loc='upper right')
+            plot.grid(True, alpha=0.3)
+    return figure
+
+
+def write_raw(path, plotname, variables, blocks, title='', double=False, fastaccess=False):
+    """
+    Write a binary .raw file in LTspice's layout
+
+    Data is written block by block, so arbitrarily long results can be
+    produced in constant memory.
+
+    Args:
+        path (str): Output file
+        plotname (str): e.g. 'Transient Analysis' or 'AC Analysis'
+        variables (list): (name, kind) pairs, the axis first, e.g. ('time', 'time')
+        blocks (iterable): Blocks of points, each a list with one array per variable;
+            complex arrays make an AC file
+        title (str): Title line
+        double (bool): Store transient traces as float64 instead of float32
+        fastaccess (bool): Column-major layout; needs a single block
+
+    Returns:
+        int: Points written
+    """
+    blocks = iter(blocks)
+    first = next(blocks)
+    is_complex = any(np.iscomplexobj(column) for column in first)
+    if is_complex:
+        formats = ['<c16'] * len(variables)
+        flags = 'complex forward log'
+    else:
+        formats = ['<f8'] + ['<f8' if double else '<f4'] * (len(variables) - 1)
+        flags = 'real forward' + (' double' if double else '')
+    if fastaccess:
+        flags += ' fastaccess'
+    lines = [
+        f"Title: {title}",
+        "Date: Thu Jan  1 00:00:00 1970",
+        f"Plotname: {plotname}",
+        f"Flags: {flags}",
+        f"No. Variables: {len(variables)}",
+        "No. Points: " + ' ' * _POINTS_WIDTH,
+        "Offset:   0.0000000000000000e+000",
+        "Command: Linear Technology Corporation LTspice XVII",
+        "Variables:",
+    ] + [f"\t{index}\t{name}\t{kind}" for index, (name, kind) in enumerate(variables)] + ["Binary:", ""]
+    header = '\n'.join(lines).encode('utf-16-le')
+    points_at = header.find('No. Points: '.encode('utf-16-le')) + len('No. Points: '.encode('utf-16-le'))
+
+    record = np.dtype({'names': [f'v{index}' for index in range(len(variables))], 'formats': formats})
+    points = 0
+    with open(path, 'wb') as f:
+        f.write(header)
+        for block in [first] if fastaccess else _chain(first, blocks):
+            if fastaccess:
+                for column, dtype in zip(block, formats):
+                    f.write(np.ascontiguousarray(column, dtype=dtype).tobytes())
+                points += len(block[0])
+                continue
+            data = np.empty(len(block[0]), dtype=record)
+            for name, column in zip(record.names, block):
+                data[name] = column
+            f.write(data.tobytes())
+            points += len(data)
+        f.seek(points_at)
+        f.write(str(points).ljust(_POINTS_WIDTH).encode('utf-16-le'))
+    return points
+
+
+def _chain(first, rest):
+    """Yield the first block, then the remaining ones"""
+    yield first
+    yield from rest
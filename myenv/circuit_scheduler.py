@@ -0,0 +1,405 @@
+"""
+Headless batch simulation of generated circuits
+
+Every schematic gets a SPICE netlist written next to it (<name>.net). Each
+analysis directive then becomes its own job, because a .raw file holds one
+plot: the elements plus that single directive. Jobs run in batch mode on a
+bounded pool, each in its own simulator process, so a sweep uses every core:
+
+    ltspice  - LTSPICE_PATH -b job.net (the executable, not a .lnk shortcut)
+    ngspice  - NGSPICE_PATH -b -r job.raw job.net
+    builtin  - circuit_sim.py with ngspice's command line, for machines with neither
+
+Jobs are keyed by a hash of the backend and the job netlist. Identical
+circuits in a sweep are simulated once: concurrent duplicates share the
+in-flight job and later ones reuse the .raw cached under SIM_CACHE_DIR.
+A job that times out, exits with an error or leaves no .raw is retried up
+to SIM_RETRIES times. Results are dicts with the status, the .raw path,
+its traces and the tail of the simulator's output, and each .raw is also
+placed next to its schematic as <name>.<analysis>.raw.
+"""
+import hashlib
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+
+from circuit_core import CIRCUIT_DIR
+from circuit_metrics import metrics
+
+# Simulator for jobs: ltspice, ngspice, builtin, or auto for the first one installed in that order
+SIM_BACKEND = os.getenv('SIM_BACKEND', 'auto')
+
+# ngspice executable, looked up on PATH
+NGSPICE_PATH = os.getenv('NGSPICE_PATH', 'ngspice')
+
+# Simulator processes running at once
+SIM_WORKERS = int(os.getenv('SIM_WORKERS', str(os.cpu_count() or 1)))
+
+# Seconds a simulator process may run before it is killed
+SIM_TIMEOUT_S = float(os.getenv('SIM_TIMEOUT_S', '120'))
+
+# Extra attempts for a job that timed out or failed
+SIM_RETRIES = int(os.getenv('SIM_RETRIES', '1'))
+
+# Results of every job, by netlist hash
+SIM_CACHE_DIR = os.getenv('SIM_CACHE_DIR', os.path.join(CIRCUIT_DIR, 'sim'))
+
+# Directives that start an analysis; each one becomes a separate job
+ANALYSES = ('.ac', '.tran', '.dc', '.op', '.noise', '.tf')
+
+# Lines of simulator output kept in a result
+LOG_TAIL_LINES = 20
+
+# Title of every job netlist; the schematic path would defeat deduplication
+JOB_TITLE = '* LTspice circuit'
+
+_BUILTIN_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'circuit_sim.py')
+
+
+def resolve_backend(name=SIM_BACKEND):
+    """
+    Find the simulator to run jobs with
+
+    Args:
+        name (str): ltspice, ngspice, builtin or auto
+
+    Returns:
+        tuple: (backend name, executable)
+
+    Raises:
+        ValueError: If the backend is unknown or not installed
+    """
+    import circuit_core
+
+    ltspice = circuit_core.LTSPICE_PATH
+    executables = {
+        # A Windows shortcut cannot be started without a shell, and never in batch mode
+        'ltspice': ltspice if os.path.isfile(ltspice) and not ltspice.lower().endswith('.lnk') else None,
+        'ngspice': shutil.which(NGSPICE_PATH),
+        'builtin': sys.executable,
+    }
+    if name == 'auto':
+        name = next(backend for backend in ('ltspice', 'ngspice', 'builtin') if executables[backend])
+    if name not in executables:
+        raise ValueError(f"Unknown simulator '{name}'; use one of {', '.join(executables)} or auto")
+    if executables[name] is None:
+        raise ValueError(f"{name} not found; set {'LTSPICE_PATH' if name == 'ltspice' else 'NGSPICE_PATH'}")
+    return name, executables[name]
+
+
+def export_netlist(asc_path, dialect='ltspice'):
+    """
+    Write the SPICE netlist of a schematic next to it as <name>.net
+
+    Args:
+        asc_path (str): .asc file
+        dialect (str): 'ltspice' or 'ngspice'
+
+    Returns:
+        tuple: (netlist path, Netlist)
+    """
+    from circuit_sim import parse_asc
+
+    with open(asc_path, encoding='utf-8', errors='replace') as f:
+        netlist = parse_asc(f.read())
+    path = os.path.splitext(asc_path)[0] + '.net'
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(netlist.to_spice(f'* {asc_path}', dialect=dialect))
+    return path, netlist
+
+
+def analysis_jobs(netlist, dialect='ltspice'):
+    """
+    Split a netlist into one job netlist per analysis directive
+
+    Returns:
+        list: (analysis name such as 'ac', netlist text) pairs
+    """
+    analyses = [d for d in netlist.directives if d.split()[0].lower() in ANALYSES]
+    others = [d for d in netlist.directives if d not in analyses]
+    return [(directive.split()[0].lower()[1:], netlist.to_spice(JOB_TITLE, others + [directive], dialect))
+            for directive in analyses]
+
+
+def _place(source, target):
+    """Make `target` a hard link to (or copy of) `source`, replacing it atomically"""
+    if os.path.exists(target) and os.path.samefile(source, target):
+        # Renaming a link over the same file is a no-op that would leave the link behind
+        return
+    temp = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.link(source, temp)
+    except OSError:
+        shutil.copyfile(source, temp)
+    os.replace(temp, target)
+
+
+class SimulationScheduler:
+    """
+    Runs simulation jobs on a bounded pool of simulator processes
+
+    Use it as a context manager, or call close().
+
+    Args:
+        workers (int): Simulator processes running at once
+        backend (str): ltspice, ngspice, builtin or auto
+        timeout (float): Seconds before a simulator process is killed
+        retries (int): Extra attempts for a failed or timed-out job
+        cache_dir (str): Where results are kept by netlist hash
+    """
+
+    def __init__(self, workers=SIM_WORKERS, backend=SIM_BACKEND, timeout=SIM_TIMEOUT_S,
+                 retries=SIM_RETRIES, cache_dir=SIM_CACHE_DIR):
+        self.backend, self.executable = resolve_backend(backend)
+        self.dialect = 'ngspice' if self.backend == 'ngspice' else 'ltspice'
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self.retries = retries
+        self.cache_dir = cache_dir
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='sim')
+        # Jobs in flight by key, so concurrent duplicates share one run
+        self._running = {}
+        self._lock = threading.Lock()
+
+    def job_key(self, text):
+        """Key of a job: the backend and the netlist it runs"""
+        return hashlib.sha256(f"{self.backend}\n{text}".encode('utf-8')).hexdigest()
+
+    def raw_path(self, key):
+        """Cached result of a job"""
+        return os.path.join(self.cache_dir, key[:2], key + '.raw')
+
+    def command(self, netlist_path, raw_path):
+        """Batch-mode command line that simulates netlist_path into raw_path"""
+        if self.backend == 'ltspice':
+            # LTspice names the results after the netlist: job.net -> job.raw
+            return [self.executable, '-b', netlist_path]
+        if self.backend == 'ngspice':
+            return [self.executable, '-b', '-r', raw_path, netlist_path]
+        return [self.executable, _BUILTIN_SCRIPT, '-b', '-r', raw_path, netlist_path]
+
+    def submit(self, text, analysis):
+        """
+        Queue a job, reusing a running or finished job with the same netlist
+
+        Args:
+            text (str): Job netlist with a single analysis directive
+            analysis (str): Analysis name for the result, e.g. 'tran'
+
+        Returns:
+            Future: Resolves to the job result dict
+        """
+        key = self.job_key(text)
+        with self._lock:
+            future = self._running.get(key)
+            if future is not None:
+                metrics.increment('sim_dedup')
+                return future
+            if os.path.exists(self.raw_path(key)):
+                metrics.increment('sim_cached')
+                future = Future()
+                future.set_result(self._result(key, analysis, 'ok', cached=True))
+                return future
+            future = self._pool.submit(self._run, key, analysis, text)
+            self._running[key] = future
+        future.add_done_callback(lambda _: self._finished(key))
+        return future
+
+    def _finished(self, key):
+        with self._lock:
+            self._running.pop(key, None)
+
+    def _run(self, key, analysis, text):
+        """
+        Simulate one job netlist in a scratch directory, with retries
+
+        Returns:
+            dict: Job result
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        work_dir = tempfile.mkdtemp(prefix=f'{key[:12]}-', dir=self.cache_dir)
+        netlist_path = os.path.join(work_dir, 'job.net')
+        raw_path = os.path.join(work_dir, 'job.raw')
+        with open(netlist_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+
+        start = time.perf_counter()
+        status, error, log = 'failed', None, ''
+        attempts = 0
+        try:
+            for attempts in range(1, self.retries + 2):
+                if attempts > 1:
+                    metrics.increment('sim_retry')
+                if os.path.exists(raw_path):
+                    os.remove(raw_path)
+                try:
+                    with metrics.span('simulate'):
+                        completed = subprocess.run(self.command(netlist_path, raw_path), cwd=work_dir,
+                                                   stdin=subprocess.DEVNULL, capture_output=True, text=True,
+                                                   errors='replace', timeout=self.timeout)
+                except subprocess.TimeoutExpired:
+                    metrics.increment('sim_timeout')
+                    status, error = 'timeout', f"No result after {self.timeout:g} s"
+                    continue
+                except OSError as e:
+                    # The simulator cannot be started at all; retrying won't help
+                    status, error = 'failed', str(e)
+                    break
+                log = completed.stdout + completed.stderr
+                log_path = os.path.join(work_dir, 'job.log')
+                if os.path.exists(log_path):
+                    with open(log_path, encoding='utf-8', errors='replace') as f:
+                        log += f.read()
+                if completed.returncode == 0 and os.path.exists(raw_path) and os.path.getsize(raw_path):
+                    status, error = 'ok', None
+                    break
+                lines = [line for line in log.splitlines() if line.strip()]
+                status = 'failed'
+                error = lines[-1] if lines else f"exit status {completed.returncode}"
+
+            if status == 'ok':
+                os.makedirs(os.path.dirname(self.raw_path(key)), exist_ok=True)
+                os.replace(raw_path, self.raw_path(key))
+            else:
+                metrics.increment('sim_failed')
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        tail = '\n'.join(log.splitlines()[-LOG_TAIL_LINES:])
+        return self._result(key, analysis, status, attempts, time.perf_counter() - start, error=error, log=tail)
+
+    def _result(self, key, analysis, status, attempts=0, elapsed=0.0, cached=False, error=None, log=''):
+        """Structured job result; successful ones list the traces of their .raw file"""
+        result = {'key': key, 'analysis': analysis, 'backend': self.backend, 'status': status,
+                  'attempts': attempts, 'elapsed_s': elapsed, 'cached': cached}
+        if status == 'ok':
+            from circuit_raw import read_raw
+
+            result['raw'] = self.raw_path(key)
+            try:
+                with read_raw(result['raw']) as raw:
+                    result.update(plotname=raw.plotname, points=raw.points, traces=raw.names)
+            except (OSError, ValueError) as e:
+                result.update(status='failed', error=f"unreadable results: {e}")
+        if error:
+            result['error'] = error
+        if log:
+            result['log'] = log
+        return result
+
+    def submit_circuit(self, asc_path):
+        """
+        Export a schematic's netlist and queue one job per analysis
+
+        Args:
+            asc_path (str): .asc file
+
+        Returns:
+            tuple: (record dict with path and netlist, {analysis: Future})
+        """
+        netlist_path, netlist = export_netlist(asc_path, self.dialect)
+        jobs = {analysis: self.submit(text, analysis) for analysis, text in analysis_jobs(netlist, self.dialect)}
+        return {'path': asc_path, 'netlist': netlist_path}, jobs
+
+    def iter_simulations(self, asc_paths):
+        """
+        Simulate many schematics, yielding one record per schematic as it completes
+
+        Only a bounded window of schematics is in flight, so any number of
+        paths can be streamed through.
+
+        Args:
+            asc_paths (iterable): .asc files
+
+        Yields:
+            dict: index, path, netlist, status ('ok', 'failed', 'timeout' or 'error')
+                and results (analysis -> job result) or error
+        """
+        paths = enumerate(asc_paths)
+        exhausted = False
+        pending = {}
+        waiting = {}
+        while True:
+            while not exhausted and len(pending) < self.workers * 4:
+                try:
+                    index, asc_path = next(paths)
+                except StopIteration:
+                    exhausted = True
+                    break
+                try:
+                    record, jobs = self.submit_circuit(asc_path)
+                except Exception as e:
+                    yield {'index': index, 'path': asc_path, 'status': 'error', 'error': str(e)}
+                    continue
+                record.update(index=index, results={})
+                if not jobs:
+                    record.update(status='error', error="no analysis directive")
+                    yield record
+                    continue
+                pending[index] = (record, len(jobs))
+                for analysis, future in jobs.items():
+                    waiting.setdefault(future, []).append((index, analysis))
+
+            if not waiting:
+                if exhausted:
+                    break
+                continue
+            done, _ = wait(list(waiting), return_when=FIRST_COMPLETED)
+            for future in done:
+                for index, analysis in waiting.pop(future):
+                    record, remaining = pending[index]
+                    record['results'][analysis] = self._deliver(record['path'], future.result())
+                    if remaining > 1:
+                        pending[index] = (record, remaining - 1)
+                        continue
+                    del pending[index]
+                    failed = [r['status'] for r in record['results'].values() if r['status'] != 'ok']
+                    record['status'] = failed[0] if failed else 'ok'
+                    yield record
+
+    def _deliver(self, asc_path, result):
+        """Copy a job result for one schematic, placing its .raw next to the schematic"""
+        result = dict(result)
+        if result['status'] == 'ok':
+            target = f"{os.path.splitext(asc_path)[0]}.{result['analysis']}.raw"
+            _place(result['raw'], target)
+            result['raw'] = target
+        return result
+
+    def close(self):
+        """Wait for running jobs and stop the pool"""
+        self._pool.shutdown(wait=True, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """Shared scheduler configured from the environment, created on first use"""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = SimulationScheduler()
+    return _scheduler
+
+
+def simulate_circuit(asc_path):
+    """
+    Simulate one schematic on the shared scheduler and wait for it
+
+    Returns:
+        dict: Record as yielded by SimulationScheduler.iter_simulations
+    """
+    return next(get_scheduler().iter_simulations([asc_path]))
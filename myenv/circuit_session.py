@@ -0,0 +1,458 @@
+"""
+Conversational edits of the last generated circuit
+
+A CircuitSession remembers the components, schematic and file of the last
+circuit. Follow-ups such as "make the resistor 10k", "change frequency to
+1 kHz", "double the capacitor" or "set the cutoff to 2 kHz" are read by a
+small local edit grammar. Only edits the grammar cannot read go to Gemini,
+with a prompt holding just the current components and the edit. The change
+rewrites only the affected SYMATTR Value lines instead of running the full
+parse, render and write pipeline again. A timestamped file is patched in
+place; a file in the content-addressed store is immutable, so the edited
+schematic is stored as a new entry (or reuses an identical one).
+"""
+import json
+import math
+import re
+import time
+
+from circuit_core import (
+    GEMINI_GENERATION_CONFIG,
+    COMPONENT_SCHEMA,
+    TOPOLOGY_PATTERNS,
+    ParseError,
+    _extract_quantities,
+    generate_circuit_schematic,
+    generate_content,
+    normalize_command,
+    parse_command_with_gemini_v2,
+    patch_circuit_schematic,
+    rewrite_circuit,
+    save_circuit,
+    topology_defaults,
+    validate_components,
+)
+from circuit_metrics import metrics
+
+# Leading words that do not change the meaning of a follow-up
+_FILLER_RE = re.compile(
+    r'^(?:(?:now|ok|okay|please|and|then|also|so|actually|instead|'
+    r'can you|could you|would you|let s|lets)\s+)*'
+)
+
+# A follow-up starts with an edit verb or names the part it changes
+_EDIT_START_RE = re.compile(
+    r'^(?:make|set|change|increase|decrease|reduce|raise|lower|double|halve|triple|use|'
+    r'switch|swap|bump|put|adjust|update|turn|try)\b'
+    r'|^(?:the\s+)?(?:(?:first|second)\s+)?(?:resistors?|capacitors?|inductors?|resistance|capacitance|'
+    r'frequency|voltage|amplitude|source|cutoff|corner|center|centre|bandwidth|[rcl][12])\b'
+)
+
+# "make it a high pass filter" edits; "a high pass filter with 10k" is a new circuit
+_REFERS_TO_CIRCUIT_RE = re.compile(r'\b(?:it|this|that|the circuit|the filter)\b')
+
+# Instance names and ordinals, e.g. "r2" or "second capacitor"
+_INSTANCE_RE = re.compile(r'\b([rcl])([12])\b')
+_ORDINAL_RE = re.compile(r'\b(first|second|1st|2nd)\s+(resistor|capacitor|inductor)\b')
+_ORDINALS = {'first': '1', '1st': '1', 'second': '2', '2nd': '2'}
+
+# Words naming a part, for edits without a value ("double the resistor")
+PART_WORDS = {
+    'resistor': 'R', 'resistors': 'R', 'resistance': 'R',
+    'capacitor': 'C', 'capacitors': 'C', 'capacitance': 'C',
+    'inductor': 'L', 'inductors': 'L', 'inductance': 'L',
+    'frequency': 'freq',
+    'voltage': 'V', 'amplitude': 'V',
+    'cutoff': 'cutoff', 'corner': 'cutoff',
+}
+
+# Relative changes; a percentage is handled by _PERCENT_RE
+FACTOR_WORDS = {'double': 2.0, 'twice': 2.0, 'triple': 3.0, 'halve': 0.5, 'half': 0.5}
+_PERCENT_RE = re.compile(r'\bby\s+(\d+(?:\.\d+)?)\s*(?:%|percent)')
+_FACTOR_RE = re.compile(r'\bby\s+a\s+factor\s+of\s+(\d+(?:\.\d+)?)')
+_DOWN_RE = re.compile(r'\b(?:decrease|reduce|lower|drop|cut|divide)\b')
+
+_SOURCE_TYPE_RE = re.compile(r'\b(dc|sine|sinusoidal|ac)\b')
+
+UNDO_COMMANDS = ('undo', 'undo that', 'go back', 'revert', 'revert that')
+
+# Keys describing how values were chosen; stale once a value is edited
+TARGET_KEYS = ('cutoff', 'center', 'bandwidth', 'f_low', 'f_high', 'target_error')
+
+# A target edit keeps the capacitors unless that misses the target by more than this
+EDIT_TARGET_TOLERANCE = 0.05
+
+# Keys whose change invalidates the target keys
+VALUE_KEYS = ('topology', 'R', 'C', 'L', 'R1', 'R2', 'C1', 'C2')
+
+GEMINI_EDIT_SCHEMA = {key: value for key, value in COMPONENT_SCHEMA.items() if key != 'required'}
+
+GEMINI_EDIT_CONFIG = dict(GEMINI_GENERATION_CONFIG, response_schema=GEMINI_EDIT_SCHEMA, max_output_tokens=128)
+
+GEMINI_EDIT_PROMPT = (
+    "Apply the edit to the LTspice circuit. Reply with JSON holding only the keys that change, "
+    "values as numbers in base units (10k -> 10000, 47uF -> 4.7e-05).\n"
+    "Circuit: {components}\n"
+    "Edit: {command}"
+)
+
+
+def _clean(command):
+    """Normalize a follow-up and drop leading filler words"""
+    return _FILLER_RE.sub('', normalize_command(command).replace("'", ' '))
+
+
+def is_edit_command(command):
+    """
+    Whether a command reads as a change to the current circuit
+
+    Args:
+        command (str): Recognized speech or typed command
+
+    Returns:
+        bool: True for follow-ups like "make the resistor 10k"; a command
+            naming a topology is only an edit when it refers back to the
+            circuit ("make it a high pass filter")
+    """
+    text = _clean(command)
+    if not _EDIT_START_RE.match(text):
+        return False
+    if any(pattern.search(text) for _, pattern in TOPOLOGY_PATTERNS):
+        return bool(_REFERS_TO_CIRCUIT_RE.search(text))
+    return True
+
+
+def is_undo_command(command):
+    """Whether a command asks to take back the last edit"""
+    return _clean(command) in UNDO_COMMANDS
+
+
+def _part_keys(kind, components):
+    """Component keys of one kind in this circuit, e.g. 'R' -> ['R1', 'R2'] for a band-pass"""
+    if kind in components or kind in ('V', 'freq', 'cutoff'):
+        return [kind]
+    return [key for key in (kind + '1', kind + '2') if key in components]
+
+
+def _current_cutoff(components):
+    """-3 dB frequency of a first-order RC filter"""
+    if components.get('cutoff'):
+        return components['cutoff']
+    return 1 / (2 * math.pi * components['R'] * components['C'])
+
+
+def _resolve_targets(components, changes, targets):
+    """Synthesize new values for changed frequency targets, keeping the capacitors if possible"""
+    from circuit_synthesis import TARGET_TOLERANCE, apply_targets
+
+    topology = changes.get('topology', components['topology'])
+    if topology in ('low_pass_filter', 'high_pass_filter'):
+        if 'cutoff' not in targets:
+            return None
+        fixed = {'C': changes.get('C', components.get('C'))}
+    elif topology == 'band_pass_filter':
+        targets = dict({key: components[key] for key in ('center', 'bandwidth', 'f_low', 'f_high')
+                        if key in components}, **targets)
+        fixed = {key: changes.get(key, components.get(key)) for key in ('C1', 'C2')}
+    else:
+        return None
+    solved = apply_targets(dict(fixed, topology=topology, **targets))
+    if solved.get('target_error') is None:
+        return None
+    if solved['target_error'] > EDIT_TARGET_TOLERANCE:
+        try:
+            solved = apply_targets(dict(topology=topology, **targets), tolerance=TARGET_TOLERANCE)
+        except ValueError as e:
+            raise ParseError(str(e))
+    return {key: value for key, value in solved.items() if key != 'topology'}
+
+
+def parse_edit(command, components):
+    """
+    Read a follow-up edit with the local grammar
+
+    Args:
+        command (str): Follow-up such as "make the resistor 10k"
+        components (dict): Components of the current circuit
+
+    Returns:
+        dict: Changed keys and their new values, or None if the edit is not understood
+    """
+    text = _clean(command)
+    changes = {}
+
+    # Topology switch: keep every value the new topology also uses
+    for name, pattern in TOPOLOGY_PATTERNS:
+        if pattern.search(text):
+            if name != components.get('topology'):
+                changes['topology'] = name
+                changes.update({key: value for key, value in topology_defaults(name).items()
+                                if key not in components})
+            text = pattern.sub(' ', text)
+            break
+
+    # Explicit instances ("r2", "second capacitor") in the order they are named
+    instances = {}
+    for match in _ORDINAL_RE.finditer(text):
+        kind = PART_WORDS[match.group(2)]
+        instances.setdefault(kind, []).append(kind + _ORDINALS[match.group(1)])
+    for match in _INSTANCE_RE.finditer(text):
+        kind = match.group(1).upper()
+        instances.setdefault(kind, []).append(kind + match.group(2))
+    # Spelled out so unitless values next to them are classified
+    text = _INSTANCE_RE.sub(lambda m: {'r': 'resistor', 'c': 'capacitor', 'l': 'inductor'}[m.group(1)], text)
+
+    match = _SOURCE_TYPE_RE.search(text)
+    if match and re.search(r'\b(?:source|signal|input|supply)\b', text):
+        changes['V_type'] = 'DC' if match.group(1) == 'dc' else 'SINE'
+
+    # Relative changes apply to the parts named, e.g. "halve both capacitors"
+    factor = None
+    percent = _PERCENT_RE.search(text) or _FACTOR_RE.search(text)
+    if percent:
+        amount = float(percent.group(1))
+        if percent.re is _PERCENT_RE:
+            factor = 1 - amount / 100 if _DOWN_RE.search(text) else 1 + amount / 100
+        else:
+            factor = 1 / amount if _DOWN_RE.search(text) else amount
+        text = text[:percent.start()] + text[percent.end():]
+    else:
+        for word in re.findall(r'[a-z]+', text):
+            if word in FACTOR_WORDS:
+                factor = FACTOR_WORDS[word]
+                break
+
+    quantities = _extract_quantities(text)
+    targets = {}
+    if factor is not None and not quantities:
+        kinds = []
+        for word in re.findall(r'[a-z]+', text):
+            kind = PART_WORDS.get(word)
+            if kind and kind not in kinds:
+                kinds.append(kind)
+        for kind in kinds:
+            if kind == 'cutoff':
+                if components.get('topology') not in ('low_pass_filter', 'high_pass_filter'):
+                    return None
+                targets['cutoff'] = float('%.6g' % (_current_cutoff(components) * factor))
+                continue
+            for key in instances.get(kind) or _part_keys(kind, components):
+                if isinstance(components.get(key), (int, float)):
+                    changes[key] = float('%.6g' % (components[key] * factor))
+    else:
+        values = {}
+        for kind, value, _ in quantities:
+            values.setdefault(kind, []).append(value)
+        for kind, found in values.items():
+            if kind in ('cutoff', 'center', 'bandwidth'):
+                targets[kind] = found[0]
+                continue
+            keys = instances.get(kind) or _part_keys(kind, changes if 'topology' in changes else components)
+            if kind in ('freq', 'V'):
+                keys = [kind]
+            if not keys:
+                return None
+            if len(found) == 1:
+                changes.update({key: found[0] for key in keys})
+            elif len(found) == len(keys):
+                changes.update(zip(keys, found))
+            else:
+                return None
+
+    if targets:
+        solved = _resolve_targets(components, changes, targets)
+        if solved is None:
+            return None
+        changes.update(solved)
+
+    for key, value in list(changes.items()):
+        if isinstance(value, float) and value.is_integer():
+            changes[key] = int(value)
+    changes = {key: value for key, value in changes.items() if components.get(key) != value}
+    return changes or None
+
+
+def edit_with_gemini(command, components):
+    """
+    Ask Gemini for the keys an edit changes
+
+    Args:
+        command (str): Follow-up the local grammar could not read
+        components (dict): Components of the current circuit
+
+    Returns:
+        dict: Changed keys and their validated values
+
+    Raises:
+        ParseError: If the request fails or the reply is not valid
+    """
+    current = {key: value for key, value in components.items() if key not in TARGET_KEYS}
+    prompt = GEMINI_EDIT_PROMPT.format(components=json.dumps(current), command=json.dumps(command))
+    metrics.increment('edit_gemini')
+    try:
+        with metrics.span('gemini'):
+            response = generate_content(prompt, GEMINI_EDIT_CONFIG)
+        reply = response.text
+        start, end = reply.find('{'), reply.rfind('}')
+        if start == -1 or end < start:
+            raise ValueError("no JSON object in reply")
+        data = json.loads(reply[start:end + 1])
+        if not isinstance(data, dict):
+            raise ValueError("reply is not a JSON object")
+        validated = validate_components(dict(data, topology=data.get('topology') or components['topology']))
+    except Exception as e:
+        metrics.increment('edit_gemini_error')
+        raise ParseError(f"Could not apply edit ({e})")
+    changes = {key: value for key, value in validated.items()
+               if key in data and components.get(key) != value}
+    if changes.get('topology'):
+        changes.update({key: value for key, value in topology_defaults(changes['topology']).items()
+                        if key not in components and key not in changes})
+    return changes
+
+
+class CircuitSession:
+    """
+    The last circuit of one conversation, for incremental edits
+
+    Holds plain data only, so a Gradio State can copy it per browser session.
+
+    Attributes:
+        components (dict): Components of the current circuit, or None
+        schematic (str): Its rendered schematic
+        path (str): The .asc file it was written to
+        history (list): Earlier (components, schematic, path) versions, newest last
+    """
+
+    # Earlier versions kept for undo
+    HISTORY_SIZE = 20
+
+    def __init__(self):
+        self.components = None
+        self.schematic = None
+        self.path = None
+        self.history = []
+
+    def remember(self, components, schematic, path):
+        """
+        Make a newly generated circuit the one that follow-ups edit
+
+        Args:
+            components (dict): Parsed components
+            schematic (str): Rendered schematic
+            path (str): File the schematic was written to
+        """
+        self.components = dict(components)
+        self.schematic = schematic
+        self.path = path
+        self.history = []
+
+    def read_edit(self, command, use_gemini=True):
+        """
+        Read a follow-up as changes to the current circuit
+
+        Args:
+            command (str): Recognized speech or typed command
+            use_gemini (bool): Ask Gemini when the local grammar fails
+
+        Returns:
+            dict: Changed keys (possibly empty), or None if the command is
+                not an edit and should be parsed as a new circuit
+
+        Raises:
+            ParseError: If the edit is not understood
+        """
+        if self.components is None or not is_edit_command(command):
+            return None
+        with metrics.span('edit_parse'):
+            changes = parse_edit(command, self.components)
+        if changes is not None:
+            metrics.increment('edit_local')
+            return changes
+        if not use_gemini:
+            raise ParseError(f"Could not read edit {command!r}")
+        return edit_with_gemini(command, self.components)
+
+    def _write(self, schematic, components, command):
+        """Save an edited schematic, keeping stored files unchanged"""
+        from circuit_store import get_store
+
+        store = get_store()
+        if store.contains(self.path):
+            return store.put(schematic, components, command)['path']
+        return rewrite_circuit(self.path, schematic)
+
+    def apply(self, changes, command=None):
+        """
+        Apply changes and save the patched schematic
+
+        Args:
+            changes (dict): Output of read_edit()
+            command (str): The follow-up, recorded with a stored version
+
+        Returns:
+            dict: components, schematic, path and the number of value
+                lines patched (None when the topology changed and the
+                schematic was rendered again)
+        """
+        components = dict(self.components, **changes)
+        if any(key in VALUE_KEYS for key in changes) and not any(key in TARGET_KEYS for key in changes):
+            # Hand-picked values no longer meet the old design target
+            for key in TARGET_KEYS:
+                components.pop(key, None)
+        with metrics.span('edit_patch'):
+            schematic, patched = patch_circuit_schematic(self.schematic, self.components, components)
+        path = self.path
+        if path:
+            with metrics.span('write'):
+                path = self._write(schematic, components, command)
+        self.history = (self.history + [(self.components, self.schematic, self.path)])[-self.HISTORY_SIZE:]
+        self.components, self.schematic, self.path = components, schematic, path
+        return {'components': components, 'schematic': schematic, 'path': path, 'patched': patched}
+
+    def undo(self):
+        """
+        Go back to the circuit before the last edit
+
+        Returns:
+            dict: As apply(), or None if there is nothing to undo
+        """
+        if not self.history:
+            return None
+        edited_path = self.path
+        self.components, self.schematic, self.path = self.history.pop()
+        # A stored version is still on disk; a patched file is rewritten
+        if self.path and self.path == edited_path:
+            rewrite_circuit(self.path, self.schematic)
+        return {'components': self.components, 'schematic': self.schematic, 'path': self.path, 'patched': None}
+
+    def handle(self, command, use_gemini=True):
+        """
+        Apply a follow-up edit, or generate a new circuit for anything else
+
+        Args:
+            command (str): Recognized speech or typed command
+            use_gemini (bool): Ask Gemini for edits the grammar cannot read
+
+        Returns:
+            dict: components, schematic, path, 'edited' (bool), 'changes'
+                and 'patched' for edits, and 'elapsed_ms'
+        """
+        start = time.perf_counter()
+        if self.components is not None and is_undo_command(command):
+            result = self.undo()
+            if result is not None:
+                result.update(edited=True, changes={}, elapsed_ms=(time.perf_counter() - start) * 1000)
+                return result
+        changes = self.read_edit(command, use_gemini=use_gemini)
+        if changes is not None:
+            result = self.apply(changes, command)
+            result.update(edited=True, changes=changes, elapsed_ms=(time.perf_counter() - start) * 1000)
+            return result
+
+        components = parse_command_with_gemini_v2(command)
+        schematic = generate_circuit_schematic(components)
+        path = save_circuit(schematic, components, command)
+        self.remember(components, schematic, path)
+        return {'components': components, 'schematic': schematic, 'path': path, 'edited': False,
+                'changes': {}, 'patched': None, 'elapsed_ms': (time.perf_counter() - start) * 1000}
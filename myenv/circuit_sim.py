@@ -0,0 +1,685 @@
+"""
+Sparse modified-nodal-analysis simulator for LTspice schematics
+
+An .asc schematic is turned into a netlist by placing every symbol pin on
+the grid and merging wire endpoints, T-junctions and same-named FLAGs with a
+union-find. The netlist is stamped into sparse G and C matrices so that
+(G + sC) x = b describes the circuit, with x holding node voltages followed
+by voltage-source and inductor branch currents.
+
+Analyses:
+    ac_analysis        - small-signal sweep; the sparsity pattern is built
+                         once and every frequency reuses it, solving all
+                         outputs from a single factorization per frequency
+    transient_analysis - fixed-step trapezoidal integration; the system
+                         matrix is factored once and reused for every step
+                         (small systems use a dense step matrix instead)
+    simulate           - runs the .ac/.tran directives found in the schematic
+
+Supported symbols are res, cap, ind, voltage and current. This lets CI and
+servers check generated circuits without an LTspice install. Schematics
+with diodes, transistors or op-amps (see circuit_layout) still parse and
+export to SPICE for an external simulator, but cannot be analysed here.
+"""
+import argparse
+import bisect
+import math
+import re
+import sys
+
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.linalg import splu
+
+from circuit_core import parse_spice_value, split_asc_lines
+from circuit_layout import SYMBOL_PINS
+
+# Conductance from every node to ground, as SPICE's gmin, so nodes that
+# only connect through capacitors still have a DC operating point
+GMIN = 1e-12
+
+GROUND = '0'
+
+# Transient steps per period (or edge) of the fastest SINE/PULSE source, so
+# a .tran step coarser than the source cannot alias it into a flat line
+TRAN_STEPS_PER_PERIOD = 20
+
+# Largest system stepped with a dense step matrix; a small dense product per
+# step is several times faster than a sparse solve
+DENSE_TRAN_SIZE = 64
+
+# Element letter of a SPICE netlist line -> symbol name
+SPICE_KINDS = {'R': 'res', 'C': 'cap', 'L': 'ind', 'V': 'voltage', 'I': 'current'}
+
+# Stand-in for LTspice's opamp.sub in ngspice netlists: a single-pole
+# op-amp with the same defaults (Aol=100k, GBW=10Meg), whose output is
+# softly limited to +-12 V so oscillators settle
+NGSPICE_OPAMP_SUBCKT = [
+    '.subckt opamp inp inn out',
+    'Rin inp inn 10Meg',
+    'G1 0 int inp inn 1m',
+    'R1 int 0 100Meg',
+    'C1 int 0 15.9p',
+    'B1 out 0 V=12*tanh(V(int)/12)',
+    '.ends opamp',
+]
+
+_SOURCE_FUNC_RE = re.compile(r'^\s*(SINE|SIN|PULSE)\s*\((.*)\)\s*$', re.IGNORECASE)
+
+
+class Component:
+    """
+    One netlist element
+
+    Attributes:
+        name (str): Instance name, e.g. 'R1'
+        kind (str): Symbol name, one of circuit_layout.SYMBOL_PINS
+        nodes (tuple): Node name per pin; (positive, negative) for two-terminal parts
+        value (str): SYMATTR Value as written in the schematic
+        value2 (str): SYMATTR Value2 (AC specification of sources), or ''
+    """
+
+    def __init__(self, name, kind, nodes, value, value2=''):
+        self.name = name
+        self.kind = kind
+        self.nodes = nodes
+        self.value = value
+        self.value2 = value2
+
+    def __repr__(self):
+        return f"Component({self.name!r}, {self.kind!r}, {self.nodes!r}, {self.value!r})"
+
+    def numeric_value(self):
+        """Value of a passive element in ohms, farads or henries"""
+        value = parse_spice_value(self.value)
+        if isinstance(value, str):
+            raise ValueError(f"{self.name}: cannot interpret value '{self.value}'")
+        return float(value)
+
+    def ac_magnitude(self):
+        """Complex AC stimulus of a source from 'AC <mag> [<phase>]', 0 if none"""
+        for spec in (self.value2, self.value):
+            parts = spec.split()
+            if parts and parts[0].upper() == 'AC' and len(parts) > 1:
+                magnitude = float(parse_spice_value(parts[1]))
+                phase = float(parse_spice_value(parts[2])) if len(parts) > 2 else 0.0
+                return magnitude * np.exp(1j * np.radians(phase))
+        return 0.0
+
+    def time_scale(self):
+        """Shortest period or nonzero edge time of a SINE/PULSE source in seconds, or None"""
+        match = _SOURCE_FUNC_RE.match(self.value)
+        if match is None:
+            return None
+        args = [float(parse_spice_value(arg)) for arg in match.group(2).replace(',', ' ').split()]
+        if match.group(1).upper().startswith('SIN'):
+            freq = (args + [0.0] * 3)[2]
+            return 1 / freq if freq > 0 else None
+        # Rise, fall, on time and period; a zero edge is an ideal step
+        scales = [t for t in (args + [0.0] * 7)[3:7] if t > 0]
+        return min(scales) if scales else None
+
+    def waveform(self, times):
+        """
+        Time-domain value of a source
+
+        Args:
+            times (np.ndarray): Sample times in seconds
+
+        Returns:
+            np.ndarray: Source value at each time
+        """
+        match = _SOURCE_FUNC_RE.match(self.value)
+        if match is None:
+            value = parse_spice_value(self.value.split()[0]) if self.value.strip() else 0
+            return np.full(len(times), float(value) if not isinstance(value, str) else 0.0)
+
+        args = [float(parse_spice_value(arg)) for arg in match.group(2).replace(',', ' ').split()]
+        if match.group(1).upper().startswith('SIN'):
+            offset, amplitude, freq, delay, theta, phi = (args + [0.0] * 6)[:6]
+            phase = np.radians(phi)
+            active = np.clip(times - delay, 0, None)
+            wave = amplitude * np.sin(2 * np.pi * freq * active + phase) * np.exp(-theta * active)
+            return offset + np.where(times < delay, amplitude * np.sin(phase), wave)
+
+        v1, v2, delay, rise, fall, on, period, cycles = (args + [0.0] * 8)[:8]
+        rise = rise or 1e-9
+        fall = fall or 1e-9
+        local = times - delay
+        if period > 0:
+            local = np.where(local >= 0, np.mod(local, period), local)
+        wave = np.where(local < 0, v1,
+               np.where(local < rise, v1 + (v2 - v1) * local / rise,
+               np.where(local < rise + on, v2,
+               np.where(local < rise + on + fall, v2 + (v1 - v2) * (local - rise - on) / fall, v1))))
+        if cycles > 0 and period > 0:
+            wave = np.where(times - delay >= cycles * period, v1, wave)
+        return wave
+
+
+class Netlist:
+    """
+    Connected netlist extracted from a schematic
+
+    Attributes:
+        components (list): Component instances
+        nodes (list): Node names; GROUND is '0'
+        directives (list): SPICE directives from TEXT lines
+    """
+
+    def __init__(self, components, nodes, directives):
+        self.components = components
+        self.nodes = nodes
+        self.directives = directives
+
+    def time_scale(self):
+        """Shortest source period or edge time in seconds, or None for DC-only circuits"""
+        scales = [c.time_scale() for c in self.components if c.kind in ('voltage', 'current')]
+        scales = [t for t in scales if t]
+        return min(scales) if scales else None
+
+    def to_spice(self, title='* LTspice circuit', directives=None, dialect='ltspice'):
+        """
+        Render the netlist as SPICE text
+
+        Args:
+            title (str): First line of the netlist
+            directives (list): Directives to write instead of the schematic's
+            dialect (str): 'ltspice', or 'ngspice' to spell SINE as SIN and µ as u and
+                to replace LTspice's opamp.sub with NGSPICE_OPAMP_SUBCKT
+
+        Returns:
+            str: Netlist with one line per element and the schematic's directives
+        """
+        lines = [title]
+        for component in self.components:
+            value = component.value
+            if component.value2:
+                value = f"{value} {component.value2}"
+            if dialect == 'ngspice':
+                value = re.sub(r'^SINE\s*\(', 'SIN(', value, flags=re.IGNORECASE).replace('µ', 'u')
+            nodes = component.nodes
+            name = component.name
+            if component.kind == 'nmos':
+                # The symbol has no bulk pin; LTspice ties it to the source
+                nodes = nodes + nodes[-1:]
+            elif component.kind == 'opamp':
+                name = name if name.upper().startswith('X') else f"X{name}"
+                value = value or 'opamp'
+            lines.append(f"{name} {' '.join(nodes)} {value}")
+        for directive in self.directives if directives is None else directives:
+            if dialect == 'ngspice' and directive.lower().split() == ['.lib', 'opamp.sub']:
+                lines.extend(NGSPICE_OPAMP_SUBCKT)
+            else:
+                lines.append(directive)
+        lines.append('.end')
+        return '\n'.join(lines) + '\n'
+
+
+class _UnionFind:
+    """Disjoint sets over grid points"""
+
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, item):
+        parent = self.parent.setdefault(item, item)
+        if parent != item:
+            root = item
+            while self.parent[root] != root:
+                root = self.parent[root]
+            while self.parent[item] != root:
+                self.parent[item], item = root, self.parent[item]
+            return root
+        return item
+
+    def union(self, a, b):
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a != root_b:
+            self.parent[root_b] = root_a
+
+
+def _transform(offset, orientation):
+    """Apply an LTspice symbol orientation (R0..R270, M0..M270) to a pin offset"""
+    x, y = offset
+    if orientation.startswith('M'):
+        x = -x
+    rotation = int(orientation[1:] or 0) % 360
+    for _ in range(rotation // 90):
+        x, y = -y, x
+    return x, y
+
+
+def _on_segment(point, segment):
+    """True if a grid point lies on a wire segment"""
+    (px, py), ((x1, y1), (x2, y2)) = point, segment
+    if (px - x1) * (y2 - y1) != (py - y1) * (x2 - x1):
+        return False
+    return min(x1, x2) <= px <= max(x1, x2) and min(y1, y2) <= py <= max(y1, y2)
+
+
+def parse_asc(text):
+    """
+    Build a connected netlist from LTspice schematic content
+
+    Args:
+        text (str): .asc content
+
+    Returns:
+        Netlist: Components with resolved node names
+    """
+    wires = []
+    flags = []
+    symbols = []
+    directives = []
+    for line in split_asc_lines(text):
+        parts = line.split()
+        keyword = parts[0]
+        if keyword == 'WIRE':
+            x1, y1, x2, y2 = map(int, parts[1:5])
+            wires.append(((x1, y1), (x2, y2)))
+        elif keyword == 'FLAG':
+            flags.append(((int(parts[1]), int(parts[2])), parts[3]))
+        elif keyword == 'SYMBOL':
+            symbols.append({'kind': parts[1].split('\\')[-1].lower(), 'at': (int(parts[2]), int(parts[3])),
+                            'orientation': parts[4] if len(parts) > 4 else 'R0', 'attrs': {}})
+        elif keyword == 'SYMATTR' and symbols and len(parts) >= 2:
+            symbols[-1]['attrs'][parts[1]] = line.split(None, 2)[2] if len(parts) > 2 else ''
+        elif keyword == 'TEXT' and ' !' in line:
+            directives.append(line.split(' !', 1)[1])
+
+    union_find = _UnionFind()
+    for start, end in wires:
+        union_find.union(start, end)
+
+    # Pins and wire ends touching the middle of a wire are connected to it.
+    # Axis-aligned wires are indexed per row/column and sorted by start, so a
+    # lookup bisects to the few segments that can contain the point.
+    lines = {}
+    diagonal = []
+    for wire in wires:
+        (x1, y1), (x2, y2) = wire
+        if y1 == y2:
+            lines.setdefault(('y', y1), []).append((min(x1, x2), max(x1, x2), wire))
+        elif x1 == x2:
+            lines.setdefault(('x', x1), []).append((min(y1, y2), max(y1, y2), wire))
+        else:
+            diagonal.append(wire)
+    wire_index = {}
+    for key, segments in lines.items():
+        segments.sort(key=lambda segment: segment[0])
+        longest = max(high - low for low, high, _ in segments)
+        wire_index[key] = ([low for low, _, _ in segments], segments, longest)
+
+    def attach(point):
+        union_find.find(point)
+        for key, position in ((('y', point[1]), point[0]), (('x', point[0]), point[1])):
+            if key not in wire_index:
+                continue
+            starts, segments, longest = wire_index[key]
+            i = bisect.bisect_right(starts, position) - 1
+            while i >= 0 and starts[i] >= position - longest:
+                low, high, wire = segments[i]
+                if position <= high:
+                    union_find.union(wire[0], point)
+                i -= 1
+        for wire in diagonal:
+            if _on_segment(point, wire):
+                union_find.union(wire[0], point)
+
+    for start, end in wires:
+        attach(start)
+        attach(end)
+
+    placed = []
+    for index, symbol in enumerate(symbols):
+        if symbol['kind'] not in SYMBOL_PINS:
+            raise ValueError(f"Unsupported symbol '{symbol['kind']}'")
+        pins = []
+        for offset in SYMBOL_PINS[symbol['kind']]:
+            dx, dy = _transform(offset, symbol['orientation'])
+            pin = (symbol['at'][0] + dx, symbol['at'][1] + dy)
+            attach(pin)
+            pins.append(pin)
+        placed.append((symbol, pins))
+
+    # Flags with the same label are one net, wherever they are placed
+    first_flag = {}
+    for point, label in flags:
+        attach(point)
+        union_find.union(first_flag.setdefault(label, point), point)
+    names = {union_find.find(point): label for label, point in first_flag.items()}
+
+    node_names = {}
+    counter = 0
+    components = []
+    prefixes = {'res': 'R', 'cap': 'C', 'ind': 'L', 'voltage': 'V', 'current': 'I',
+                'diode': 'D', 'npn': 'Q', 'nmos': 'M', 'opamp': 'U'}
+    for index, (symbol, pins) in enumerate(placed):
+        nodes = []
+        for pin in pins:
+            root = union_find.find(pin)
+            if root not in node_names:
+                if root in names:
+                    node_names[root] = names[root]
+                else:
+                    counter += 1
+                    node_names[root] = f"N{counter:03d}"
+            nodes.append(node_names[root])
+        attrs = symbol['attrs']
+        name = attrs.get('InstName') or f"{prefixes[symbol['kind']]}{index + 1}"
+        components.append(Component(name, symbol['kind'], tuple(nodes), attrs.get('Value', ''), attrs.get('Value2', '')))
+
+    nodes = sorted(set(node_names.values()) | {GROUND})
+    return Netlist(components, nodes, directives)
+
+
+def parse_spice(text):
+    """
+    Read a SPICE netlist as written by Netlist.to_spice
+
+    The first line is the title. Elements are R, C, L, V and I lines of the
+    form 'name node+ node- value'; a source's trailing 'AC <mag>' becomes
+    its Value2.
+
+    Args:
+        text (str): Netlist content
+
+    Returns:
+        Netlist: Components, nodes and directives
+
+    Raises:
+        ValueError: If an element is not one of the supported kinds
+    """
+    components = []
+    nodes = [GROUND]
+    directives = []
+    for line in text.splitlines()[1:]:
+        line = line.strip()
+        if not line or line.startswith('*'):
+            continue
+        if line.startswith('.'):
+            if line.lower() != '.end':
+                directives.append(line)
+            continue
+        parts = line.split(None, 3)
+        kind = SPICE_KINDS.get(parts[0][0].upper())
+        if kind is None or len(parts) < 4:
+            raise ValueError(f"Unsupported netlist line: {line}")
+        value, value2 = parts[3], ''
+        ac = re.search(r'\s(AC\s.*)$', value, re.IGNORECASE)
+        if ac and kind in ('voltage', 'current'):
+            value, value2 = value[:ac.start()].strip(), ac.group(1)
+        components.append(Component(parts[0], kind, (parts[1], parts[2]), value, value2))
+        nodes.extend(node for node in parts[1:3] if node not in nodes)
+    return Netlist(components, nodes, directives)
+
+
+class MNASystem:
+    """
+    Sparse MNA matrices for a netlist
+
+    Attributes:
+        netlist (Netlist): Circuit being solved
+        index (dict): Node name -> row, for every non-ground node
+        size (int): Number of unknowns
+        sources (list): (component, row, sign) for every independent source
+    """
+
+    def __init__(self, netlist):
+        self.netlist = netlist
+        nodes = [node for node in netlist.nodes if node != GROUND]
+        self.index = {node: i for i, node in enumerate(nodes)}
+        branches = [c for c in netlist.components if c.kind in ('voltage', 'ind')]
+        self.branch = {c.name: len(nodes) + i for i, c in enumerate(branches)}
+        self.size = len(nodes) + len(branches)
+        self.sources = []
+
+        rows, cols, g_vals, c_vals = [], [], [], []
+
+        def stamp(row, col, g=0.0, c=0.0):
+            if row is None or col is None:
+                return
+            rows.append(row)
+            cols.append(col)
+            g_vals.append(g)
+            c_vals.append(c)
+
+        for i in range(len(nodes)):
+            stamp(i, i, g=GMIN)
+
+        for component in netlist.components:
+            if component.kind not in ('res', 'cap', 'voltage', 'ind', 'current'):
+                raise ValueError(f"{component.name}: {component.kind} is not supported by the built-in simulator")
+            p, n = (self.index.get(node) for node in component.nodes)
+            if component.kind in ('res', 'cap'):
+                value = component.numeric_value()
+                key = 'g' if component.kind == 'res' else 'c'
+                admittance = 1 / value if component.kind == 'res' else value
+                for a, b, sign in ((p, p, 1), (n, n, 1), (p, n, -1), (n, p, -1)):
+                    stamp(a, b, **{key: sign * admittance})
+            elif component.kind in ('voltage', 'ind'):
+                r = self.branch[component.name]
+                for node, sign in ((p, 1.0), (n, -1.0)):
+                    stamp(node, r, g=sign)
+                    stamp(r, node, g=sign)
+                if component.kind == 'ind':
+                    stamp(r, r, c=-component.numeric_value())
+                else:
+                    self.sources.append((component, r, 1.0))
+            elif component.kind == 'current':
+                # Current flows from the positive node through the source to the negative node
+                if p is not None:
+                    self.sources.append((component, p, -1.0))
+                if n is not None:
+                    self.sources.append((component, n, 1.0))
+
+        # Merge duplicate stamps into one CSC pattern shared by G and C, so
+        # G + sC is just a new data array for every frequency or time step
+        keys = np.asarray(cols, dtype=np.int64) * self.size + np.asarray(rows, dtype=np.int64)
+        unique, inverse = np.unique(keys, return_inverse=True)
+        self._rows = (unique % self.size).astype(np.int32)
+        self._indptr = np.concatenate(([0], np.cumsum(np.bincount(unique // self.size, minlength=self.size)))).astype(np.int32)
+        self._g = np.bincount(inverse, weights=g_vals, minlength=len(unique))
+        self._c = np.bincount(inverse, weights=c_vals, minlength=len(unique))
+
+    def matrix(self, g_scale=1.0, c_scale=0.0):
+        """
+        Assemble g_scale * G + c_scale * C in CSC form
+
+        Returns:
+            scipy.sparse.csc_matrix: System matrix
+        """
+        data = g_scale * self._g + c_scale * self._c
+        return sp.csc_matrix((data, self._rows, self._indptr), shape=(self.size, self.size))
+
+    def source_vector(self, values):
+        """
+        Right-hand side for the given per-source values
+
+        Args:
+            values (array): One value per entry of self.sources, or (len(sources), T)
+
+        Returns:
+            np.ndarray: b with shape (size,) or (size, T)
+        """
+        values = np.asarray(values)
+        b = np.zeros((self.size,) + values.shape[1:], dtype=values.dtype)
+        for (component, row, sign), value in zip(self.sources, values):
+            b[row] += sign * value
+        return b
+
+    def voltages(self, x):
+        """Map a solution (size,) or (size, T) to node name -> voltage"""
+        result = {node: x[i] for node, i in self.index.items()}
+        result[GROUND] = np.zeros_like(x[0])
+        return result
+
+
+def ac_analysis(netlist, freqs):
+    """
+    Small-signal AC sweep
+
+    Args:
+        netlist (Netlist): Circuit to solve
+        freqs (array): Frequencies in Hz
+
+    Returns:
+        dict: Node name -> complex voltage array over freqs
+    """
+    system = MNASystem(netlist)
+    freqs = np.asarray(freqs, dtype=float)
+    b = system.source_vector([component.ac_magnitude() for component, _, _ in system.sources]).astype(complex)
+    solution = np.empty((system.size, len(freqs)), dtype=complex)
+    for k, freq in enumerate(freqs):
+        solution[:, k] = splu(system.matrix(1.0, 2j * np.pi * freq)).solve(b)
+    return system.voltages(solution)
+
+
+def operating_point(netlist, time=0.0):
+    """
+    DC operating point with sources at their value at `time`
+
+    Returns:
+        dict: Node name -> voltage
+    """
+    system = MNASystem(netlist)
+    values = [component.waveform(np.array([time]))[0] for component, _, _ in system.sources]
+    x = splu(system.matrix()).solve(system.source_vector(values).astype(float))
+    return system.voltages(x)
+
+
+def transient_analysis(netlist, tstop, tstep, tstart=0.0):
+    """
+    Fixed-step trapezoidal transient analysis from the DC operating point
+
+    Args:
+        netlist (Netlist): Circuit to solve
+        tstop (float): End time in seconds
+        tstep (float): Time step in seconds
+        tstart (float): Start of the returned window
+
+    Returns:
+        tuple: (times, dict of node name -> voltage array)
+    """
+    system = MNASystem(netlist)
+    steps = int(math.ceil(tstop / tstep))
+    times = np.linspace(0.0, steps * tstep, steps + 1)
+    h = times[1] - times[0] if steps else tstep
+    waves = np.array([component.waveform(times) for component, _, _ in system.sources]).reshape(len(system.sources), len(times))
+    b = system.source_vector(waves).astype(float)
+
+    # (G + 2C/h) x[n+1] = (2C/h - G) x[n] + b[n] + b[n+1]; factor once, reuse every step
+    lu = splu(system.matrix(1.0, 2.0 / h))
+    x = np.empty((system.size, len(times)))
+    x[:, 0] = splu(system.matrix()).solve(b[:, 0])
+    if system.size <= DENSE_TRAN_SIZE:
+        # x[n+1] = M x[n] + r[n], with every r[n] solved in one call
+        step = lu.solve(system.matrix(-1.0, 2.0 / h).toarray())
+        forcing = lu.solve(b[:, :-1] + b[:, 1:]) if steps else b[:, :0]
+        for n in range(steps):
+            x[:, n + 1] = step @ x[:, n] + forcing[:, n]
+    else:
+        history = system.matrix(-1.0, 2.0 / h).tocsr()
+        for n in range(steps):
+            x[:, n + 1] = lu.solve(history @ x[:, n] + b[:, n] + b[:, n + 1])
+
+    keep = times >= tstart
+    return times[keep], system.voltages(x[:, keep])
+
+
+def simulate(text):
+    """
+    Run the .ac and .tran directives of a schematic
+
+    Args:
+        text (str): .asc content
+
+    Returns:
+        dict: 'netlist' plus 'ac' -> (freqs, voltages) and/or 'tran' -> (times, voltages)
+    """
+    return simulate_netlist(parse_asc(text))
+
+
+def simulate_netlist(netlist):
+    """
+    Run the .ac and .tran directives of a netlist
+
+    The transient step is the directive's, but at most 1/TRAN_STEPS_PER_PERIOD
+    of the fastest source's period or edge time; a 25 kHz sine sampled every
+    0.1 ms would otherwise land on its zero crossings and come out flat.
+
+    Returns:
+        dict: 'netlist' plus 'ac' -> (freqs, voltages) and/or 'tran' -> (times, voltages)
+    """
+    from circuit_preview import ac_frequencies, tran_times
+
+    results = {'netlist': netlist}
+    for directive in netlist.directives:
+        command = directive.split()[0].lower()
+        if command == '.ac':
+            freqs = ac_frequencies(directive)
+            results['ac'] = (freqs, ac_analysis(netlist, freqs))
+        elif command == '.tran':
+            times = tran_times(directive)
+            step = times[1] - times[0] if len(times) > 1 else times[-1]
+            scale = netlist.time_scale()
+            if scale:
+                step = min(step, scale / TRAN_STEPS_PER_PERIOD)
+            results['tran'] = transient_analysis(netlist, times[-1], step, times[0])
+    return results
+
+
+def write_results(path, analysis, result):
+    """
+    Save one analysis as a binary .raw file, as LTspice would
+
+    Args:
+        path (str): Output .raw file
+        analysis (str): 'ac' or 'tran'
+        result (tuple): (sweep values, node name -> voltages) from simulate_netlist
+
+    Returns:
+        int: Points written
+    """
+    from circuit_raw import write_raw
+
+    sweep, voltages = result
+    nodes = [node for node in voltages if node != GROUND]
+    if analysis == 'ac':
+        plotname, axis, columns = 'AC Analysis', ('frequency', 'frequency'), [np.asarray(sweep, dtype=complex)]
+    else:
+        plotname, axis, columns = 'Transient Analysis', ('time', 'time'), [np.asarray(sweep, dtype=float)]
+    variables = [axis] + [(f'V({node.lower()})', 'voltage') for node in nodes]
+    columns += [voltages[node] for node in nodes]
+    return write_raw(path, plotname, variables, [columns], double=True)
+
+
+def main(argv=None):
+    """
+    Batch mode with ngspice's command line: `python circuit_sim.py -b -r out.raw circuit.net`
+
+    Only the first analysis of the netlist is written, as the .raw format
+    holds one plot per file here.
+    """
+    parser = argparse.ArgumentParser(description="Simulate a SPICE netlist with the built-in MNA solver")
+    parser.add_argument('netlist', help="Netlist from Netlist.to_spice")
+    parser.add_argument('-r', '--raw', required=True, help="Write the results to this .raw file")
+    parser.add_argument('-b', '--batch', action='store_true', help="Accepted for ngspice compatibility")
+    args = parser.parse_args(argv)
+
+    with open(args.netlist, encoding='utf-8') as f:
+        netlist = parse_spice(f.read())
+    results = simulate_netlist(netlist)
+    analysis = next((name for name in (d.split()[0].lower()[1:] for d in netlist.directives)
+                     if name in ('ac', 'tran')), None)
+    if analysis is None:
+        print("Error: no .ac or .tran directive", file=sys.stderr)
+        return 1
+    points = write_results(args.raw, analysis, results[analysis])
+    print(f"{analysis}: {points} points written to {args.raw}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,337 @@
+"""
+Content-addressed circuit store with a searchable SQLite index
+
+Every rendered schematic is stored once, under the SHA-256 of its content:
+CIRCUIT_DIR/store/<first two hex digits>/<hash>.asc. A file is written to a
+temporary name and renamed into place, so readers never see a partial file,
+and a request that renders byte-identical content reuses the existing file.
+Stored files are never modified; an edited circuit is a new entry.
+
+The index (CIRCUIT_DIR/circuits.sqlite3) has three tables:
+- circuits: one row per unique schematic, with its topology and components.
+- circuit_values: one row per numeric value. It is indexed both by
+  (topology, key, value) for range scans and by (hash, key) for per-circuit
+  probes.
+- requests: the commands that produced each schematic.
+
+A search reads matching rows from the value index when a condition is
+selective. Otherwise it walks circuits newest first and probes each one,
+stopping at the limit. Both plans stay fast at hundreds of thousands of
+circuits.
+
+    store = get_store()
+    store.find(topology='band_pass_filter', conditions=[('C1', '<', 1e-6)])
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from circuit_core import CIRCUIT_DIR, cache_key, parse_spice_value
+from circuit_metrics import metrics
+
+# Save circuits into the store; 0 writes one circuit_<timestamp>.asc per request as before
+CIRCUIT_STORE = os.getenv('CIRCUIT_STORE', '1') == '1'
+
+STORE_DIR = os.getenv('CIRCUIT_STORE_DIR', os.path.join(CIRCUIT_DIR, 'store'))
+STORE_INDEX_PATH = os.path.join(CIRCUIT_DIR, 'circuits.sqlite3')
+
+# A condition matching fewer index rows than this drives a search from the
+# value index; broader ones are checked per circuit while walking newest first
+FIND_SELECTIVE_ROWS = 2000
+
+# Comparison operators accepted by find(), mapped to SQL
+OPERATORS = {'<': '<', '<=': '<=', '>': '>', '>=': '>=', '=': '=', '==': '=', '!=': '!='}
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS circuits ("
+    "hash TEXT PRIMARY KEY, topology TEXT NOT NULL, components TEXT NOT NULL, "
+    "size INTEGER NOT NULL, created REAL NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS circuits_topology ON circuits (topology, created)",
+    "CREATE INDEX IF NOT EXISTS circuits_created ON circuits (created)",
+    "CREATE TABLE IF NOT EXISTS circuit_values ("
+    "hash TEXT NOT NULL, key TEXT NOT NULL, topology TEXT NOT NULL, value REAL NOT NULL, "
+    "PRIMARY KEY (hash, key)) WITHOUT ROWID",
+    "CREATE INDEX IF NOT EXISTS circuit_values_range ON circuit_values (topology, key, value)",
+    "CREATE INDEX IF NOT EXISTS circuit_values_key ON circuit_values (key, value)",
+    "CREATE TABLE IF NOT EXISTS requests ("
+    "command_key TEXT NOT NULL, hash TEXT NOT NULL, command TEXT NOT NULL, "
+    "count INTEGER NOT NULL, last_used REAL NOT NULL, PRIMARY KEY (command_key, hash))",
+    "CREATE INDEX IF NOT EXISTS requests_hash ON requests (hash)",
+)
+
+
+def content_hash(schematic_content):
+    """
+    Hash that names a schematic in the store
+
+    Args:
+        schematic_content (str): LTspice schematic content
+
+    Returns:
+        str: Hex SHA-256 of the UTF-8 content
+    """
+    return hashlib.sha256(schematic_content.encode('utf-8')).hexdigest()
+
+
+def parse_condition(text):
+    """
+    Parse a value condition such as "C1<1u" or "R >= 4.7k"
+
+    Args:
+        text (str): Key, operator and SPICE-style value
+
+    Returns:
+        tuple: (key, operator, value in base units)
+
+    Raises:
+        ValueError: If there is no operator or the value is not numeric
+    """
+    for operator in sorted(OPERATORS, key=len, reverse=True):
+        if operator in text:
+            key, value = text.split(operator, 1)
+            number = parse_spice_value(value.strip())
+            if not isinstance(number, (int, float)):
+                raise ValueError(f"not a number in condition {text!r}")
+            return key.strip(), operator, number
+    raise ValueError(f"no comparison operator in condition {text!r}")
+
+
+class CircuitStore:
+    """
+    Deduplicated schematic files plus their index
+
+    Safe to share between threads. Each process opens its own index
+    connection, so batch render workers can write to the same store.
+
+    Args:
+        root (str): Directory for the content-addressed files
+        index_path (str): SQLite index file
+    """
+
+    def __init__(self, root=STORE_DIR, index_path=STORE_INDEX_PATH):
+        self.root = root
+        self.index_path = index_path
+        self._lock = threading.Lock()
+        self._db = None
+        self._pid = None
+
+    def _connect(self):
+        """Open the index on first use, and again after a fork"""
+        if self._db is None or self._pid != os.getpid():
+            os.makedirs(os.path.dirname(self.index_path) or '.', exist_ok=True)
+            self._db = sqlite3.connect(self.index_path, check_same_thread=False, timeout=30)
+            # WAL lets readers run alongside the writer; NORMAL skips the
+            # fsync per commit, which the files themselves do not need either
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            for statement in _SCHEMA:
+                self._db.execute(statement)
+            self._db.commit()
+            self._pid = os.getpid()
+        return self._db
+
+    def path_for(self, digest):
+        """Path of the file holding the schematic with this hash"""
+        return os.path.join(self.root, digest[:2], digest + '.asc')
+
+    def contains(self, path):
+        """Whether a path is a file of this store (and so must not be modified)"""
+        return bool(path) and os.path.dirname(os.path.dirname(os.path.abspath(path))) == os.path.abspath(self.root)
+
+    def put(self, schematic_content, components=None, command=None):
+        """
+        Store a schematic, reusing the file if identical content exists
+
+        Args:
+            schematic_content (str): LTspice schematic content
+            components (dict): Components it was rendered from, for the index
+            command (str): Request that produced it
+
+        Returns:
+            dict: hash, path and created (False when the file already existed)
+        """
+        digest = content_hash(schematic_content)
+        path = self.path_for(digest)
+        created = not os.path.exists(path)
+        if created:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+            try:
+                with open(temp_path, 'x') as f:
+                    f.write(schematic_content)
+                # Concurrent writers of the same content rename identical bytes
+                os.replace(temp_path, path)
+            except BaseException:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                raise
+        metrics.increment('store_write' if created else 'store_dedup')
+        self._index(digest, schematic_content, components or {}, command)
+        return {'hash': digest, 'path': path, 'created': created}
+
+    def _index(self, digest, schematic_content, components, command):
+        """Record a stored schematic, its values and the request in the index"""
+        now = time.time()
+        topology = components.get('topology', 'unknown')
+        try:
+            with self._lock:
+                db = self._connect()
+                inserted = db.execute(
+                    "INSERT OR IGNORE INTO circuits (hash, topology, components, size, created) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (digest, topology, json.dumps(components, default=str),
+                     len(schematic_content.encode('utf-8')), now)
+                ).rowcount
+                if inserted:
+                    db.executemany(
+                        "INSERT OR IGNORE INTO circuit_values (hash, key, topology, value) VALUES (?, ?, ?, ?)",
+                        [(digest, key, topology, float(value)) for key, value in components.items()
+                         if isinstance(value, (int, float)) and not isinstance(value, bool)]
+                    )
+                if command:
+                    db.execute(
+                        "INSERT INTO requests (command_key, hash, command, count, last_used) VALUES (?, ?, ?, 1, ?) "
+                        "ON CONFLICT (command_key, hash) DO UPDATE SET count = count + 1, last_used = excluded.last_used",
+                        (cache_key(command), digest, command, now)
+                    )
+                db.commit()
+        except sqlite3.Error as e:
+            # The file is safely stored; only its index entry is missing
+            print(f"Warning: circuit index write failed: {e}")
+
+    def _record(self, row):
+        """Turn a circuits row into a result dict"""
+        digest, topology, components, size, created = row
+        return {'hash': digest, 'path': self.path_for(digest), 'topology': topology,
+                'components': json.loads(components), 'size': size, 'created': created}
+
+    def get(self, digest):
+        """
+        Look up one stored schematic
+
+        Args:
+            digest (str): Content hash
+
+        Returns:
+            dict: hash, path, topology, components, size and created, or None
+        """
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT hash, topology, components, size, created FROM circuits WHERE hash = ?", (digest,)
+            ).fetchone()
+        return self._record(row) if row else None
+
+    def lookup(self, command):
+        """
+        Most recently used schematic for an identical request
+
+        Commands match after cache_key() normalization, so "10k ohm" and
+        "10 kilo ohms" are the same request.
+
+        Args:
+            command (str): Recognized speech or typed command
+
+        Returns:
+            dict: As get(), or None
+        """
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT c.hash, c.topology, c.components, c.size, c.created FROM requests r "
+                "JOIN circuits c ON c.hash = r.hash WHERE r.command_key = ? ORDER BY r.last_used DESC LIMIT 1",
+                (cache_key(command),)
+            ).fetchone()
+        return self._record(row) if row else None
+
+    def find(self, topology=None, conditions=(), command=None, limit=100):
+        """
+        Search stored circuits
+
+        Args:
+            topology (str): Only this topology
+            conditions (iterable): (key, operator, value) tuples, all of
+                which must hold, e.g. [('C1', '<', 1e-6)]
+            command (str): Substring of a command that produced the circuit
+            limit (int): Maximum number of results, newest first
+
+        Returns:
+            list: Dicts as returned by get()
+
+        Raises:
+            ValueError: For an unknown operator
+        """
+        sql = ["SELECT hash, topology, components, size, created FROM circuits c WHERE 1 = 1"]
+        params = []
+        selective = False
+        with self._lock:
+            db = self._connect()
+            for key, operator, value in conditions:
+                if operator not in OPERATORS:
+                    raise ValueError(f"unknown operator {operator!r}")
+                match = f"key = ? AND value {OPERATORS[operator]} ?"
+                match_params = [key, float(value)]
+                if topology:
+                    match = "topology = ? AND " + match
+                    match_params.insert(0, topology)
+                # Count at most FIND_SELECTIVE_ROWS matches to pick the plan
+                matches = db.execute(
+                    f"SELECT COUNT(*) FROM (SELECT 1 FROM circuit_values WHERE {match} LIMIT ?)",
+                    match_params + [FIND_SELECTIVE_ROWS]
+                ).fetchone()[0]
+                if matches < FIND_SELECTIVE_ROWS:
+                    sql.append(f"AND hash IN (SELECT hash FROM circuit_values WHERE {match})")
+                    params += match_params
+                    selective = True
+                else:
+                    sql.append("AND EXISTS (SELECT 1 FROM circuit_values v WHERE v.hash = c.hash "
+                               f"AND v.key = ? AND v.value {OPERATORS[operator]} ?)")
+                    params += [key, float(value)]
+            if command:
+                # Escape LIKE's wildcards so '%' and '_' in the text match themselves
+                sql.append("AND hash IN (SELECT hash FROM requests WHERE command LIKE ? ESCAPE '\\')")
+                escaped = command.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+                params.append(f"%{escaped}%")
+            # The unary plus keeps SQLite from walking the topology or created
+            # index when the few matching hashes should drive the query
+            if topology:
+                sql.append("AND +topology = ?" if selective else "AND topology = ?")
+                params.append(topology)
+            sql.append("ORDER BY +created DESC LIMIT ?" if selective else "ORDER BY created DESC LIMIT ?")
+            params.append(limit)
+            rows = db.execute(' '.join(sql), params).fetchall()
+        return [self._record(row) for row in rows]
+
+    def stats(self):
+        """
+        Size of the store
+
+        Returns:
+            dict: circuits, requests (total, counting repeats) and bytes stored
+        """
+        with self._lock:
+            db = self._connect()
+            circuits, size = db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM circuits").fetchone()
+            requests = db.execute("SELECT COALESCE(SUM(count), 0) FROM requests").fetchone()[0]
+        return {'circuits': circuits, 'requests': requests, 'bytes': size}
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """
+    Return the shared store under CIRCUIT_DIR, creating it on first use
+
+    Returns:
+        CircuitStore: The shared store
+    """
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = CircuitStore()
+    return _store
@@ -0,0 +1,265 @@
+"""
+Component-value synthesis from frequency targets
+
+Given a topology and a target (cutoff for low/high-pass filters, band edges
+or center frequency and bandwidth for the band-pass filter), every
+combination of standard E-series values is scored in one vectorized NumPy
+pass and the best-matching component sets are returned, ranked by error.
+
+The band-pass search first keeps the best candidates for each RC section
+and then scores all pairs of sections with the exact loaded response, so
+the four-component search stays in the millisecond range.
+"""
+import numpy as np
+
+E12 = (1.0, 1.2, 1.5, 1.8, 2.2, 2.7, 3.3, 3.9, 4.7, 5.6, 6.8, 8.2)
+E24 = (1.0, 1.1, 1.2, 1.3, 1.5, 1.6, 1.8, 2.0, 2.2, 2.4, 2.7, 3.0,
+       3.3, 3.6, 3.9, 4.3, 4.7, 5.1, 5.6, 6.2, 6.8, 7.5, 8.2, 9.1)
+# E96 follows the geometric series exactly when rounded to three digits
+E96 = tuple(round(10 ** (i / 96), 2) for i in range(96))
+
+E_SERIES = {'E12': E12, 'E24': E24, 'E96': E96}
+
+# Default search ranges and the impedance level preferred among equal matches
+R_RANGE = (10.0, 1e6)
+C_RANGE = (1e-12, 1e-4)
+PREFERRED_IMPEDANCE = 1e4
+
+# Candidates kept per RC section before the band-pass pair search
+SECTION_CANDIDATES = 128
+
+# Relative miss above which a parsed design target counts as out of reach
+TARGET_TOLERANCE = 0.1
+
+
+def standard_values(series, low, high):
+    """
+    All values of an E-series between two limits
+
+    Args:
+        series (str): 'E12', 'E24' or 'E96'
+        low (float): Smallest allowed value
+        high (float): Largest allowed value
+
+    Returns:
+        np.ndarray: Sorted standard values in [low, high]
+    """
+    mantissas = np.asarray(E_SERIES[series.upper()])
+    decades = np.arange(np.floor(np.log10(low)), np.ceil(np.log10(high)) + 1)
+    values = (mantissas[None, :] * 10.0 ** decades[:, None]).ravel()
+    # Round away binary noise so 4.7 * 1e-9 prints as 4.7e-09
+    values = np.array([float('%.3g' % v) for v in values])
+    return values[(values >= low * (1 - 1e-9)) & (values <= high * (1 + 1e-9))]
+
+
+def _ranked(scores, count):
+    """Flat indices of the `count` lowest scores, best first"""
+    count = min(count, scores.size)
+    flat = scores.ravel()
+    best = np.argpartition(flat, count - 1)[:count]
+    return best[np.argsort(flat[best])]
+
+
+def _rc_grid(r_values, c_values, target, impedance):
+    """Log error of 1/(2πRC) against target for every R, C pair, with an impedance tie-break"""
+    corner = 1 / (2 * np.pi * r_values[:, None] * c_values[None, :])
+    error = np.abs(np.log(corner / target))
+    return corner, error, error + 1e-6 * np.abs(np.log(r_values / impedance))[:, None]
+
+
+def band_edges(center=None, bandwidth=None, f_low=None, f_high=None):
+    """
+    Resolve band-pass targets to -3 dB edge frequencies
+
+    Returns:
+        tuple: (f_low, f_high) in Hz
+    """
+    if f_low is not None and f_high is not None:
+        return min(f_low, f_high), max(f_low, f_high)
+    if center is None or bandwidth is None:
+        raise ValueError("Band-pass synthesis needs f_low and f_high, or center and bandwidth")
+    half = np.sqrt(bandwidth ** 2 + 4 * center ** 2)
+    return (half - bandwidth) / 2, (half + bandwidth) / 2
+
+
+def bandpass_response(r1, r2, c1, c2):
+    """
+    Exact metrics of the loaded RC band-pass (C2/R2 high-pass, then R1/C1 low-pass)
+
+    H(s) = s R2 C2 / (s² R1 R2 C1 C2 + s (R2 C2 + R2 C1 + R1 C1) + 1)
+
+    Returns:
+        dict: center, bandwidth, f_low, f_high in Hz and peak gain; broadcasts over inputs
+    """
+    a = r1 * r2 * c1 * c2
+    b = r2 * c2 + r2 * c1 + r1 * c1
+    w0 = 1 / np.sqrt(a)
+    bw = b / a
+    root = np.sqrt(bw ** 2 + 4 * w0 ** 2)
+    return {
+        'center': w0 / (2 * np.pi),
+        'bandwidth': bw / (2 * np.pi),
+        'f_low': (root - bw) / (4 * np.pi),
+        'f_high': (root + bw) / (4 * np.pi),
+        'gain': r2 * c2 / b,
+    }
+
+
+def synthesize(topology, cutoff=None, center=None, bandwidth=None, f_low=None, f_high=None,
+               fixed=None, r_series='E24', c_series='E12', r_range=R_RANGE, c_range=C_RANGE,
+               impedance=PREFERRED_IMPEDANCE, top=5):
+    """
+    Find standard component values that meet a frequency target
+
+    Args:
+        topology (str): low_pass_filter, high_pass_filter or band_pass_filter
+        cutoff (float): -3 dB frequency in Hz for low/high-pass filters
+        center (float): Band-pass center frequency in Hz (with bandwidth)
+        bandwidth (float): Band-pass -3 dB bandwidth in Hz (with center)
+        f_low (float): Band-pass lower -3 dB edge in Hz (with f_high)
+        f_high (float): Band-pass upper -3 dB edge in Hz (with f_low)
+        fixed (dict): Component values that are already chosen, e.g. {'R': 10e3}
+        r_series (str): E-series for resistors
+        c_series (str): E-series for capacitors
+        r_range (tuple): (min, max) resistance, e.g. to respect impedance limits
+        c_range (tuple): (min, max) capacitance
+        impedance (float): Preferred resistance when several sets match equally
+        top (int): Number of candidates to return
+
+    Returns:
+        list: Component dicts ranked by relative error, each with 'topology',
+            the component values, the achieved frequencies and 'error'
+    """
+    fixed = fixed or {}
+    r_values = standard_values(r_series, *r_range)
+    c_values = standard_values(c_series, *c_range)
+
+    def choices(name, values):
+        return np.array([float(fixed[name])]) if fixed.get(name) is not None else values
+
+    if topology in ('low_pass_filter', 'high_pass_filter', 'basic_circuit'):
+        if cutoff is None:
+            raise ValueError(f"{topology} synthesis needs a cutoff frequency")
+        r, c = choices('R', r_values), choices('C', c_values)
+        corner, error, score = _rc_grid(r, c, cutoff, impedance)
+        candidates = []
+        for flat in _ranked(score, top):
+            i, j = np.unravel_index(flat, score.shape)
+            candidates.append({
+                'topology': topology,
+                'R': float(r[i]),
+                'C': float(c[j]),
+                'cutoff': float(corner[i, j]),
+                'error': float(np.expm1(error[i, j])),
+            })
+        return candidates
+
+    if topology != 'band_pass_filter':
+        raise ValueError(f"No synthesis rule for topology '{topology}'")
+
+    low, high = band_edges(center, bandwidth, f_low, f_high)
+
+    # Unloaded section time constants: tau1 * tau2 = a and tau1 + tau2 = b from
+    # the target denominator. The edges are further apart than the section
+    # corners, so aiming each section at its edge would overshoot. A Q above
+    # 1/2 is out of reach for a passive RC band-pass; aim for the closest.
+    w_low, w_high = 2 * np.pi * low, 2 * np.pi * high
+    a = 1 / (w_low * w_high)
+    b = (w_high - w_low) * a
+    spread = np.sqrt(max(b ** 2 - 4 * a, 0.0))
+    tau_hp, tau_lp = (b + spread) / 2, (b - spread) / 2
+
+    # Best values for each section on its own: R2/C2 sets the low edge and
+    # R1/C1 the high edge; loading between them is handled in the pair search
+    sections = []
+    for r_name, c_name, tau in (('R2', 'C2', tau_hp), ('R1', 'C1', tau_lp)):
+        r, c = choices(r_name, r_values), choices(c_name, c_values)
+        _, _, score = _rc_grid(r, c, 1 / (2 * np.pi * tau), impedance)
+        i, j = np.unravel_index(_ranked(score, SECTION_CANDIDATES), score.shape)
+        sections.append((r[i], c[j]))
+    (r2, c2), (r1, c1) = sections
+    r2, c2, r1, c1 = r2[:, None], c2[:, None], r1[None, :], c1[None, :]
+
+    response = bandpass_response(r1, r2, c1, c2)
+    error = np.hypot(np.log(response['f_low'] / low), np.log(response['f_high'] / high))
+    # Among equal matches prefer less loss (a lightly loaded high-pass
+    # section), then resistors near the preferred impedance
+    score = error - 1e-6 * np.log(response['gain']) \
+        + 1e-9 * (np.abs(np.log(r1 / impedance)) + np.abs(np.log(r2 / impedance)))
+
+    candidates = []
+    for flat in _ranked(score, top):
+        i, j = np.unravel_index(flat, score.shape)
+        candidates.append({
+            'topology': topology,
+            'R1': float(r1[0, j]),
+            'R2': float(r2[i, 0]),
+            'C1': float(c1[0, j]),
+            'C2': float(c2[i, 0]),
+            'f_low': float(response['f_low'][i, j]),
+            'f_high': float(response['f_high'][i, j]),
+            'center': float(response['center'][i, j]),
+            'error': float(np.expm1(error[i, j])),
+        })
+    return candidates
+
+
+def _describe_miss(topology, targets, best, fixed):
+    """Explain why a target is out of reach and what the closest candidate achieves"""
+    if topology != 'band_pass_filter':
+        return (f"A cutoff of {targets['cutoff']:.4g} Hz is out of reach with {fixed}; "
+                f"the closest is {best['cutoff']:.4g} Hz")
+    low, high = band_edges(**targets)
+    achieved = f"the closest is {best['f_low']:.4g} Hz to {best['f_high']:.4g} Hz"
+    # An RC band-pass has real poles, so its Q = sqrt(f_low f_high) / bandwidth stays below 1/2
+    q = np.sqrt(low * high) / (high - low)
+    if q > 0.5:
+        return (f"A passive RC band-pass cannot reach {low:.4g} Hz to {high:.4g} Hz (Q {q:.2g} > 0.5); "
+                f"{achieved}. This band needs an active filter")
+    return f"The band {low:.4g} Hz to {high:.4g} Hz is out of reach with {fixed}; {achieved}"
+
+
+def apply_targets(components, tolerance=None, **options):
+    """
+    Fill in component values from the frequency targets in a components dict
+
+    Targets are the keys 'cutoff' (low/high-pass) and 'f_low'/'f_high' or
+    'center'/'bandwidth' (band-pass). Values the command already gave are
+    kept and only the missing ones are chosen. The best candidate's values
+    are merged in and its relative error is stored as 'target_error'.
+
+    Args:
+        components (dict): Parsed components
+        tolerance (float): Largest acceptable relative error (default: no limit)
+        **options: Passed on to synthesize (series, ranges, impedance)
+
+    Returns:
+        dict: A new components dict, unchanged if there is nothing to solve
+
+    Raises:
+        ValueError: If the best candidate misses the target by more than tolerance
+    """
+    topology = components.get('topology')
+    if topology == 'band_pass_filter':
+        keys = ('R1', 'R2', 'C1', 'C2')
+        targets = {name: components.get(name) for name in ('center', 'bandwidth', 'f_low', 'f_high')}
+        solvable = (targets['f_low'] is not None and targets['f_high'] is not None) or \
+            (targets['center'] is not None and targets['bandwidth'] is not None)
+    elif topology in ('low_pass_filter', 'high_pass_filter'):
+        keys = ('R', 'C')
+        targets = {'cutoff': components.get('cutoff')}
+        solvable = targets['cutoff'] is not None
+    else:
+        return dict(components)
+
+    fixed = {key: components[key] for key in keys if components.get(key) is not None}
+    if not solvable or len(fixed) == len(keys):
+        return dict(components)
+
+    best = synthesize(topology, fixed=fixed, top=1, **targets, **options)[0]
+    if tolerance is not None and best['error'] > tolerance:
+        raise ValueError(_describe_miss(topology, targets, best, fixed))
+    result = dict(components)
+    result.update({key: best[key] for key in keys})
+    result['target_error'] = best['error']
+    return result
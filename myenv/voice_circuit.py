@@ -1,538 +1,482 @@
-import speech_recognition as sr
+"""
+Gradio UI for the voice-controlled LTspice circuit designer
+
+Run with `python voice_circuit.py`. Gradio, pydub and speech_recognition are
+imported only when the UI is built or audio is processed; parsing, rendering
+and writing live in circuit_core.
+
+The handlers are generators. Each yields an update as soon as a stage
+finishes: the transcript, then the parsed components, then the schematic
+and preview, then the saved file and launch result. Each browser session
+keeps a CircuitSession, so follow-ups such as "make the resistor 10k"
+patch the last circuit's file instead of creating a new one.
+"""
 import os
-import google.generativeai as genai
-from pydub import AudioSegment
-import gradio as gr
-import time
-import subprocess
+import queue
+import threading
+
+from circuit_audio import LiveTranscriber, prepare_audio, recognize
+from circuit_session import CircuitSession, is_undo_command
+from circuit_metrics import METRICS_PORT, metrics, profile_request, start_metrics_server
+from circuit_core import (
+    check_ltspice_installation,
+    ensure_circuit_dir,
+    generate_circuit_schematic,
+    open_in_ltspice,
+    parse_command_with_gemini_v2,
+    save_circuit,
+)
 
-# Configure Gemini API
-GEMINI_API_KEY = ''
-genai.configure(api_key=GEMINI_API_KEY)
+# Requests handled concurrently; STT and Gemini calls are network-bound
+UI_WORKERS = int(os.getenv('UI_WORKERS', '8'))
 
-# Initialize Gemini model
-model = genai.GenerativeModel('gemini-2.0-flash')
+# Requests allowed to wait in the queue before new ones are rejected
+UI_QUEUE_SIZE = int(os.getenv('UI_QUEUE_SIZE', '64'))
 
-# LTspice path configuration
-LTSPICE_PATH = os.getenv('LTSPICE_PATH', r'C:\Users\antony brijesh\AppData\Roaming\Microsoft\Windows\Start Menu\Programs\LTspice\LTspice.lnk')
+# Show the collapsible pipeline stats panel
+UI_STATS_PANEL = os.getenv('UI_STATS_PANEL', '1') == '1'
 
-# Create a dedicated directory for circuit files
-CIRCUIT_DIR = os.path.join(os.path.expanduser('~'), 'ltspice_circuits')
-os.makedirs(CIRCUIT_DIR, exist_ok=True)
-print(f"Using circuit directory: {CIRCUIT_DIR}")
+# Offer live recording, recognized phrase by phrase while the user speaks
+UI_LIVE_STT = os.getenv('UI_LIVE_STT', '1') == '1'
 
-def check_ltspice_installation():
+def preview_components(components):
     """
-    Check if LTspice is installed and accessible
+    Build the analytic Bode/transient preview for a parsed circuit
+
+    Args:
+        components (dict): Parsed components
+
+    Returns:
+        Figure: Preview plot, or None if the topology has no analytic model
     """
-    global LTSPICE_PATH
-    
-    if not os.path.exists(LTSPICE_PATH):
-        # Try alternative common installation paths
-        alt_paths = [
-            r'C:\Program Files\LTspice\XVII\XVIIx64.exe',
-            r'C:\Program Files (x86)\LTspice\XVII\XVIIx64.exe',
-            r'C:\Program Files\LTspice\XVII\XVII.exe',
-            r'C:\Program Files (x86)\LTspice\XVII\XVII.exe',
-            r'C:\Users\antony brijesh\AppData\Roaming\Microsoft\Windows\Start Menu\Programs\LTspice\LTspice.lnk'
-        ]
-        
-        for path in alt_paths:
-            if os.path.exists(path):
-                LTSPICE_PATH = path
-                return True, f"LTspice found at {path}"
-        
-        return False, f"LTspice not found. Please install LTspice or set the LTSPICE_PATH environment variable."
-    return True, "LTspice installation found."
+    try:
+        from circuit_preview import preview_figure
+        return preview_figure(components)
+    except Exception as e:
+        print(f"Warning: preview failed: {e}")
+        return None
 
-def generate_circuit_schematic(components):
+def stream_updates(run, *args):
     """
-    Generate LTspice schematic from component specifications
-    
+    Run a handler body on its own thread and yield the updates it emits
+
+    Gradio advances a generator handler from whichever worker thread is free,
+    so the stages run on one dedicated thread instead. That keeps the
+    request's spans and profile on a single thread, and lets the next stage
+    start before the previous update has been delivered.
+
     Args:
-        components (dict): Dictionary containing component specifications
-            - topology: Circuit topology (basic_circuit, low_pass_filter, high_pass_filter, etc.)
-            - R: Resistor value in ohms
-            - C: Capacitor value in farads
-            - L: Inductor value in henries
-            - V: Voltage source value in volts
-            - V_type: Type of voltage source ('DC', 'AC', 'SINE', 'PULSE')
-            - Component counts (R_count, C_count, etc.)
-            - Special components (op-amps, transistors, diodes)
-    
-    Returns:
-        str: LTspice schematic content
+        run (callable): Called as run(emit, *args); emit(update) publishes a
+            (status, preview figure, schematic) tuple
+        *args: Handler arguments
+
+    Yields:
+        tuple: The emitted updates, in order
     """
-    # Check if we're using a complex circuit topology
-    topology = components.get('topology', 'basic_circuit')
-    
-    # List of topologies handled by generate_complex_circuit_netlist
-    complex_topologies = [
-        'common_emitter', 'boost_converter', 'astable_multivibrator',
-        'wien_oscillator', 'full_bridge_rectifier'
-    ]
-    
-    # If this is a complex topology, use the dedicated function
-    if topology in complex_topologies:
-        return generate_complex_circuit_netlist(topology, components)
-    
-    # Helper to format values as integers if possible
-    def fmt(val):
-        if isinstance(val, float) and val.is_integer():
-            return str(int(val))
-        if isinstance(val, int):
-            return str(val)
+    updates = queue.Queue()
+    done = object()
+
+    def target():
         try:
-            fval = float(val)
-            if fval.is_integer():
-                return str(int(fval))
-        except Exception:
-            pass
-        return str(val)
-
-    # Get the topology or default to basic circuit
-    topology = components.get('topology', 'basic_circuit')
-    
-    # Initialize schematic
-    schematic = []
-    schematic.append("Version 4.1")
-    schematic.append("SHEET 1 880 680")
-    
-    # Generate different circuit types based on topology
-    if topology == 'low_pass_filter':
-        # RC Low-Pass Filter based on reference file
-        schematic.append("WIRE 208 48 80 48")
-        schematic.append("WIRE 400 48 288 48")
-        schematic.append("WIRE 80 112 80 48")
-        schematic.append("WIRE 400 112 400 48")
-        schematic.append("WIRE 80 272 80 192")
-        schematic.append("WIRE 400 272 400 176")
-        schematic.append("FLAG 80 272 0")
-        schematic.append("FLAG 400 272 0")
-        schematic.append("FLAG 400 48 OUT")
-        schematic.append("SYMBOL voltage 80 96 R0")
-        schematic.append("WINDOW 123 24 124 Left 2")
-        schematic.append("WINDOW 39 0 0 Left 2")
-        schematic.append("SYMATTR Value2 AC 1")
-        schematic.append("SYMATTR InstName Vin")
-        v_type = components.get('V_type', 'SINE')
-        if v_type == 'SINE':
-            schematic.append(f"SYMATTR Value {v_type}(1 {fmt(components.get('V', 1))} {fmt(components.get('freq', 25000))})")
-        else:
-            schematic.append(f"SYMATTR Value {fmt(components.get('V', 1))}")
-        schematic.append("SYMBOL res 304 32 R90")
-        schematic.append("WINDOW 0 0 56 VBottom 2")
-        schematic.append("WINDOW 3 32 56 VTop 2")
-        schematic.append("SYMATTR InstName R1")
-        schematic.append(f"SYMATTR Value {fmt(components.get('R', 1))}")
-        schematic.append("SYMBOL cap 384 112 R0")
-        schematic.append("SYMATTR InstName C1")
-        schematic.append(f"SYMATTR Value {fmt(components.get('C', 100e-6))}")
-        schematic.append("TEXT 72 328 Left 2 !.tran 0 0.1 0 0.0001")
-        schematic.append("TEXT 72 352 Left 2 !.ac dec 100 1 100k")
-    elif topology == 'high_pass_filter':
-        # RC High-Pass Filter based on reference file
-        schematic.append("WIRE 192 48 80 48")
-        schematic.append("WIRE 352 48 256 48")
-        schematic.append("WIRE 464 48 352 48")
-        schematic.append("WIRE 80 112 80 48")
-        schematic.append("WIRE 352 112 352 48")
-        schematic.append("WIRE 80 272 80 192")
-        schematic.append("WIRE 352 272 352 192")
-        schematic.append("FLAG 80 272 0")
-        schematic.append("FLAG 352 272 0")
-        schematic.append("FLAG 464 48 Output_high_pass")
-        schematic.append("IOPIN 464 48 Out")
-        schematic.append("SYMBOL voltage 80 96 R0")
-        schematic.append("WINDOW 123 24 124 Left 2")
-        schematic.append("WINDOW 39 0 0 Left 2")
-        schematic.append("SYMATTR Value2 AC 1")
-        schematic.append("SYMATTR InstName Vin")
-        v_type = components.get('V_type', 'SINE')
-        if v_type == 'SINE':
-            schematic.append(f"SYMATTR Value {v_type}(1 {fmt(components.get('V', 1))} {fmt(components.get('freq', 25000))})")
-        else:
-            schematic.append(f"SYMATTR Value {fmt(components.get('V', 1))}")
-        schematic.append("SYMBOL res 336 96 R0")
-        schematic.append("SYMATTR InstName R1")
-        schematic.append(f"SYMATTR Value {fmt(components.get('R', 1))}")
-        schematic.append("SYMBOL cap 192 64 R270")
-        schematic.append("WINDOW 0 32 32 VTop 2")
-        schematic.append("WINDOW 3 0 32 VBottom 2")
-        schematic.append("SYMATTR InstName C1")
-        schematic.append(f"SYMATTR Value {fmt(components.get('C', 100e-6))}")
-        schematic.append("TEXT 464 264 Left 2 !.ac dec 1000 10 100k")
-    elif topology == 'band_pass_filter':
-        # RC Band-Pass Filter based on reference file
-        schematic.append("WIRE 176 48 80 48")
-        schematic.append("WIRE 352 48 240 48")
-        schematic.append("WIRE 448 48 352 48")
-        schematic.append("WIRE 592 48 528 48")
-        schematic.append("WIRE 80 112 80 48")
-        schematic.append("WIRE 352 112 352 48")
-        schematic.append("WIRE 592 112 592 48")
-        schematic.append("WIRE 80 272 80 192")
-        schematic.append("WIRE 352 272 352 192")
-        schematic.append("WIRE 592 272 592 176")
-        schematic.append("FLAG 80 272 0")
-        schematic.append("FLAG 352 272 0")
-        schematic.append("FLAG 592 272 0")
-        schematic.append("FLAG 592 48 OUT")
-        schematic.append("SYMBOL voltage 80 96 R0")
-        schematic.append("WINDOW 123 24 124 Left 2")
-        schematic.append("WINDOW 39 0 0 Left 2")
-        schematic.append("SYMATTR Value2 AC 1")
-        schematic.append("SYMATTR InstName V1")
-        v_type = components.get('V_type', 'SINE')
-        if v_type == 'SINE':
-            schematic.append(f"SYMATTR Value {v_type}(1 {fmt(components.get('V', 1))} {fmt(components.get('freq', 25000))})")
-        else:
-            schematic.append(f"SYMATTR Value {fmt(components.get('V', 1))}")
-        schematic.append("SYMBOL res 544 32 R90")
-        schematic.append("WINDOW 0 0 56 VBottom 2")
-        schematic.append("WINDOW 3 32 56 VTop 2")
-        schematic.append("SYMATTR InstName R1")
-        schematic.append(f"SYMATTR Value {fmt(components.get('R1', 1))}")
-        schematic.append("SYMBOL cap 576 112 R0")
-        schematic.append("SYMATTR InstName C1")
-        schematic.append(f"SYMATTR Value {fmt(components.get('C1', 100e-6))}")
-        schematic.append("SYMBOL cap 240 32 R90")
-        schematic.append("WINDOW 0 0 32 VBottom 2")
-        schematic.append("WINDOW 3 32 32 VTop 2")
-        schematic.append("SYMATTR InstName C2")
-        schematic.append(f"SYMATTR Value {fmt(components.get('C2', 100e-6))}")
-        schematic.append("SYMBOL res 336 96 R0")
-        schematic.append("SYMATTR InstName R2")
-        schematic.append(f"SYMATTR Value {fmt(components.get('R2', 1))}")
-        schematic.append("TEXT 80 320 Left 2 !.tran 0 0.1 0 0.0001")
-        schematic.append("TEXT 80 344 Left 2 !.ac dec 100 1 100k")
-        
-    else:
-        # Default basic circuit from Draft1.asc
-        schematic.append("WIRE 208 128 64 128")
-        schematic.append("WIRE 64 160 64 128")
-        schematic.append("WIRE 208 240 208 208")
-        schematic.append("WIRE 64 304 64 240")
-        schematic.append("WIRE 208 304 64 304")
-        schematic.append("WIRE 208 320 208 304")
-        schematic.append("FLAG 208 320 0")
-        schematic.append("SYMBOL voltage 64 144 R0")
-        schematic.append("SYMATTR InstName V1")
-        schematic.append("SYMATTR Value 5")
-        schematic.append("SYMBOL res 192 112 R0")
-        schematic.append("SYMATTR InstName R1")
-        schematic.append("SYMATTR Value 1")
-        schematic.append("SYMBOL cap 192 240 R0")
-        schematic.append("SYMATTR InstName C1")
-        schematic.append("SYMATTR Value 2")
-        schematic.append("TEXT 24 344 Left 2 !.tran 10")
-    
-    return '\n'.join(schematic)
+            run(updates.put, *args)
+        finally:
+            updates.put(done)
 
-def parse_command_with_gemini_v2(command):
+    threading.Thread(target=target, name='request', daemon=True).start()
+    while True:
+        update = updates.get()
+        if update is done:
+            return
+        yield update
+
+def _edit_circuit(emit, session, command, lines):
     """
-    Enhanced version of parse_command_with_gemini with support for netlists from Circuits-LTSpice
-    
+    Apply a follow-up to the session's circuit, if it is one
+
     Args:
-        command (str): Recognized speech command
-    
+        emit (callable): Receives (status, preview figure, schematic) tuples
+        session (CircuitSession): The browser session's circuit
+        command (str): Recognized or typed command
+        lines (list): Status lines shown so far
+
     Returns:
-        dict: Component specifications and circuit topology
+        bool: True if the command was handled as an edit or undo
     """
-    prompt = '''
-    Extract circuit component values and topology from this command: '{}'
-    
-    Rules:
-    - Return a Python dictionary with component values and circuit topology
-    - Interpret common units (k, m, u, n, p)
-    - Support circuit topologies from the Circuits-LTSpice repository:
-      * low_pass_filter: RC Low Pass Filter (default R=1, C=100µF)
-      * high_pass_filter: RC High Pass Filter
-      * band_pass_filter: RC Band Pass Filter
-    - Include component specifications appropriate for each topology
-    - For low_pass_filter: R, C, V (sine amplitude), freq (frequency in Hz)
-    - For high_pass_filter: R, C, V
-    - For band_pass_filter: R1, R2, C1, C2, V (sine amplitude), freq (frequency in Hz)
-    
-    Examples:
-    "RC low pass filter with 10 ohm resistor and 47 microfarad capacitor" -> {{"topology": "low_pass_filter", "R": 10, "C": 47e-6, "V": 1, "freq": 25000}}
-    "RC high pass filter with 4.7k resistor and 0.1uF capacitor" -> {{"topology": "high_pass_filter", "R": 4.7e3, "C": 0.1e-6}}
-    "RC band pass filter with 1 ohm resistors and 100uF capacitors" -> {{"topology": "band_pass_filter", "R1": 1, "R2": 1, "C1": 100e-6, "C2": 100e-6, "V": 1, "freq": 25000}}
-    Return ONLY the dictionary for the command, with no additional text or formatting.
-    '''.format(command)
-    
-    try:
-        response = model.generate_content(prompt)
-        # Clean up the response to extract just the dictionary
-        response_text = response.text.strip()
-        
-        # Remove any markdown formatting
-        if "```" in response_text:
-            for line in response_text.split('\n'):
-                if '{' in line and '}' in line:
-                    response_text = line.strip()
-                    break
-            if "```" in response_text:
-                response_text = response_text.replace("```python", "").replace("```", "").strip()
-        
-        # Remove any text before { and after }
-        start = response_text.find('{')
-        end = response_text.rfind('}') + 1
-        if start != -1 and end != 0:
-            response_text = response_text[start:end]
-        
-        # Clean up any remaining non-dictionary text
-        response_text = response_text.strip()
-        
-        print(f"Parsed response: {response_text}")  # Debug print
-        
-        # Safely evaluate the dictionary string
-        components = eval(response_text)
-        
-        # Validate the components
-        if not isinstance(components, dict):
-            raise ValueError("Response is not a dictionary")
-        
-        # Set default frequency for low pass filter if not specified
-        if components.get('topology') == 'low_pass_filter' and 'freq' not in components:
-            components['freq'] = 25000  # Default to 25kHz as in reference
-            
-        # Check for basic circuit case and set topology explicitly
-        if "simple circuit" in command.lower() or "basic circuit" in command.lower():
-            components["topology"] = "basic_circuit"
-        
-        return components
-    except Exception as e:
-        print(f"Gemini parsing error: {e}")
-        print(f"Raw response: {response.text}")  # Debug print
-        # Return default values for basic circuit
-        return {"V": 5, "R": 1, "C": 2, "topology": "basic_circuit"}
+    previous_path = session.path
+    if session.components is not None and is_undo_command(command):
+        result = session.undo()
+        if result is None:
+            return False
+        lines.append("Undid the last edit")
+    else:
+        with metrics.span('parse'):
+            changes = session.read_edit(command)
+        if changes is None:
+            return False
+        print("Edit:", changes)
+        lines.append(f"Changes: {changes}")
+        emit(('\n'.join(["Patching schematic..."] + lines), None, session.schematic))
+        result = session.apply(changes, command)
 
-def open_in_ltspice(circuit_path):
+    patched = result['patched']
+    lines += [f"Topology: {result['components'].get('topology', 'basic_circuit')}",
+              f"Components: {result['components']}",
+              f"Updated: {os.path.basename(result['path'])} "
+              + (f"({patched} value line(s) patched)" if patched is not None else "(rendered again)")]
+    if result['path'] != previous_path:
+        # Stored circuits are immutable, so the edit is a new file to open
+        with metrics.span('launch'):
+            success, message = open_in_ltspice(result['path'])
+        lines.append(message)
+    emit(('\n'.join(["Circuit updated!"] + lines), preview_components(result['components']),
+          result['schematic']))
+    return True
+
+def _build_circuit(emit, command, lines, session=None):
     """
-    Open the circuit file in LTspice
-    
+    Parse, render, write and launch a circuit, emitting an update per stage
+
     Args:
-        circuit_path (str): Path to the circuit file
-    
-    Returns:
-        tuple: (success, message)
+        emit (callable): Receives (status, preview figure, schematic) tuples
+        command (str): Circuit description
+        lines (list): Status lines shown so far, e.g. the transcript
+        session (CircuitSession): Browser session whose last circuit a
+            follow-up edits in place; None always creates a new circuit
     """
+    if session is not None and _edit_circuit(emit, session, command, lines):
+        return
+
+    # Use Gemini to parse command
+    with metrics.span('parse'):
+        components = parse_command_with_gemini_v2(command)
+    print("Parsed components:", components)
+
+    # Get the topology
+    topology = components.get('topology', 'basic_circuit')
+    lines += [f"Topology: {topology}", f"Components: {components}"]
+    emit(('\n'.join(["Rendering schematic..."] + lines), None, ''))
+
+    # Generate circuit schematic based on topology
+    with metrics.span('render'):
+        schematic_content = generate_circuit_schematic(components)
+    figure = preview_components(components)
+    emit(('\n'.join(["Saving and opening in LTspice..."] + lines), figure, schematic_content))
+
+    # Save, reusing the file of an identical earlier schematic
+    with metrics.span('write'):
+        circuit_path = save_circuit(schematic_content, components, command)
+    circuit_filename = os.path.basename(circuit_path)
+
+    print(f"Wrote circuit to: {circuit_path}")
+
+    # Open the circuit in LTspice
+    with metrics.span('launch'):
+        success, message = open_in_ltspice(circuit_path)
+
+    if session is not None:
+        session.remember(components, schematic_content, circuit_path)
+
+    lines += [f"Saved as: {circuit_filename}", message]
+    emit(('\n'.join(["Circuit created successfully!"] + lines), figure, schematic_content))
+
+def _run_audio(emit, audio_path, session=None):
+    """Handler body for process_audio"""
+    import speech_recognition as sr
+
     try:
-        if not os.path.exists(LTSPICE_PATH):
-            return False, f"LTspice executable not found at {LTSPICE_PATH}"
-            
-        if not os.path.exists(circuit_path):
-            return False, f"Circuit file not found: {circuit_path}"
-            
-        # Try to open with shell=True to handle permission issues
-        try:
-            # Use absolute paths
-            abs_ltspice = os.path.abspath(LTSPICE_PATH)
-            abs_circuit = os.path.abspath(circuit_path)
-            
-            # For shortcut files, use the full command string
-            if abs_ltspice.endswith('.lnk'):
-                subprocess.Popen(f'"{abs_ltspice}" "{abs_circuit}"', shell=True)
-            else:
-                # For executable files, try both methods
-                try:
-                    subprocess.Popen([abs_ltspice, abs_circuit], shell=True)
-                except Exception:
-                    subprocess.Popen(f'"{abs_ltspice}" "{abs_circuit}"', shell=True)
-                
-            return True, "Circuit opened in LTspice"
-        except PermissionError:
-            return False, "Permission denied. Please run the script as administrator or check LTspice installation."
-        except Exception as e:
-            return False, f"Error launching LTspice: {str(e)}"
+        with profile_request('audio'), metrics.span('request_audio'):
+            # Decode, downmix to 16 kHz mono and trim silence, all in memory
+            with metrics.span('decode'):
+                audio_data = prepare_audio(audio_path)
+
+            # Use Google Speech Recognition
+            with metrics.span('stt'):
+                command = recognize(audio_data)
+            print("You said:", command)
+            lines = [f"Recognized: {command}"]
+            emit(('\n'.join(["Parsing command..."] + lines), None, ''))
+
+            _build_circuit(emit, command, lines, session)
+
+    except sr.UnknownValueError:
+        metrics.increment('stt_unknown_value')
+        emit(("Could not understand audio", None, ''))
+    except sr.RequestError:
+        metrics.increment('stt_request_error')
+        emit(("Speech recognition service error", None, ''))
     except Exception as e:
-        return False, f"Error opening LTspice: {str(e)}"
+        emit((f"Error: {str(e)}", None, ''))
 
-def process_audio(audio_path):
+def process_audio(audio_path, session=None):
     """
     Process audio file, recognize speech, and create LTspice circuit
     
     Args:
         audio_path (str): Path to audio file
+        session (CircuitSession): Browser session for follow-up edits, if any
     
+    Yields:
+        tuple: (status message, response preview figure or None, schematic text)
+            after recognition, parsing, rendering and launch
+    """
+    yield from stream_updates(_run_audio, audio_path, session)
+
+def _run_live(emit, transcriber, session=None):
+    """Handler body for process_live"""
+    import speech_recognition as sr
+
+    try:
+        with profile_request('live'), metrics.span('request_live'):
+            # Earlier phrases were recognized during the recording
+            with metrics.span('stt'):
+                command = transcriber.finish()
+            print("You said:", command)
+            lines = [f"Recognized: {command}"]
+            emit(('\n'.join(["Parsing command..."] + lines), None, ''))
+
+            _build_circuit(emit, command, lines, session)
+
+    except sr.UnknownValueError:
+        metrics.increment('stt_unknown_value')
+        emit(("Could not understand audio", None, ''))
+    except sr.RequestError:
+        metrics.increment('stt_request_error')
+        emit(("Speech recognition service error", None, ''))
+    except Exception as e:
+        emit((f"Error: {str(e)}", None, ''))
+
+def stream_audio_chunk(chunk, transcriber):
+    """
+    Feed one live microphone chunk to the recording's transcriber
+
+    Args:
+        chunk (tuple): (sample rate, int16 samples) from the streaming microphone
+        transcriber (LiveTranscriber): This recording's transcriber, or None at its start
+
+    Returns:
+        tuple: (transcriber, status message with the phrases heard so far)
+    """
+    if transcriber is None:
+        transcriber = LiveTranscriber()
+    if chunk is not None:
+        sample_rate, samples = chunk
+        transcriber.add_chunk(sample_rate, samples)
+    return transcriber, f"Listening...\nHeard so far: {transcriber.partial()}"
+
+def process_live(transcriber, session=None):
+    """
+    Finish a live recording's transcript and create the LTspice circuit
+
+    Args:
+        transcriber (LiveTranscriber): The recording's transcriber
+        session (CircuitSession): Browser session for follow-up edits, if any
+
+    Yields:
+        tuple: (status message, response preview figure or None, schematic text)
+    """
+    if transcriber is None:
+        yield "No audio recorded", None, ''
+        return
+    yield from stream_updates(_run_live, transcriber, session)
+
+def _run_text(emit, text, session=None):
+    """Handler body for process_text"""
+    try:
+        with profile_request('text'), metrics.span('request_text'):
+            _build_circuit(emit, text, [f"Recognized: {text}"], session)
+    except Exception as e:
+        emit((f"Error: {str(e)}", None, ''))
+
+# Function to process text input
+def process_text(text, session=None):
+    """Process text input to create or edit a circuit, yielding (status message, preview figure, schematic) per stage"""
+    yield from stream_updates(_run_text, text, session)
+
+def plot_results(raw_path=None, session=None):
+    """
+    Plot simulation results: an uploaded .raw file, or the last circuit's
+
+    The last circuit is simulated headlessly first if neither LTspice nor
+    an earlier run left results next to it.
+
     Returns:
-        str: Status message
+        tuple: (status message, results figure or None)
     """
-    r = sr.Recognizer()
-    temp_files = []
+    from circuit_raw import find_raw, results_figure
+
+    circuit_path = session.path if session else None
+    path = raw_path or find_raw(circuit_path)
+    if not path and circuit_path:
+        from circuit_scheduler import simulate_circuit
 
+        try:
+            record = simulate_circuit(circuit_path)
+        except ValueError as e:
+            return f"Could not simulate: {e}", None
+        if record['status'] != 'ok':
+            errors = [r.get('error', r['status']) for r in record.get('results', {}).values()]
+            return f"Simulation {record['status']}: {record.get('error') or '; '.join(errors)}", None
+        path = find_raw(circuit_path)
+    if not path:
+        return "No results yet: create a circuit, or upload an LTspice .raw file", None
     try:
-        # Convert audio file to WAV format
-        audio = AudioSegment.from_file(audio_path)
-        wav_path = os.path.join(CIRCUIT_DIR, "temp.wav")
-        audio.export(wav_path, format="wav")
-        temp_files.append(wav_path)
-
-        # Recognize speech
-        with sr.AudioFile(wav_path) as source:
-            audio_data = r.record(source)
-            try:
-                # Use Google Speech Recognition
-                command = r.recognize_google(audio_data)
-                print("You said:", command)
-
-                # Use Gemini to parse command
-                components = parse_command_with_gemini_v2(command)
-                print("Parsed components:", components)
-
-                # Generate circuit schematic
-                schematic_content = generate_circuit_schematic(components)
-                
-                # Create unique filename with timestamp
-                timestamp = time.strftime("%Y%m%d_%H%M%S")
-                circuit_filename = f"circuit_{timestamp}.asc"
-                circuit_path = os.path.join(CIRCUIT_DIR, circuit_filename)
-                
-                print(f"Writing circuit to: {circuit_path}")
-                print("Circuit content:")
-                print(schematic_content)
-                
-                with open(circuit_path, 'w') as f:
-                    f.write(schematic_content)
-
-                # Open the circuit in LTspice
-                success, message = open_in_ltspice(circuit_path)
-                
-                status_message = f"Circuit created successfully!\nRecognized: {command}\nComponents: {components}\nSaved as: {circuit_filename}\n{message}"
-                return status_message
-
-            except sr.UnknownValueError:
-                return "Could not understand audio"
-            except sr.RequestError:
-                return "Speech recognition service error"
-            except Exception as e:
-                return f"Error: {str(e)}"
-    finally:
-        # Clean up temporary files
-        for file_path in temp_files:
-            try:
-                if os.path.exists(file_path):
-                    os.remove(file_path)
-            except Exception as e:
-                print(f"Warning: Could not delete temporary file {file_path}: {str(e)}")
-
-# Gradio Interface
-with gr.Blocks() as demo:
-    gr.Markdown("# 🎤 Voice-Controlled LTspice Circuit Creator")
+        with metrics.span('plot_results'):
+            figure = results_figure(path)
+    except (OSError, ValueError) as e:
+        return f"Could not read {os.path.basename(path)}: {e}", None
+    return f"Plotted {path}", figure
+
+def pipeline_stats():
+    """Current pipeline metrics for the stats panel and the 'metrics' API endpoint"""
+    snapshot = metrics.snapshot()
+    for summary in snapshot['stages'].values():
+        summary.pop('buckets')
+    for entry in snapshot['slow_requests']:
+        entry.pop('top', None)
+    return snapshot
+
+# Example circuit descriptions
+EXAMPLES = {
+    "Basic Circuit": "simple circuit with 5V, 1 ohm resistor and 2 uF capacitor",
+    "RC Low Pass Filter": "RC low pass filter with 1 ohm resistor and 100 microfarad capacitor at 25 kilohertz",
+    "RC High Pass Filter": "RC high pass filter with 1 ohm resistor and 100 microfarad capacitor at 25 kilohertz",
+    "RC Band Pass Filter": "RC band pass filter with 1 ohm resistors and 100 microfarad capacitors at 25 kilohertz",
+}
+
+def build_demo():
+    """
+    Build the Gradio interface
+
+    Returns:
+        gr.Blocks: The demo, ready to launch
+    """
+    import gradio as gr
+
+    with gr.Blocks() as demo:
+        gr.Markdown("# 🎤 Voice-Controlled LTspice Circuit Creator")
     
-    with gr.Accordion("About & Instructions", open=False):
-        gr.Markdown("""
-        ## Voice Commands for Circuit Creation
+        with gr.Accordion("About & Instructions", open=False):
+            gr.Markdown("""
+            ## Voice Commands for Circuit Creation
         
-        This tool uses voice commands to create LTspice circuit diagrams. Just describe the circuit you want, and it will be generated automatically.
+            This tool uses voice commands to create LTspice circuit diagrams. Just describe the circuit you want, and it will be generated automatically.
         
-        ### Supported Circuit Types:
+            ### Supported Circuit Types:
         
-        1. **Basic Circuit (Default)**:
-           - "Basic circuit with 5V, 1 ohm resistor and 2 uF capacitor"
-           - "Simple circuit with resistor and capacitor"
+            1. **Basic Circuit (Default)**:
+               - "Basic circuit with 5V, 1 ohm resistor and 2 uF capacitor"
+               - "Simple circuit with resistor and capacitor"
            
-        2. **Filters**:
-           - "RC low pass filter with 1 ohm resistor and 100 microfarad capacitor at 25 kilohertz"
-           - "RC high pass filter with 1 ohm resistor and 100 microfarad capacitor at 25 kilohertz"
-           - "RC Band Pass Filter": "RC band pass filter with 1 ohm resistors and 100 microfarad capacitors at 25 kilohertz"
+            2. **Filters**:
+               - "RC low pass filter with 1 ohm resistor and 100 microfarad capacitor at 25 kilohertz"
+               - "RC high pass filter with 1 ohm resistor and 100 microfarad capacitor at 25 kilohertz"
+               - "RC Band Pass Filter": "RC band pass filter with 1 ohm resistors and 100 microfarad capacitors at 25 kilohertz"
            
-        ### Tips:
-        - Specify component values with units (ohm, k, meg, uF, nF, pF, mH, uH)
-        - Mention circuit topology for more accurate results
-        - For more complex circuits, try to be specific about connections
-        - You can specify frequency for filters (e.g., "at 25 kilohertz")
-        - If no specific circuit is recognized, the default Basic Circuit will be created
-        """)
+            ### Tips:
+            - Specify component values with units (ohm, k, meg, uF, nF, pF, mH, uH)
+            - Mention circuit topology for more accurate results
+            - For more complex circuits, try to be specific about connections
+            - You can specify frequency for filters (e.g., "at 25 kilohertz")
+            - If no specific circuit is recognized, the default Basic Circuit will be created
+            - Follow up with edits such as "make the resistor 10k", "change frequency to 1 kHz", "double the capacitor" or "undo" to update the last circuit in place
+            """)
     
-    # Check LTspice installation at startup
-    ltspice_ok, message = check_ltspice_installation()
-    if not ltspice_ok:
-        gr.Markdown(f"⚠️ {message}")
-
-    with gr.Row():
-        with gr.Column():
-            audio_input = gr.Audio(sources=["microphone"], type="filepath", label="Record Voice Command")
-            text_input = gr.Textbox(label="Or Type Circuit Description", placeholder="e.g., 'RC low pass filter with 10k and 1uF'")
+        # Check LTspice installation at startup
+        ltspice_ok, message = check_ltspice_installation()
+        if not ltspice_ok:
+            gr.Markdown(f"⚠️ {message}")
+
+        with gr.Row():
+            with gr.Column():
+                audio_input = gr.Audio(sources=["microphone"], type="filepath", label="Record Voice Command")
+                if UI_LIVE_STT:
+                    live_input = gr.Audio(sources=["microphone"], type="numpy", streaming=True,
+                                          label="Live Voice Command (circuit is created when you stop)")
+                    live_state = gr.State(None)
+                text_input = gr.Textbox(label="Or Type Circuit Description", placeholder="e.g., 'RC low pass filter with 10k and 1uF', then 'make the resistor 4.7k'")
+                # Last circuit of this browser session, for follow-up edits
+                session_state = gr.State(CircuitSession())
             
-    with gr.Row():
-        btn_audio = gr.Button("Create Circuit from Audio")
-        btn_text = gr.Button("Create Circuit from Text")
+        with gr.Row():
+            btn_audio = gr.Button("Create Circuit from Audio")
+            btn_text = gr.Button("Create Circuit from Text")
     
-    with gr.Row():
-        text_output = gr.Textbox(label="Status")
+        with gr.Row():
+            text_output = gr.Textbox(label="Status")
+
+        with gr.Row():
+            preview_plot = gr.Plot(label="Frequency and Transient Preview")
+
+        with gr.Row():
+            schematic_output = gr.Textbox(label="Schematic (.asc)", lines=8, max_lines=20, show_copy_button=True)
+
+        with gr.Accordion("Simulation Results", open=False):
+            raw_input = gr.File(label="LTspice results (.raw)", file_types=[".raw"])
+            btn_results = gr.Button("Plot Results of Last Circuit")
+            results_plot = gr.Plot(label="Simulation Results")
     
-    with gr.Row():
-        gr.Markdown("### Example Circuits")
+        if UI_STATS_PANEL:
+            with gr.Accordion("Pipeline Stats", open=False):
+                stats_output = gr.JSON(label="Per-stage latency (ms) and counters")
+                btn_stats = gr.Button("Refresh")
+            btn_stats.click(fn=pipeline_stats, inputs=None, outputs=stats_output, api_name="metrics")
+
+        with gr.Row():
+            gr.Markdown("### Example Circuits")
         
-    with gr.Row():
-        with gr.Column():
-            gr.Markdown("#### Filters")
-            filter_examples = [
-                gr.Button("Basic Circuit"),
-                gr.Button("RC Low Pass Filter"),
-                gr.Button("RC High Pass Filter"),
-                gr.Button("RC Band Pass Filter")
-            ]
+        with gr.Row():
+            with gr.Column():
+                gr.Markdown("#### Filters")
+                filter_examples = [
+                    gr.Button("Basic Circuit"),
+                    gr.Button("RC Low Pass Filter"),
+                    gr.Button("RC High Pass Filter"),
+                    gr.Button("RC Band Pass Filter")
+                ]
         
         
     
-    # Function to process text input
-    def process_text(text):
-        """Process text input to create circuit"""
-        try:
-            # Use Gemini to parse command
-            components = parse_command_with_gemini_v2(text)
-            print("Parsed components:", components)
-
-            # Get the topology
-            topology = components.get('topology', 'basic_circuit')
-            
-            # Generate circuit schematic based on topology
-            schematic_content = generate_circuit_schematic(components)
-            
-            # Create unique filename with timestamp
-            timestamp = time.strftime("%Y%m%d_%H%M%S")
-            circuit_filename = f"circuit_{timestamp}.asc"
-            circuit_path = os.path.join(CIRCUIT_DIR, circuit_filename)
-            
-            print(f"Writing circuit to: {circuit_path}")
-            
-            with open(circuit_path, 'w') as f:
-                f.write(schematic_content)
+        # Connect buttons
+        outputs = [text_output, preview_plot, schematic_output]
+        btn_audio.click(fn=process_audio, inputs=[audio_input, session_state], outputs=outputs, api_name="process_audio")
+        btn_text.click(fn=process_text, inputs=[text_input, session_state], outputs=outputs, api_name="process_text")
+        btn_results.click(fn=plot_results, inputs=[raw_input, session_state], outputs=[text_output, results_plot],
+                          api_name="plot_results")
+        raw_input.upload(fn=plot_results, inputs=[raw_input, session_state], outputs=[text_output, results_plot])
 
-            # Open the circuit in LTspice
-            success, message = open_in_ltspice(circuit_path)
-            
-            status_message = f"Circuit created successfully!\nRecognized: {text}\nTopology: {topology}\nComponents: {components}\nSaved as: {circuit_filename}\n{message}"
-            return status_message
-        except Exception as e:
-            return f"Error: {str(e)}"
-    
-    # Example circuit descriptions
-    examples = {
-        "Basic Circuit": "simple circuit with 5V, 1 ohm resistor and 2 uF capacitor",
-        "RC Low Pass Filter": "RC low pass filter with 1 ohm resistor and 100 microfarad capacitor at 25 kilohertz",
-        "RC High Pass Filter": "RC high pass filter with 1 ohm resistor and 100 microfarad capacitor at 25 kilohertz",
-        "RC Band Pass Filter": "RC band pass filter with 1 ohm resistors and 100 microfarad capacitors at 25 kilohertz",
-    }
+        if UI_LIVE_STT:
+            # Each recording gets a fresh transcriber; chunks are recognized
+            # phrase by phrase and the circuit is built when recording stops
+            live_input.start_recording(fn=lambda: None, inputs=None, outputs=live_state, queue=False)
+            live_input.stream(fn=stream_audio_chunk, inputs=[live_input, live_state],
+                              outputs=[live_state, text_output], show_progress="hidden")
+            live_input.stop_recording(fn=process_live, inputs=[live_state, session_state], outputs=outputs)
     
-    # Connect buttons
-    btn_audio.click(fn=process_audio, inputs=audio_input, outputs=text_output)
-    btn_text.click(fn=process_text, inputs=text_input, outputs=text_output)
-    
-    # Connect example buttons
-    all_example_buttons = filter_examples
-    for btn in all_example_buttons:
-        btn_name = btn.value
-        if btn_name in examples:
-            example_text = examples[btn_name]
-            btn.click(
-                fn=lambda text=example_text: process_text(text),
-                inputs=None,
-                outputs=text_output
-            )
-
-# Launch the demo
-demo.launch() 
\ No newline at end of file
+        # Connect example buttons
+        all_example_buttons = filter_examples
+        for btn in all_example_buttons:
+            btn_name = btn.value
+            if btn_name in EXAMPLES:
+                example_text = EXAMPLES[btn_name]
+
+                # A generator function, so Gradio streams its updates
+                def run_example(session, text=example_text):
+                    yield from process_text(text, session)
+
+                btn.click(
+                    fn=run_example,
+                    inputs=session_state,
+                    outputs=outputs
+                )
+
+    # Handlers run on a pool of UI_WORKERS threads behind a bounded queue;
+    # once UI_QUEUE_SIZE requests are waiting, new ones are turned away
+    demo.queue(default_concurrency_limit=UI_WORKERS, max_size=UI_QUEUE_SIZE)
+    return demo
+
+
+if __name__ == "__main__":
+    print(f"Using circuit directory: {ensure_circuit_dir()}")
+    if METRICS_PORT:
+        start_metrics_server()
+    build_demo().launch(max_threads=max(40, UI_WORKERS))